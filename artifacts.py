@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""Result artifacts in R2 instead of a multi-megabyte inline response.
+
+The inline response carries the transcript three times (text, SRT and a
+list of segment dicts). With outputMode "r2" the selected artifacts are
+encoded and uploaded in parallel next to the source object, and the
+response keeps only metadata plus, per artifact, its key, size and
+sha256:
+
+- srt / vtt / ass: the subtitle documents as plain text;
+- json: the full inline response, gzip'd;
+- columnar: the segments as parallel arrays, {"unit": "ms", "start": [...],
+  "end": [...], "text": [...]}, msgpack'd when msgpack is installed and
+  JSON otherwise, then gzip'd. read_columnar() turns it back into segments.
+
+A text translation (translate.py) gets the same subtitle and columnar
+artifacts, tagged with its language (transcript.es.srt, ...).
+
+Benchmark against a local S3 stand-in: python artifacts.py [segments] [latency_ms]
+"""
+import gzip
+import hashlib
+import importlib.util
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+OUTPUT_MODE = os.environ.get('OUTPUT_MODE', 'inline')  # inline | r2; jobs can send "outputMode"
+ARTIFACTS = [a for a in os.environ.get('ARTIFACTS', 'srt,json,columnar').split(',') if a]
+ARTIFACT_UPLOAD_CONCURRENCY = int(os.environ.get('ARTIFACT_UPLOAD_CONCURRENCY', '8'))
+
+HAS_MSGPACK = importlib.util.find_spec("msgpack") is not None
+
+# Response fields that move into artifacts; the rest stays inline
+TRANSCRIPT_FIELDS = ("transcription", "srt", "segments", "vtt", "ass")
+SUBTITLE_TYPES = {
+    "srt": "application/x-subrip",
+    "vtt": "text/vtt",
+    "ass": "text/x-ssa",
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(ARTIFACT_UPLOAD_CONCURRENCY, thread_name_prefix="artifacts")
+    return _executor
+
+
+def wanted(job_input):
+    return job_input.get('outputMode', OUTPUT_MODE) == 'r2'
+
+
+def encode_columnar(segments, tag=""):
+    """Segments as parallel arrays with millisecond integers; returns (name, bytes, content type)"""
+    columns = {
+        "unit": "ms",
+        "start": [round(s["start"] * 1000) for s in segments],
+        "end": [round(s["end"] * 1000) for s in segments],
+        "text": [s["text"] for s in segments],
+    }
+    if HAS_MSGPACK:
+        import msgpack
+        return f"segments{tag}.msgpack.gz", gzip.compress(msgpack.packb(columns), 6), "application/gzip"
+    body = json.dumps(columns, separators=(",", ":")).encode()
+    return f"segments{tag}.json.gz", gzip.compress(body, 6), "application/gzip"
+
+
+def read_columnar(name, body):
+    """Inverse of encode_columnar: [{id, start, end, text}] in seconds"""
+    data = gzip.decompress(body)
+    if name.endswith(".msgpack.gz"):
+        import msgpack
+        columns = msgpack.unpackb(data)
+    else:
+        columns = json.loads(data)
+    return [
+        {"id": i, "start": start / 1000, "end": end / 1000, "text": text}
+        for i, (start, end, text) in enumerate(zip(columns["start"], columns["end"], columns["text"]), 1)
+    ]
+
+
+def encode(artifact, response, tag=""):
+    """(file name, bytes, content type) of one artifact, or None when the response lacks it.
+
+    tag goes before the extension, e.g. ".es" for a translation's artifacts.
+    """
+    if artifact in SUBTITLE_TYPES:
+        if artifact not in response:
+            return None
+        return f"transcript{tag}.{artifact}", response[artifact].encode(), f"{SUBTITLE_TYPES[artifact]}; charset=utf-8"
+    if artifact == "json":
+        body = json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode()
+        return f"transcript{tag}.json.gz", gzip.compress(body, 6), "application/gzip"
+    if artifact == "columnar":
+        return encode_columnar(response["segments"], tag)
+    raise ValueError(f"Unknown artifact '{artifact}'")
+
+
+def _upload(put, bucket_name, prefix, artifact, response, tag=""):
+    encoded = encode(artifact, response, tag)
+    if encoded is None:
+        return artifact, None
+    name, body, content_type = encoded
+    key = prefix + name
+    put(bucket_name, key, body, content_type)
+    return artifact, {
+        "bucket": bucket_name,
+        "key": key,
+        "bytes": len(body),
+        "sha256": hashlib.sha256(body).hexdigest(),
+        "content_type": content_type,
+    }
+
+
+def offload(response, job, put=None, executor=None):
+    """Upload the job's artifacts in parallel; returns the response without the transcript fields"""
+    job_input = job['input']
+    if put is None:
+        import storage
+        put = storage.put_bytes
+    bucket_name = job_input.get('outputBucket') or job_input['bucketName']
+    prefix = f"{job_input['fileName']}.outputs/{job.get('id') or uuid.uuid4().hex}/"
+    requested = job_input.get('artifacts') or ARTIFACTS
+    # Extra subtitle formats the job asked for go along with the defaults
+    requested = list(dict.fromkeys(requested + [fmt for fmt in ("vtt", "ass") if fmt in response]))
+
+    executor = executor or get_executor()
+    futures = [executor.submit(_upload, put, bucket_name, prefix, artifact, response) for artifact in requested]
+    # Translated subtitles (see translate.py) get their own set, tagged with the language
+    translation = response.get("translation")
+    translated = translation is not None and "segments" in translation
+    if translated:
+        tag = f".{translation['language']}"
+        translation_futures = [
+            executor.submit(_upload, put, bucket_name, prefix, artifact, translation, tag)
+            for artifact in requested if artifact != "json"
+        ]
+
+    slim = {field: value for field, value in response.items() if field not in TRANSCRIPT_FIELDS}
+    slim["segment_count"] = len(response.get("segments", []))
+    slim["output_mode"] = "r2"
+    slim["artifacts"] = _collect(futures)
+    if translated:
+        slim["translation"] = {field: value for field, value in translation.items() if field not in TRANSCRIPT_FIELDS}
+        slim["translation"]["artifacts"] = _collect(translation_futures)
+    return slim
+
+
+def _collect(futures):
+    return {artifact: entry for artifact, entry in (future.result() for future in futures) if entry is not None}
+
+
+# --- Benchmark ---
+def synthetic_response(count=20000):
+    """handler-shaped response with count segments of ~60 characters"""
+    import subtitles
+    from array import array
+
+    words = "the quick brown fox jumps over a lazy dog while we keep on talking".split()
+    segments = []
+    for i in range(count):
+        text = " ".join(words[(i + k) % len(words)] for k in range(11))
+        segments.append({"id": i + 1, "start": round(i * 3.2, 3), "end": round(i * 3.2 + 2.9, 3), "text": text})
+    starts = array("d", (s["start"] for s in segments))
+    ends = array("d", (s["end"] for s in segments))
+    texts = [s["text"] for s in segments]
+    return {
+        "transcription": " ".join(texts),
+        "srt": subtitles.render("srt", starts, ends, texts),
+        "segments": segments,
+        "detected_language": "en",
+        "duration": segments[-1]["end"],
+    }
+
+
+def benchmark(count=20000, latency_ms=50.0):
+    """Inline vs offloaded response size, serial vs parallel uploads to a local S3 stand-in"""
+    import shutil
+    import tempfile
+    from local_harness import LocalStorage
+
+    class SlowStorage(LocalStorage):
+        """Adds a fixed round trip to every PUT, like a remote endpoint would"""
+
+        def put_object(self, **kwargs):
+            time.sleep(latency_ms / 1000)
+            return super().put_object(**kwargs)
+
+    root = tempfile.mkdtemp()
+    client = SlowStorage(root)
+
+    def put(bucket_name, key, body, content_type):
+        client.put_object(Bucket=bucket_name, Key=key, Body=body, ContentType=content_type)
+
+    response = synthetic_response(count)
+    inline = len(json.dumps(response).encode())
+    job = {"id": "bench", "input": {"bucketName": "local", "fileName": "talk.mp3",
+                                    "artifacts": ["srt", "vtt", "json", "columnar"]}}
+    response["vtt"] = response["srt"].replace(",", ".")
+
+    with ThreadPoolExecutor(1) as serial:
+        start = time.perf_counter()
+        offload(response, job, put, serial)
+        serial_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    slim = offload(response, job, put)
+    parallel_seconds = time.perf_counter() - start
+
+    # Round trip: what a consumer downloads matches what was described
+    ok = True
+    for artifact, entry in slim["artifacts"].items():
+        body = client.get_object(Bucket="local", Key=entry["key"])["Body"].read()
+        ok &= len(body) == entry["bytes"] and hashlib.sha256(body).hexdigest() == entry["sha256"]
+    columnar = slim["artifacts"]["columnar"]
+    decoded = read_columnar(columnar["key"], client.get_object(Bucket="local", Key=columnar["key"])["Body"].read())
+    ok &= decoded == response["segments"]
+
+    print(f"{count} segments ({'msgpack' if HAS_MSGPACK else 'json'} columnar encoding)")
+    print(f"  inline response:     {inline / 2**20:8.2f} MB")
+    print(f"  offloaded response:  {len(json.dumps(slim).encode()) / 1024:8.2f} KB")
+    for artifact, entry in slim["artifacts"].items():
+        print(f"    {artifact:9s} {entry['bytes'] / 1024:10.1f} KB  {entry['key']}")
+    print(f"  uploads at {latency_ms:g} ms per PUT: serial {serial_seconds * 1000:.0f} ms, "
+          f"parallel {parallel_seconds * 1000:.0f} ms")
+    print(f"  checksums and columnar round trip: {'ok' if ok else 'MISMATCH'}")
+    shutil.rmtree(root, ignore_errors=True)
+    return ok
+
+
+if __name__ == "__main__":
+    import sys
+    ok = benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20000,
+                   float(sys.argv[2]) if len(sys.argv) > 2 else 50.0)
+    sys.exit(0 if ok else 1)
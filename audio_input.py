@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Audio normalization: decode any input once to 16 kHz mono float32.
+
+Every consumer (VAD, language probe, the model, chunked workers, CLI
+fallbacks) gets the same decoded array instead of decoding the media
+again. Chunked workers receive it through a multiprocessing.shared_memory
+block, so the parent copies it once and workers slice it without pickling.
+
+Benchmark: python audio_input.py [minutes]
+"""
+import importlib.util
+import os
+import time
+
+SAMPLING_RATE = 16000
+
+
+def input_path(directory, file_name):
+    """Local path for a download that keeps the object's real extension"""
+    extension = os.path.splitext(file_name or "")[1]
+    return os.path.join(directory, "input" + (extension or ".bin"))
+
+
+def normalize(source):
+    """Decode a path, file-like object or array once; returns (audio, report)"""
+    import numpy as np
+
+    start = time.perf_counter()
+    if isinstance(source, np.ndarray):
+        audio = source.astype(np.float32, copy=False)
+    elif importlib.util.find_spec("faster_whisper") is not None:
+        # PyAV, in process; also reads file-like objects (R2 streams)
+        from faster_whisper import decode_audio
+        audio = decode_audio(source, sampling_rate=SAMPLING_RATE)
+    else:
+        # openai-whisper images: the same ffmpeg decode whisper would run per call
+        from whisper.audio import load_audio
+        audio = load_audio(source, sr=SAMPLING_RATE)
+    report = {
+        "duration": round(len(audio) / SAMPLING_RATE, 3),
+        "sample_rate": SAMPLING_RATE,
+        "decode_seconds": round(time.perf_counter() - start, 3),
+        "memory_mb": round(audio.nbytes / 2**20, 2),
+    }
+    print(f"[audio] {report['duration']:.1f}s decoded in {report['decode_seconds']:.2f}s, "
+          f"{report['memory_mb']:.1f} MB")
+    return audio, report
+
+
+def write_wav(path, audio):
+    """16-bit mono WAV for consumers that only take files (whisper CLIs)"""
+    import wave
+    import numpy as np
+
+    with wave.open(path, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLING_RATE)
+        out.writeframes((np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes())
+    return path
+
+
+class SharedAudio:
+    """A decoded array copied once into shared memory; workers attach by name"""
+
+    def __init__(self, audio):
+        import numpy as np
+        from multiprocessing import shared_memory
+
+        self._memory = shared_memory.SharedMemory(create=True, size=max(audio.nbytes, 1))
+        self.array = np.ndarray(audio.shape, dtype=np.float32, buffer=self._memory.buf)
+        self.array[:] = audio
+        self.descriptor = (self._memory.name, len(audio))
+
+    def close(self):
+        """Release and unlink the block (once every worker is done with it)"""
+        if self._memory is None:
+            return
+        self.array = None
+        self._memory.close()
+        self._memory.unlink()
+        self._memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Worker side: the block currently attached, kept across the chunks of a file
+_attached = {}
+
+
+def attach(descriptor):
+    """Zero-copy view of a SharedAudio block from another process"""
+    import numpy as np
+    from multiprocessing import shared_memory
+
+    name, length = descriptor
+    if name not in _attached:
+        for old_name in list(_attached):
+            memory, _ = _attached.pop(old_name)
+            try:
+                memory.close()
+            except BufferError:
+                pass  # a view is still alive; the OS frees it with the process
+        memory = shared_memory.SharedMemory(name=name)
+        _attached[name] = (memory, np.ndarray((length,), dtype=np.float32, buffer=memory.buf))
+    return _attached[name][1]
+
+
+def benchmark(minutes=30.0):
+    """Decode cost and footprint, and what shared memory saves chunked workers"""
+    import pickle
+    import tempfile
+    from chunked import LONG_AUDIO_CHUNK_SECONDS, synthetic_wav
+
+    path = os.path.join(tempfile.mkdtemp(), "synthetic.wav")
+    synthetic_wav(path, minutes)
+    audio, report = normalize(path)
+
+    chunk = int(LONG_AUDIO_CHUNK_SECONDS * SAMPLING_RATE)
+    start = time.perf_counter()
+    pickled = 0
+    for i in range(0, len(audio), chunk):
+        payload = pickle.dumps(audio[i:i + chunk])
+        pickle.loads(payload)  # what each worker does on its side
+        pickled += len(payload)
+    pickling = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with SharedAudio(audio) as shared:
+        view = attach(shared.descriptor)
+        same = bool((view[::997] == audio[::997]).all())
+        del view
+        _attached.clear()
+    sharing = time.perf_counter() - start
+
+    print(f"{minutes:g} min of audio: decoded in {report['decode_seconds']:.2f}s, {report['memory_mb']:.1f} MB")
+    print(f"  pickled chunks to workers: {pickled / 2**20:7.1f} MB in {pickling * 1000:6.1f} ms "
+          f"(pickle + unpickle, before the pipe transfer)")
+    print(f"  shared memory:             {report['memory_mb']:7.1f} MB copied once in {sharing * 1000:6.1f} ms, "
+          f"tasks carry a name (view matches: {same})")
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else 30.0)
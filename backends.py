@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""Transcription backends behind one interface, probed once per process.
+
+    backend = get_backend()               # WHISPER_BACKEND, or the first available
+    segments, info = backend.transcribe(audio_or_path)
+
+segments is a list of {start, end, text} dicts and info a dict with
+language and duration, whatever runs underneath:
+
+- "faster-whisper" / "openai-whisper": in process, model kept in model_pool;
+- "whisper-cli" / "whisperx-cli": one subprocess per job, JSON output read
+  back directly (for images with only a CLI installed);
+- "fake": no model; one segment per 5 s of audio, for harnesses and tests.
+"""
+import functools
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import namedtuple
+
+WHISPER_BACKEND = os.environ.get('WHISPER_BACKEND')  # unset = first available
+WHISPER_BACKEND_MODEL = os.environ.get('WHISPER_BACKEND_MODEL', 'base')
+# Simulated decode time of the fake model, seconds per minute of audio
+FAKE_MODEL_DELAY = float(os.environ.get('FAKE_MODEL_DELAY', '0'))
+CLI_TIMEOUT_SECONDS = 300
+
+SAMPLING_RATE = 16000
+
+
+def _duration(audio):
+    return len(audio) / SAMPLING_RATE if not isinstance(audio, str) else None
+
+
+class Backend:
+    name = None
+
+    def __init__(self, model_name=WHISPER_BACKEND_MODEL):
+        self.model_name = model_name
+
+    @classmethod
+    def available(cls):
+        raise NotImplementedError
+
+    def load(self):
+        """Make the model resident (called once when the backend is chosen)"""
+
+    def transcribe(self, audio, **options):
+        """audio is a 16 kHz mono float32 array or a path; returns (segments, info)"""
+        raise NotImplementedError
+
+    def language_model(self):
+        """In-process model the language probe can run on (langprobe.py), or None"""
+        return None
+
+
+class FasterWhisperBackend(Backend):
+    name = "faster-whisper"
+
+    @classmethod
+    def available(cls):
+        return importlib.util.find_spec("faster_whisper") is not None
+
+    def load(self):
+        from model_pool import get_whisper_model
+        return get_whisper_model(self.model_name)
+
+    def language_model(self):
+        return self.load()[0]
+
+    def transcribe(self, audio, **options):
+        model, _ = self.load()
+        segments, info = model.transcribe(audio, **options)
+        result = [{"start": s.start, "end": s.end, "text": s.text} for s in segments]
+        return result, {"language": info.language, "duration": info.duration}
+
+
+class OpenAIWhisperBackend(Backend):
+    name = "openai-whisper"
+
+    @classmethod
+    def available(cls):
+        return importlib.util.find_spec("whisper") is not None
+
+    def load(self):
+        from model_pool import get_openai_whisper_model
+        return get_openai_whisper_model(self.model_name)
+
+    def language_model(self):
+        return self.load()[0]
+
+    def transcribe(self, audio, **options):
+        model, _ = self.load()
+        result = model.transcribe(audio, **options)
+        segments = [{"start": s["start"], "end": s["end"], "text": s["text"]} for s in result["segments"]]
+        duration = _duration(audio)
+        if duration is None:
+            duration = segments[-1]["end"] if segments else 0
+        return segments, {"language": result.get("language", "unknown"), "duration": duration}
+
+
+class CLIBackend(Backend):
+    """A whisper-compatible command line; the model is reloaded by every run"""
+    command = None
+
+    @classmethod
+    def available(cls):
+        return shutil.which(cls.command) is not None
+
+    def transcribe(self, audio, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = audio
+            if not isinstance(audio, str):
+                from audio_input import write_wav
+                path = write_wav(os.path.join(directory, "audio.wav"), audio)
+            command = [self.command, path, "--model", self.model_name,
+                       "--output_format", "json", "--output_dir", directory]
+            if options.get("language"):
+                command += ["--language", options["language"]]
+            result = subprocess.run(command, capture_output=True, text=True, timeout=CLI_TIMEOUT_SECONDS)
+            if result.returncode != 0:
+                raise RuntimeError(f"{self.command} failed: {result.stderr[-500:]}")
+            output = os.path.join(directory, os.path.splitext(os.path.basename(path))[0] + ".json")
+            with open(output) as f:
+                data = json.load(f)
+        segments = [{"start": s["start"], "end": s["end"], "text": s["text"]} for s in data.get("segments", [])]
+        duration = _duration(audio)
+        if duration is None:
+            duration = segments[-1]["end"] if segments else 0
+        return segments, {"language": data.get("language", "unknown"), "duration": duration}
+
+
+class WhisperCLIBackend(CLIBackend):
+    name = "whisper-cli"
+    command = "whisper"
+
+
+class WhisperXCLIBackend(CLIBackend):
+    name = "whisperx-cli"
+    command = "whisperx"
+
+
+class FakeBackend(Backend):
+    """Deterministic output without a model, for harnesses and tests"""
+    name = "fake"
+    segment_seconds = 5.0
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def transcribe(self, audio, **options):
+        duration = _duration(audio) or 0.0
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(start + self.segment_seconds, duration)
+            segments.append({"start": start, "end": end, "text": f" Segment {len(segments) + 1}."})
+            start = end
+        return segments, {"language": options.get("language") or "en", "duration": duration}
+
+
+FakeSegment = namedtuple('FakeSegment', ['start', 'end', 'text', 'words'])
+FakeInfo = namedtuple('FakeInfo', ['language', 'language_probability', 'duration', 'duration_after_vad', 'vad_options'],
+                      defaults=(None,))
+
+
+class FakeWhisperModel:
+    """WhisperModel stand-in with FakeBackend's output, e.g. for chunked workers ("fake" model)"""
+
+    def __init__(self, delay=None):
+        self.delay = FAKE_MODEL_DELAY if delay is None else delay
+
+    def transcribe(self, audio, **options):
+        segments, info = FakeBackend().transcribe(audio, **options)
+        time.sleep(self.delay * info["duration"] / 60)
+        return (
+            (FakeSegment(s["start"], s["end"], s["text"], None) for s in segments),
+            FakeInfo(info["language"], 1.0, info["duration"], info["duration"]),
+        )
+
+
+# Probe order when WHISPER_BACKEND is not set; "fake" is only used when asked for
+BACKENDS = {
+    backend.name: backend
+    for backend in (FasterWhisperBackend, OpenAIWhisperBackend, WhisperCLIBackend, WhisperXCLIBackend, FakeBackend)
+}
+
+
+def register_backend(backend_class):
+    BACKENDS[backend_class.name] = backend_class
+
+
+@functools.lru_cache(maxsize=None)
+def get_backend(name=None, model_name=WHISPER_BACKEND_MODEL):
+    """The chosen backend, probed and loaded once per process"""
+    name = name or WHISPER_BACKEND
+    if name:
+        backend_class = BACKENDS[name]
+        if not backend_class.available():
+            raise RuntimeError(f"Whisper backend '{name}' is not available")
+    else:
+        backend_class = next(
+            (b for n, b in BACKENDS.items() if n != "fake" and b.available()), None
+        )
+        if backend_class is None:
+            raise RuntimeError("No working Whisper installation found")
+    backend = backend_class(model_name)
+    print(f"[backend] using {backend.name} ({model_name})")
+    backend.load()
+    return backend
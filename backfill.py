@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""Backfill: transcribe every object under an R2 prefix (or in a manifest) in one job.
+
+    {"input": {"backfill": {"bucketName": "media", "prefix": "2023/"}, "language": "pt"}}
+
+Instead of "prefix", a job can list the keys itself ("keys": [...]) or
+point at a manifest object ("manifestKey": a JSON list or one key per
+line). Listing is paginated and lazy, so huge prefixes start right away.
+
+Downloads run up to BACKFILL_DOWNLOAD_AHEAD files ahead of the model and
+uploads trail behind it (at most BACKFILL_UPLOAD_CONCURRENCY at once), so
+the model only waits on the network for the first file. Outputs go to
+<key>.outputs/<name>/ like outputMode "r2"; keys that already have them
+are skipped.
+
+Progress is kept in backfill/<name>/manifest.json (per-file status and
+timings), saved every BACKFILL_SAVE_EVERY files. A rerun with the same
+name - by default derived from the spec and options, so resubmitting the
+same job is enough - skips what is done and retries what failed.
+"maxSeconds" ends a run cleanly before the endpoint's execution timeout;
+status "partial" means there is more to do.
+
+Pipelining and crash/resume check: python backfill.py [files]
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import storage
+
+BACKFILL_DOWNLOAD_AHEAD = int(os.environ.get('BACKFILL_DOWNLOAD_AHEAD', '2'))
+BACKFILL_UPLOAD_CONCURRENCY = int(os.environ.get('BACKFILL_UPLOAD_CONCURRENCY', '4'))
+BACKFILL_SAVE_EVERY = int(os.environ.get('BACKFILL_SAVE_EVERY', '10'))
+
+MEDIA_EXTENSIONS = (".mp3", ".wav", ".m4a", ".mp4", ".aac", ".flac", ".ogg", ".opus", ".webm", ".mkv", ".mov")
+# What this worker writes next to the media; never a backfill input
+DERIVED_MARKERS = (".outputs/", ".transcripts/", ".checkpoints/")
+
+
+def default_name(spec, options):
+    """Stable name for a spec + decoding options, so a resubmitted job resumes"""
+    source = {k: spec.get(k) for k in ("bucketName", "prefix", "keys", "manifestKey")}
+    payload = json.dumps({"source": source, "options": options}, sort_keys=True, default=str)
+    return "backfill-" + hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def is_media(key):
+    return key.lower().endswith(MEDIA_EXTENSIONS) and not any(marker in key for marker in DERIVED_MARKERS)
+
+
+def source_keys(bucket_name, spec):
+    """Keys to process, lazily: inline list, manifest object or paginated prefix listing"""
+    if spec.get("keys"):
+        yield from spec["keys"]
+    elif spec.get("manifestKey"):
+        body = storage.read_bytes(bucket_name, spec["manifestKey"]).decode()
+        try:
+            keys = json.loads(body)
+        except ValueError:
+            keys = [line.strip() for line in body.splitlines() if line.strip()]
+        yield from keys
+    else:
+        for key in storage.list_keys(bucket_name, spec.get("prefix", ""), spec.get("pageSize", 1000)):
+            if is_media(key):
+                yield key
+
+
+def has_outputs(bucket_name, output_prefix):
+    return next(storage.list_keys(bucket_name, output_prefix, page_size=1), None) is not None
+
+
+class Manifest:
+    """Per-file status and timings of a backfill, saved to R2 as JSON"""
+
+    def __init__(self, bucket_name, name):
+        self.bucket_name = bucket_name
+        self.key = f"backfill/{name}/manifest.json"
+        self.name = name
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        try:
+            data = json.loads(storage.read_bytes(bucket_name, self.key))
+            self.files = data.get("files", {})
+            self.runs = data.get("runs", 0)
+        except Exception:
+            self.files = {}
+            self.runs = 0
+        self.runs += 1
+
+    def done(self, key):
+        return self.files.get(key, {}).get("status") in ("done", "skipped")
+
+    def record(self, key, entry):
+        with self._lock:
+            self.files[key] = entry
+            self._unsaved += 1
+            save = self._unsaved >= BACKFILL_SAVE_EVERY
+        if save:
+            self.save()
+
+    def counts(self):
+        with self._lock:
+            statuses = [entry["status"] for entry in self.files.values()]
+        return {status: statuses.count(status) for status in ("done", "skipped", "error")}
+
+    def save(self, status="running"):
+        with self._lock:
+            self._unsaved = 0
+            body = json.dumps({
+                "name": self.name, "status": status, "runs": self.runs,
+                "updated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "files": self.files,
+            }).encode()
+        storage.put_bytes(self.bucket_name, self.key, body, 'application/json')
+
+
+def run(bucket_name, spec, name, download, transcribe, upload, release):
+    """Pipeline the backfill; returns the summary for the job response.
+
+    download(key) -> source, transcribe(source, key) -> response,
+    upload(response, key) -> offloaded response, release(source). Only
+    transcribe runs on the calling thread (the model); downloads and
+    uploads run on their own pools.
+    """
+    manifest = Manifest(bucket_name, name)
+    started = time.perf_counter()
+    deadline = started + spec["maxSeconds"] if spec.get("maxSeconds") else None
+    ahead = int(spec.get("downloadAhead", BACKFILL_DOWNLOAD_AHEAD))
+    upload_concurrency = int(spec.get("uploadConcurrency", BACKFILL_UPLOAD_CONCURRENCY))
+    upload_slots = threading.BoundedSemaphore(upload_concurrency)
+    processed = 0
+
+    def fetch(key):
+        """Download task: (source, seconds), or (None, 0) when the outputs already exist"""
+        if has_outputs(bucket_name, f"{key}.outputs/{name}/"):
+            return None, 0.0
+        fetch_started = time.perf_counter()
+        source = download(key)
+        return source, time.perf_counter() - fetch_started
+
+    def store(key, response, entry):
+        try:
+            upload_started = time.perf_counter()
+            response = upload(response, key)
+            entry["upload_seconds"] = round(time.perf_counter() - upload_started, 3)
+            if "error" in response:
+                entry.update(status="error", error=response["error"])
+        except Exception as e:
+            entry.update(status="error", error=str(e))
+        finally:
+            upload_slots.release()
+        entry["seconds"] = round(entry["seconds"] + entry.get("upload_seconds", 0.0), 3)
+        manifest.record(key, entry)
+
+    keys = (key for key in source_keys(bucket_name, spec) if not manifest.done(key))
+    downloads = ThreadPoolExecutor(max(1, ahead), thread_name_prefix="backfill-download")
+    uploads = ThreadPoolExecutor(upload_concurrency, thread_name_prefix="backfill-upload")
+    pending = deque()
+    stopped = False
+    # Stays "interrupted" if the loop dies; what finished is still saved
+    status = "interrupted"
+    try:
+        while True:
+            # Keep the model's next files downloading while it works
+            while not stopped and len(pending) <= ahead:
+                key = next(keys, None)
+                if key is None:
+                    break
+                pending.append((key, downloads.submit(fetch, key)))
+            if not pending:
+                break
+            key, future = pending.popleft()
+            try:
+                source, download_seconds = future.result()
+            except Exception as e:
+                manifest.record(key, {"status": "error", "error": str(e), "seconds": 0.0})
+                continue
+            if source is None:
+                manifest.record(key, {"status": "skipped", "reason": "outputs exist", "seconds": 0.0})
+                continue
+            entry = {"status": "done", "download_seconds": round(download_seconds, 3)}
+            transcribe_started = time.perf_counter()
+            try:
+                response = transcribe(source, key)
+            except Exception as e:
+                response = {"error": str(e)}
+            finally:
+                release(source)
+            entry["transcribe_seconds"] = round(time.perf_counter() - transcribe_started, 3)
+            entry["seconds"] = download_seconds + entry["transcribe_seconds"]
+            processed += 1
+            if "error" in response:
+                entry.update(status="error", error=response["error"])
+                manifest.record(key, entry)
+            else:
+                entry["duration"] = response.get("duration")
+                upload_slots.acquire()
+                uploads.submit(store, key, response, entry)
+            if deadline is not None and time.perf_counter() > deadline and not stopped:
+                # Finish what is already downloaded, start nothing new
+                stopped = True
+                print(f"Backfill {name}: maxSeconds reached, finishing {len(pending)} downloaded files")
+        status = "partial" if stopped and next(keys, None) is not None else "complete"
+    finally:
+        downloads.shutdown(wait=True)
+        # Downloads nobody will transcribe (the loop died) still hold temp files
+        for _, future in pending:
+            if future.exception() is None and future.result()[0] is not None:
+                release(future.result()[0])
+        uploads.shutdown(wait=True)
+        manifest.save(status)
+
+    counts = manifest.counts()
+    summary = {
+        "name": name,
+        "status": status,
+        "manifest": {"bucket": bucket_name, "key": manifest.key},
+        "processed": processed,
+        **counts,
+        "seconds": round(time.perf_counter() - started, 3),
+        "runs": manifest.runs,
+    }
+    print(f"Backfill {name}: {summary}")
+    return summary
+
+
+# --- Pipelining and crash/resume check ---
+def simulate(files=24, download_seconds=0.05, transcribe_seconds=0.05, upload_seconds=0.05, crash_after=None,
+             ahead=BACKFILL_DOWNLOAD_AHEAD, name="bench"):
+    """Run a backfill over fake media in a local S3 stand-in; returns (summary, seconds)"""
+    import artifacts
+
+    def download(key):
+        time.sleep(download_seconds)
+        return key
+
+    def transcribe(source, key):
+        if crash_after is not None and simulate.transcribed >= crash_after:
+            raise SystemExit("simulated crash")
+        simulate.transcribed += 1
+        time.sleep(transcribe_seconds)
+        return artifacts.synthetic_response(20)
+
+    def upload(response, key):
+        time.sleep(upload_seconds)
+        return artifacts.offload(response, {"id": name, "input": {"bucketName": "local", "fileName": key}})
+
+    simulate.transcribed = 0
+    spec = {"prefix": "archive/", "pageSize": 7, "downloadAhead": ahead}
+    start = time.perf_counter()
+    summary = run("local", spec, name, download, transcribe, upload, lambda source: None)
+    return summary, time.perf_counter() - start
+
+
+def check(files=24):
+    """Serial vs pipelined time, then a crash midway and a resumed run"""
+    import shutil
+    import tempfile
+    from local_harness import LocalStorage
+
+    root = tempfile.mkdtemp()
+    os.makedirs(os.path.join(root, "archive"))
+    for i in range(files):
+        with open(os.path.join(root, "archive", f"talk-{i:04d}.mp3"), "wb") as f:
+            f.write(b"\0" * 64)
+    storage.set_client(LocalStorage(root))
+
+    _, pipelined = simulate(files, name="pipelined")
+    _, serial = simulate(files, ahead=0, name="serial")
+
+    def finished(name):
+        return sum(1 for key in storage.list_keys("local", "archive/") if key.endswith(f"/{name}/transcript.json.gz"))
+
+    # Graceful failure: the manifest records what finished
+    try:
+        simulate(files, crash_after=files // 3, name="resume")
+    except SystemExit:
+        pass
+    saved = json.loads(storage.read_bytes("local", "backfill/resume/manifest.json"))
+    done_before = sum(1 for entry in saved["files"].values() if entry["status"] == "done")
+    resumed, _ = simulate(files, name="resume")
+    rerun, _ = simulate(files, name="resume")
+
+    # Hard kill before any manifest save: the outputs themselves mark what is done
+    try:
+        simulate(files, crash_after=files // 2, name="killed")
+    except SystemExit:
+        pass
+    os.remove(os.path.join(root, "backfill", "killed", "manifest.json"))
+    outputs_before = finished("killed")
+    after_kill, _ = simulate(files, name="killed")
+
+    checks = {
+        "crash recorded as interrupted": saved["status"] == "interrupted" and 0 < done_before < files,
+        "every file has outputs": finished("resume") == files,
+        "resumed run skipped the finished files": resumed["processed"] == files - done_before,
+        "resumed manifest complete": resumed["status"] == "complete" and resumed["done"] == files,
+        "third run transcribes nothing": rerun["processed"] == 0,
+        "lost manifest: existing outputs skipped": after_kill["processed"] == files - outputs_before
+        and after_kill["skipped"] == outputs_before,
+    }
+    print(f"{files} files, 50 ms download / transcribe / upload each")
+    print(f"  no download-ahead: {serial:6.2f}s")
+    print(f"  pipelined:         {pipelined:6.2f}s")
+    print(f"  crashed after {done_before} files; resumed run transcribed {resumed['processed']}")
+    for label, passed in checks.items():
+        print(f"  {'ok  ' if passed else 'FAIL'} {label}")
+    shutil.rmtree(root, ignore_errors=True)
+    return all(checks.values())
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(0 if check(int(sys.argv[1]) if len(sys.argv) > 1 else 24) else 1)
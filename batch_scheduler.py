@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Coalesce concurrent short jobs into one batched faster-whisper call.
+
+Jobs are queued and collected for BATCH_WINDOW_MS (or until BATCH_MAX_SIZE
+is reached), their clips are laid end to end and decoded together through
+BatchedInferencePipeline with one clip_timestamps entry per job, and the
+segments are fanned back out to each job's future.
+
+Load generator: python batch_scheduler.py [jobs] [concurrency] [model]
+"""
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+SAMPLING_RATE = 16000
+
+BATCH_WINDOW_MS = float(os.environ.get('BATCH_WINDOW_MS', '50'))
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', '16'))
+# BatchedInferencePipeline decodes clips of at most 30 s; longer jobs run alone
+BATCH_MAX_CLIP_SECONDS = 30.0
+
+BatchInfo = namedtuple('BatchInfo', ['language', 'language_probability', 'duration', 'batch_size'])
+PendingJob = namedtuple('PendingJob', ['audio', 'options', 'future', 'enqueued_at'])
+
+
+class BatchScheduler:
+    """Single decoding thread in front of a model, fed by many jobs"""
+
+    def __init__(self, model, window_ms=None, max_batch=None, beam_size=5):
+        from faster_whisper import BatchedInferencePipeline
+        self.model = model
+        self.pipeline = BatchedInferencePipeline(model=model)
+        self.window = (BATCH_WINDOW_MS if window_ms is None else window_ms) / 1000.0
+        self.max_batch = max_batch or BATCH_MAX_SIZE
+        self.beam_size = beam_size
+        self.batches = 0
+        self.jobs = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, audio, language=None):
+        """Queue a 16 kHz mono clip; returns a Future of (segments, info)"""
+        future = Future()
+        self._queue.put(PendingJob(audio, {"language": language}, future, time.perf_counter()))
+        return future
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(pending) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            self.jobs += len(pending)
+
+            groups = {}
+            for job in pending:
+                if len(job.audio) > BATCH_MAX_CLIP_SECONDS * SAMPLING_RATE:
+                    self._decode_alone(job)
+                    continue
+                language = job.options["language"] or self._detect_language(job)
+                if language is None:
+                    continue
+                groups.setdefault(language, []).append(job)
+
+            # One batched decode per language, since a batch shares its language
+            for language, jobs in groups.items():
+                self._decode_batch(language, jobs)
+
+    def _detect_language(self, job):
+        try:
+            # transcribe() detects the language eagerly; segments are never iterated
+            _, info = self.model.transcribe(job.audio)
+            return info.language
+        except Exception as e:
+            job.future.set_exception(e)
+            return None
+
+    def _decode_alone(self, job):
+        try:
+            segments, info = self.model.transcribe(job.audio, beam_size=self.beam_size, **job.options)
+            result = [{"start": s.start, "end": s.end, "text": s.text} for s in segments]
+            job.future.set_result((result, BatchInfo(info.language, info.language_probability, info.duration, 1)))
+        except Exception as e:
+            job.future.set_exception(e)
+
+    def _decode_batch(self, language, jobs):
+        import numpy as np
+
+        offsets = []
+        position = 0
+        for job in jobs:
+            offsets.append(position)
+            position += len(job.audio)
+        audio = np.concatenate([job.audio for job in jobs])
+        # clip_timestamps are in seconds; one clip per job
+        clips = [
+            {"start": offset / SAMPLING_RATE, "end": (offset + len(job.audio)) / SAMPLING_RATE}
+            for offset, job in zip(offsets, jobs)
+        ]
+
+        try:
+            segments, _ = self.pipeline.transcribe(
+                audio,
+                language=language,
+                beam_size=self.beam_size,
+                batch_size=len(jobs),
+                vad_filter=False,
+                clip_timestamps=clips,
+                without_timestamps=False,
+            )
+            per_job = [[] for _ in jobs]
+            for segment in segments:
+                index = self._owner(offsets, segment.start)
+                offset = offsets[index] / SAMPLING_RATE
+                per_job[index].append({
+                    "start": round(segment.start - offset, 3),
+                    "end": round(segment.end - offset, 3),
+                    "text": segment.text,
+                })
+        except Exception as e:
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+
+        self.batches += 1
+        for job, result in zip(jobs, per_job):
+            duration = len(job.audio) / SAMPLING_RATE
+            job.future.set_result((result, BatchInfo(language, 1.0, duration, len(jobs))))
+
+    @staticmethod
+    def _owner(offsets, start_seconds):
+        sample = start_seconds * SAMPLING_RATE
+        index = 0
+        while index + 1 < len(offsets) and offsets[index + 1] <= sample:
+            index += 1
+        return index
+
+
+def load_test(jobs=64, concurrency=16, model_name="tiny", clip_seconds=8.0):
+    """Fire jobs from concurrent clients and report jobs/sec and p50/p99 latency"""
+    from concurrent.futures import ThreadPoolExecutor
+    from chunked import synthetic_audio
+    from model_pool import get_whisper_model
+
+    model, _ = get_whisper_model(model_name)
+    clips = [synthetic_audio(clip_seconds, seed=i) for i in range(8)]
+
+    for window_ms, max_batch in ((0, 1), (BATCH_WINDOW_MS, BATCH_MAX_SIZE)):
+        scheduler = BatchScheduler(model, window_ms=window_ms, max_batch=max_batch)
+
+        def one(i):
+            start = time.perf_counter()
+            scheduler.submit(clips[i % len(clips)], language="en").result()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as clients:
+            latencies = sorted(clients.map(one, range(jobs)))
+        elapsed = time.perf_counter() - start
+
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"window={window_ms:g}ms max_batch={max_batch}: {jobs / elapsed:6.2f} jobs/s, "
+              f"p50 {p50:.2f}s, p99 {p99:.2f}s, {scheduler.batches} batches")
+
+
+if __name__ == "__main__":
+    import sys
+    load_test(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 64,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 16,
+        sys.argv[3] if len(sys.argv) > 3 else "tiny",
+    )
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Chunk checkpoints for the long-audio path, so a retried job resumes.
+
+The chunk plan and every finished chunk's segments (already in
+original-audio time) are written as they complete, to local disk and,
+with CHECKPOINT_R2=1, next to the source object in R2 (a retry may land
+on another worker). The key is the decoded audio's hash + model +
+options, so a retry of the same job finds them; the plan is reused as
+stored, so chunk boundaries and therefore timestamps line up exactly
+with what the first attempt produced. Checkpoints are removed once the
+job's segments have all been read.
+
+Kill-and-resume check: python -m pytest tests/test_checkpoint.py
+"""
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+CHECKPOINTS = os.environ.get('CHECKPOINTS', '1') == '1'
+CHECKPOINT_DIR = os.environ.get('CHECKPOINT_DIR', '/tmp/checkpoints')
+CHECKPOINT_R2 = os.environ.get('CHECKPOINT_R2', '0') == '1'
+
+
+def audio_digest(audio):
+    """sha256 of a decoded array (the download itself may be a stream)"""
+    return hashlib.sha256(memoryview(audio).cast("B")).hexdigest()
+
+
+class LocalCheckpointStore:
+    """One directory per job key, one JSON file per entry, written atomically"""
+
+    def __init__(self, key, directory=None):
+        self.directory = os.path.join(directory or CHECKPOINT_DIR, key)
+
+    def get(self, name):
+        try:
+            with open(os.path.join(self.directory, f"{name}.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, name, data):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{name}.json")
+        # A worker killed mid-write must not leave a truncated checkpoint behind
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class R2CheckpointStore:
+    """Entries as objects under <fileName>.checkpoints/<key>/ in the job's bucket"""
+
+    def __init__(self, key, bucket_name, file_name, s3_client=None):
+        self.bucket_name = bucket_name
+        self.prefix = f"{file_name}.checkpoints/{key}/"
+        self._s3_client = s3_client
+
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            import storage
+            return storage.get_client()
+        return self._s3_client
+
+    def get(self, name):
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=f"{self.prefix}{name}.json")
+            return json.loads(response['Body'].read())
+        except Exception as e:
+            if 'NoSuchKey' not in str(e) and '404' not in str(e):
+                print(f"R2 checkpoint read failed: {e}")
+            return None
+
+    def put(self, name, data):
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket_name, Key=f"{self.prefix}{name}.json",
+                Body=json.dumps(data).encode(), ContentType='application/json',
+            )
+        except Exception as e:
+            print(f"R2 checkpoint write failed: {e}")
+
+    def clear(self):
+        try:
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self.prefix):
+                keys = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+                if keys:
+                    self.s3_client.delete_objects(Bucket=self.bucket_name, Delete={"Objects": keys})
+        except Exception as e:
+            print(f"R2 checkpoint cleanup failed: {e}")
+
+
+class Checkpoint:
+    """Chunk plan + per-chunk results of one job; reads local first, then R2"""
+
+    def __init__(self, stores):
+        self.stores = stores
+        self.resumed = 0
+        # Writes happen off the process pool's result thread
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._pending = []
+
+    def _get(self, name):
+        for store in self.stores:
+            data = store.get(name)
+            if data is not None:
+                return data
+        return None
+
+    def _put(self, name, data):
+        for store in self.stores:
+            store.put(name, data)
+
+    def load_plan(self):
+        plan = self._get("plan")
+        return [tuple(chunk) for chunk in plan] if plan is not None else None
+
+    def save_plan(self, chunks):
+        self._put("plan", [list(chunk) for chunk in chunks])
+
+    def load_chunk(self, index):
+        """(segments, language, probability, seconds) of a finished chunk, or None"""
+        data = self._get(f"chunk-{index:05d}")
+        if data is None:
+            return None
+        self.resumed += 1
+        return tuple(data)
+
+    def save_chunk(self, index, future):
+        """done-callback of a chunk's future"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._pending.append(self._writer.submit(self._put, f"chunk-{index:05d}", list(future.result())))
+
+    def clear(self):
+        for pending in self._pending:
+            pending.result()
+        for store in self.stores:
+            store.clear()
+
+
+def for_job(audio, model_name, job_input, **options):
+    """Checkpoint for a long-audio job, or None when disabled"""
+    if not CHECKPOINTS:
+        return None
+    from chunked import LONG_AUDIO_CHUNK_SECONDS, LONG_AUDIO_OVERLAP_SECONDS
+    from result_cache import cache_key
+    key = cache_key(
+        audio_digest(audio), model_name,
+        chunk_seconds=LONG_AUDIO_CHUNK_SECONDS, overlap_seconds=LONG_AUDIO_OVERLAP_SECONDS, **options
+    )
+    stores = [LocalCheckpointStore(key)]
+    if CHECKPOINT_R2 and job_input.get('bucketName') and job_input.get('fileName'):
+        stores.append(R2CheckpointStore(key, job_input['bucketName'], job_input['fileName']))
+    return Checkpoint(stores)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""Long-audio mode: split at VAD silences and transcribe chunks in parallel.
+
+Each worker process keeps its own WhisperModel, so CPU nodes use all their
+cores instead of decoding one file sequentially on a single model.
+
+Benchmark: python chunked.py [minutes] [model]
+"""
+import functools
+import os
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+import audio_input
+import guard
+import metrics
+import vad
+
+SAMPLING_RATE = 16000
+
+# Files at least this long use the chunked path on CPU
+LONG_AUDIO_MIN_SECONDS = float(os.environ.get('LONG_AUDIO_MIN_SECONDS', '600'))
+LONG_AUDIO_CHUNK_SECONDS = float(os.environ.get('LONG_AUDIO_CHUNK_SECONDS', '120'))
+LONG_AUDIO_OVERLAP_SECONDS = float(os.environ.get('LONG_AUDIO_OVERLAP_SECONDS', '1.0'))
+LONG_AUDIO_WORKERS = int(os.environ.get('LONG_AUDIO_WORKERS', '0'))  # 0 = auto
+
+ChunkedInfo = namedtuple('ChunkedInfo', ['language', 'language_probability', 'duration', 'chunks', 'resumed'])
+
+
+def speech_regions(audio, vad_options=None):
+    """Speech regions in samples, from the job's VAD backend (vad.options_from_job).
+
+    Without a filter the cuts still come from Silero with its defaults, or
+    from the energy detector when onnxruntime is missing.
+    """
+    backend = vad_options["backend"] if vad_options else ("silero" if vad.HAS_SILERO else "energy")
+    parameters = vad_options["parameters"] if vad_options else {}
+    if backend == "energy":
+        return vad.energy_regions(audio, **parameters)
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    return get_speech_timestamps(audio, VadOptions(**parameters))
+
+
+def plan_chunks(regions, total_samples, chunk_seconds=None, overlap_seconds=None):
+    """Pick cut points in silences and return [(start, end, own_start, own_end)].
+
+    own_start/own_end is the part of the timeline a chunk is responsible
+    for; start/end add the overlap on both sides. Cuts go in the middle of
+    the first silence gap after the target length, or fall back to a hard
+    cut when no gap shows up within twice the target.
+    """
+    chunk = int((chunk_seconds or LONG_AUDIO_CHUNK_SECONDS) * SAMPLING_RATE)
+    overlap = int((LONG_AUDIO_OVERLAP_SECONDS if overlap_seconds is None else overlap_seconds) * SAMPLING_RATE)
+
+    # Midpoints of silence gaps between speech regions
+    gaps = [(prev["end"] + nxt["start"]) // 2 for prev, nxt in zip(regions, regions[1:])]
+
+    cuts = [0]
+    gap_index = 0
+    while total_samples - cuts[-1] > chunk * 1.5:
+        target = cuts[-1] + chunk
+        while gap_index < len(gaps) and gaps[gap_index] < target:
+            gap_index += 1
+        if gap_index < len(gaps) and gaps[gap_index] < cuts[-1] + 2 * chunk:
+            cuts.append(gaps[gap_index])
+            gap_index += 1
+        else:
+            cuts.append(target)
+    cuts.append(total_samples)
+
+    return [
+        (max(own_start - overlap, 0), min(own_end + overlap, total_samples), own_start, own_end)
+        for own_start, own_end in zip(cuts, cuts[1:])
+    ]
+
+
+# --- Worker process side ---
+_worker_model = None
+
+
+def _init_worker(model_name, compute_type, cpu_threads):
+    global _worker_model
+    if model_name == "fake":
+        from backends import FakeWhisperModel
+        _worker_model = FakeWhisperModel()
+        return
+    from faster_whisper import WhisperModel
+    _worker_model = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+
+def _transcribe_chunk(task):
+    descriptor, start, end, own_start, own_end, vad_options, options = task
+    # Slice of the parent's shared block; nothing was pickled but the name
+    audio = audio_input.attach(descriptor)[start:end]
+    offset = start / SAMPLING_RATE
+    own_start_s = own_start / SAMPLING_RATE
+    own_end_s = own_end / SAMPLING_RATE
+
+    # Same speech pre-filter as the normal path; loops on noise inside the
+    # chunk are cut short and re-decoded (see guard.py)
+    segments, info = vad.transcribe(guard.GuardedModel(_worker_model), audio, vad_options, **options)
+    kept = []
+    for segment in segments:
+        seg_start = segment.start + offset
+        seg_end = segment.end + offset
+        # Only keep segments centred in this chunk's own range; the overlap
+        # belongs to the neighbour and would otherwise be emitted twice
+        middle = (seg_start + seg_end) / 2
+        if own_start_s <= middle < own_end_s:
+            kept.append({"start": round(seg_start, 3), "end": round(seg_end, 3), "text": segment.text})
+            if segment.words:
+                kept[-1]["words"] = [
+                    {"start": round(w.start + offset, 3), "end": round(w.end + offset, 3), "word": w.word}
+                    for w in segment.words
+                ]
+    return kept, info.language, info.language_probability, own_end_s - own_start_s
+
+
+# --- Parent side ---
+_executor = None
+_executor_config = None
+
+
+def default_workers():
+    return LONG_AUDIO_WORKERS or max(1, (os.cpu_count() or 2) // 2)
+
+
+def get_executor(model_name, compute_type, workers):
+    """Process pool kept alive across jobs so workers stay warm"""
+    global _executor, _executor_config
+    config = (model_name, compute_type, workers)
+    if _executor is None or _executor_config != config:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        cpu_threads = max(1, (os.cpu_count() or workers) // workers)
+        print(f"Starting {workers} chunk workers ({model_name}/{compute_type}, {cpu_threads} threads each)")
+        # spawn: ctranslate2 state in the parent must not be forked
+        _executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, compute_type, cpu_threads),
+        )
+        _executor_config = config
+    return _executor
+
+
+def stitch(chunk_results):
+    """Join chunk segments in order, dropping text repeated across a cut"""
+    last = None
+    for segments in chunk_results:
+        for segment in segments:
+            if last is not None and segment["start"] < last["end"] and segment["text"].strip() == last["text"].strip():
+                continue
+            yield segment
+            last = segment
+
+
+def transcribe_parallel(audio, model_name, compute_type="int8", workers=None, checkpoint=None, vad_options=None,
+                        **options):
+    """Transcribe a 16 kHz mono array in parallel chunks.
+
+    Returns (segments, info) like WhisperModel.transcribe: segments is a
+    generator of {start, end, text} dicts in original-audio time, yielded
+    chunk by chunk as soon as each chunk and its predecessors finish.
+
+    vad_options (vad.options_from_job) picks the detector behind the cuts
+    and filters each chunk the way vad.transcribe does for a whole file.
+    With a checkpoint.Checkpoint, finished chunks are saved as they
+    complete and a retry only transcribes the ones that are missing.
+    """
+    workers = workers or default_workers()
+    # A resumed job keeps the first attempt's cuts, so saved chunks still line up
+    chunks = checkpoint.load_plan() if checkpoint is not None else None
+    if chunks is None:
+        with metrics.stage("vad"):
+            regions = speech_regions(audio, vad_options)
+        chunks = plan_chunks(regions, len(audio))
+        if checkpoint is not None:
+            checkpoint.save_plan(chunks)
+
+    executor = get_executor(model_name, compute_type, workers)
+    shared = audio_input.SharedAudio(audio)
+    futures = []
+    for index, chunk in enumerate(chunks):
+        saved = checkpoint.load_chunk(index) if checkpoint is not None else None
+        if saved is not None:
+            future = Future()
+            future.set_result(saved)
+        else:
+            future = executor.submit(_transcribe_chunk, (shared.descriptor, *chunk, vad_options, options))
+            if checkpoint is not None:
+                future.add_done_callback(functools.partial(checkpoint.save_chunk, index))
+        futures.append(future)
+    resumed = checkpoint.resumed if checkpoint is not None else 0
+    print(f"Long audio: {len(audio) / SAMPLING_RATE:.0f}s in {len(chunks)} chunks on {workers} workers"
+          + (f", {resumed} resumed from checkpoint" if resumed else ""))
+
+    # Language: the one covering most audio when not fixed by the caller
+    if options.get("language"):
+        language, probability = options["language"], 1.0
+    else:
+        first = [future.result() for future in futures]
+        votes = Counter()
+        probabilities = {}
+        for _, lang, prob, seconds in first:
+            # A chunk the filter found no speech in has nothing to say about the language
+            if prob:
+                votes[lang] += seconds
+                probabilities.setdefault(lang, []).append(prob)
+        if votes:
+            language = votes.most_common(1)[0][0]
+            probability = sum(probabilities[language]) / len(probabilities[language])
+        else:
+            language, probability = first[0][1], 0.0
+
+    info = ChunkedInfo(language, probability, len(audio) / SAMPLING_RATE, len(chunks), resumed)
+    return _stitched(futures, shared, checkpoint), info
+
+
+def _stitched(futures, shared, checkpoint=None):
+    try:
+        yield from stitch(future.result()[0] for future in futures)
+        if checkpoint is not None:
+            # Whole job delivered: a later retry has nothing left to resume
+            checkpoint.clear()
+    finally:
+        # Every chunk has finished (or failed) once its result was read
+        for future in futures:
+            future.exception()
+        shared.close()
+
+
+def should_use_chunked(duration, device):
+    return device == "cpu" and duration >= LONG_AUDIO_MIN_SECONDS
+
+
+# --- Benchmark ---
+def synthetic_audio(seconds, seed=0):
+    """Bursts of voiced-like tones separated by silences, 16 kHz float32"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    pieces = []
+    total = int(seconds * SAMPLING_RATE)
+    length = 0
+    while length < total:
+        burst = rng.uniform(2.0, 8.0)
+        t = np.arange(int(burst * SAMPLING_RATE)) / SAMPLING_RATE
+        f0 = rng.uniform(110, 220)
+        tone = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6))
+        tone *= 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)  # syllable-like envelope
+        pieces.append(0.2 * tone + 0.01 * rng.standard_normal(len(t)))
+        pieces.append(np.zeros(int(rng.uniform(0.5, 2.0) * SAMPLING_RATE)))
+        length += len(t) + len(pieces[-1])
+    return np.clip(np.concatenate(pieces)[:total], -1, 1).astype(np.float32)
+
+
+def synthetic_wav(path, minutes):
+    """Write synthetic_audio() as a 16-bit mono WAV"""
+    import wave
+    import numpy as np
+
+    audio = synthetic_audio(minutes * 60)
+    with wave.open(path, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLING_RATE)
+        out.writeframes((audio * 32767).astype(np.int16).tobytes())
+
+
+def benchmark(minutes=5.0, model_name="tiny"):
+    import tempfile
+    from faster_whisper import WhisperModel, decode_audio
+
+    path = os.path.join(tempfile.mkdtemp(), "synthetic.wav")
+    synthetic_wav(path, minutes)
+    audio = decode_audio(path, sampling_rate=SAMPLING_RATE)
+
+    model = WhisperModel(model_name, device="cpu", compute_type="int8")
+    start = time.perf_counter()
+    segments, _ = model.transcribe(audio, beam_size=5)
+    single_count = sum(1 for _ in segments)
+    single = time.perf_counter() - start
+
+    # First call spawns and warms the workers; time the second one
+    list(transcribe_parallel(audio, model_name, beam_size=5)[0])
+    start = time.perf_counter()
+    parallel_count = sum(1 for _ in transcribe_parallel(audio, model_name, beam_size=5)[0])
+    parallel = time.perf_counter() - start
+
+    print(f"{minutes:.0f} min synthetic audio, model {model_name}, {default_workers()} workers")
+    print(f"  single call: {single:7.2f}s ({single_count} segments)")
+    print(f"  chunked:     {parallel:7.2f}s ({parallel_count} segments)")
+    print(f"  speedup:     {single / parallel:7.2f}x")
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else 5.0, sys.argv[2] if len(sys.argv) > 2 else "tiny")
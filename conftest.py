@@ -0,0 +1,2 @@
+# test_handler.py is RunPod's smoke-test handler, not a pytest module
+collect_ignore = ["test_handler.py"]
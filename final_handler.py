@@ -1,9 +1,15 @@
 #!/usr/bin/env python3
 """Final working handler - simplified and tested"""
-import runpod
 import os
 import tempfile
 import subprocess
+import audio_input
+import langprobe
+import storage
+from model_pool import get_openai_whisper_model
+from subtitles import render_segments
+from startup import profile_if_requested
+from warmup import warm_start
 
 def handler(job):
     """Simple handler that just works"""
@@ -20,44 +26,38 @@ def handler(job):
     
     # Create temp directory
     temp_dir = tempfile.mkdtemp()
-    input_file = os.path.join(temp_dir, "input.mp3")
+    input_file = audio_input.input_path(temp_dir, file_name)
     
     try:
-        # Download from R2
-        import boto3
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=f"https://{os.environ.get('R2_ACCOUNT_ID')}.r2.cloudflarestorage.com",
-            aws_access_key_id=os.environ.get('R2_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.environ.get('R2_SECRET_ACCESS_KEY')
-        )
-        
+        # Download from R2 (shared, pooled client)
         print(f"Downloading {file_name} from {bucket_name}")
-        s3_client.download_file(bucket_name, file_name, input_file)
+        storage.download(bucket_name, file_name, input_file)
         
-        # Use whisper Python API (most reliable)
-        import whisper
+        # Use whisper Python API (most reliable), kept warm in the model pool
         print(f"Loading Whisper model: {model}")
-        whisper_model = whisper.load_model(model)
+        whisper_model, _ = get_openai_whisper_model(model)
+        
+        # Decoded once to 16 kHz mono, whatever the container
+        audio, audio_report = audio_input.normalize(input_file)
+        
+        # Language from the job's hint or a probe on a few sampled windows
+        probe = langprobe.probe(whisper_model, audio, job_input.get('language'))
         
         print("Transcribing audio...")
-        result = whisper_model.transcribe(input_file)
+        result = whisper_model.transcribe(audio, language=langprobe.language_for(probe))
         
         # Generate SRT
-        srt_lines = []
-        for i, segment in enumerate(result["segments"], 1):
-            start = format_timestamp(segment["start"])
-            end = format_timestamp(segment["end"])
-            text = segment["text"].strip()
-            srt_lines.extend([str(i), f"{start} --> {end}", text, ""])
+        srt_content = render_segments("srt", result["segments"])
         
         return {
             "transcription": result["text"],
-            "srt": "\n".join(srt_lines),
-            "detected_language": result.get("language", "unknown"),
+            "srt": srt_content,
+            "detected_language": result.get("language") or langprobe.language_for(probe) or "unknown",
             "duration": result["segments"][-1]["end"] if result["segments"] else 0,
             "model_used": model,
-            "user_plan": user_plan
+            "user_plan": user_plan,
+            "audio": audio_report,
+            "language_probe": langprobe.report(probe)
         }
         
     except Exception as e:
@@ -70,14 +70,10 @@ def handler(job):
         if os.path.exists(temp_dir):
             subprocess.run(["rm", "-rf", temp_dir])
 
-def format_timestamp(seconds):
-    """Convert seconds to SRT timestamp format"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int((seconds % 1) * 1000)
-    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
-
 if __name__ == "__main__":
+    profile_if_requested("final_handler", "openai-whisper/medium,openai-whisper/large-v2")
     print("Final handler ready - Will use medium for free, large-v2 for paid")
+    # Load and warm up the models before accepting the first job
+    warm_start("openai-whisper/medium,openai-whisper/large-v2")
+    import runpod
     runpod.serverless.start({"handler": handler})
\ No newline at end of file
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""Repetition-loop and hallucination guard around WhisperModel.transcribe().
+
+On noise, music or long silences Whisper can lock onto one phrase and
+repeat it for minutes, spending a full decode on every 30 s window of
+it. The guard watches the segment generator as it is consumed:
+
+- the same text GUARD_REPEATS times in a row, or one segment whose
+  n-grams mostly repeat ("repetition");
+- compression ratio above GUARD_MAX_COMPRESSION ("compression");
+- no_speech_prob above GUARD_NO_SPEECH with avg_logprob below
+  GUARD_MIN_LOGPROB, i.e. text made up over silence ("silence").
+
+On a trigger it closes the running decode (the generator is lazy, so
+the rest of the runaway is never decoded), drops the suspect segments,
+re-decodes only GUARD_WINDOW_SECONDS from the first of them with
+GUARD_FALLBACK (no previous-text conditioning; greedy first, then
+temperature fallback), and resumes the normal decode after that window.
+Both decode a slice of the array, so features are only computed for the
+audio still to come. With Silero VAD the speech regions are computed
+once per job and passed as clip_timestamps. Once GUARD_MAX_RETRIES
+re-decodes are spent, the rest of the job passes through unguarded.
+
+    segments, info = guard.transcribe(model, audio, report=report, **options)
+    vad.transcribe(guard.GuardedModel(model, report), audio, vad_options, **options)
+
+Only WhisperModel is guarded; BatchedInferencePipeline already decodes
+without previous-text conditioning, which is what starts the loops.
+
+Decode time saved on crafted inputs: python guard.py [minutes] [model]
+"""
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, replace
+
+SAMPLING_RATE = 16000
+
+# Off by default: turning it on changes the output (and the cache keys) of existing jobs
+GUARD = os.environ.get('GUARD', '0') == '1'
+GUARD_REPEATS = int(os.environ.get('GUARD_REPEATS', '3'))
+GUARD_NGRAM_RATIO = float(os.environ.get('GUARD_NGRAM_RATIO', '0.5'))
+GUARD_MAX_COMPRESSION = float(os.environ.get('GUARD_MAX_COMPRESSION', '2.4'))
+# Whisper's own no-speech rule, applied to what it emitted anyway
+GUARD_NO_SPEECH = float(os.environ.get('GUARD_NO_SPEECH', '0.6'))
+GUARD_MIN_LOGPROB = float(os.environ.get('GUARD_MIN_LOGPROB', '-1.0'))
+GUARD_WINDOW_SECONDS = float(os.environ.get('GUARD_WINDOW_SECONDS', '30'))
+# Each re-decode costs at most GUARD_WINDOW_SECONDS of fallback decoding
+GUARD_MAX_RETRIES = int(os.environ.get('GUARD_MAX_RETRIES', '20'))
+
+GUARD_FALLBACK = {
+    "condition_on_previous_text": False,
+    "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+}
+
+NGRAM = 3
+NGRAM_MIN_WORDS = 12
+
+_words = re.compile(r"\w+")
+
+
+def _normalized(text):
+    return " ".join(_words.findall(text.lower()))
+
+
+def settings():
+    """Guard configuration for cache and dedup keys, or None when the guard is off"""
+    if not GUARD:
+        return None
+    return {
+        "repeats": GUARD_REPEATS,
+        "ngram_ratio": GUARD_NGRAM_RATIO,
+        "max_compression": GUARD_MAX_COMPRESSION,
+        "no_speech": GUARD_NO_SPEECH,
+        "min_logprob": GUARD_MIN_LOGPROB,
+        "window_seconds": GUARD_WINDOW_SECONDS,
+        "max_retries": GUARD_MAX_RETRIES,
+    }
+
+
+def repeated_ngrams(text, n=NGRAM):
+    """Share of a text's n-grams that are repeats of an earlier one"""
+    words = _normalized(text).split()
+    if len(words) < NGRAM_MIN_WORDS:
+        return 0.0
+    grams = Counter(tuple(words[i:i + n]) for i in range(len(words) - n + 1))
+    total = sum(grams.values())
+    return (total - len(grams)) / total
+
+
+def suspicious(segment):
+    """Why a single segment looks like a hallucination, or None"""
+    compression = getattr(segment, "compression_ratio", None)
+    logprob = getattr(segment, "avg_logprob", None)
+    no_speech = getattr(segment, "no_speech_prob", None)
+    if compression is not None and compression > GUARD_MAX_COMPRESSION:
+        return "compression"
+    if (logprob is not None and no_speech is not None
+            and no_speech > GUARD_NO_SPEECH and logprob < GUARD_MIN_LOGPROB):
+        return "silence"
+    if repeated_ngrams(segment.text) > GUARD_NGRAM_RATIO:
+        return "repetition"
+    return None
+
+
+class GuardedModel:
+    """WhisperModel stand-in whose transcribe() runs behind the guard (for vad.transcribe and friends)"""
+
+    def __init__(self, model, report=None):
+        self.model = model
+        self.report = {} if report is None else report
+
+    def transcribe(self, audio, **options):
+        return transcribe(self.model, audio, report=self.report, **options)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+def transcribe(model, audio, report=None, enabled=None, **options):
+    """model.transcribe() with the guard; returns (segments, info) like WhisperModel.transcribe.
+
+    report (a dict) is filled as segments are consumed: "triggers" and one
+    entry per guarded window in "windows". It stays empty when nothing fired.
+    enabled overrides GUARD.
+    """
+    import numpy as np
+
+    segments, info = model.transcribe(audio, **options)
+    if not (GUARD if enabled is None else enabled) or not isinstance(audio, np.ndarray):
+        return segments, info
+    report = {} if report is None else report
+    # Later decodes keep the language of the first one instead of detecting again
+    options = {**options, "language": options.get("language") or info.language}
+    return _guarded(model, audio, options, segments, report), info
+
+
+def _moved(item, offset):
+    changes = {"start": item.start + offset, "end": item.end + offset}
+    return item._replace(**changes) if hasattr(item, "_replace") else replace(item, **changes)
+
+
+def _shifted(segments, offset):
+    """Segments (and words) of a slice decoded from offset seconds, in file time"""
+    try:
+        for segment in segments:
+            moved = _moved(segment, offset)
+            if getattr(segment, "words", None):
+                words = [_moved(word, offset) for word in segment.words]
+                moved = moved._replace(words=words) if hasattr(moved, "_replace") else replace(moved, words=words)
+            yield moved
+    finally:
+        if hasattr(segments, "close"):
+            segments.close()
+
+
+def speech_regions(audio, options):
+    """[(start, end)] in seconds from Silero, as the decode's vad_filter would find them"""
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    parameters = options.get("vad_parameters") or {}
+    if isinstance(parameters, dict):
+        parameters = VadOptions(**parameters)
+    return [(region["start"] / SAMPLING_RATE, region["end"] / SAMPLING_RATE)
+            for region in get_speech_timestamps(audio, parameters)]
+
+
+def _decode(model, audio, options, regions, start, end=None):
+    """Decode audio[start:end] (seconds), only its speech regions when regions is given; file-time segments"""
+    piece = audio[int(start * SAMPLING_RATE):None if end is None else int(end * SAMPLING_RATE)]
+    end = len(audio) / SAMPLING_RATE if end is None else end
+    options = dict(options)
+    if regions is not None:
+        # Silero already ran once for the whole job; the slice decodes just its speech
+        options.pop("vad_filter", None)
+        options.pop("vad_parameters", None)
+        clips = []
+        for region_start, region_end in regions:
+            if region_end > start and region_start < end:
+                clips += [max(region_start, start) - start, min(region_end, end) - start]
+        if not clips:
+            return iter(())
+        options["clip_timestamps"] = clips
+    segments, _ = model.transcribe(piece, **options)
+    return _shifted(segments, start)
+
+
+def _guarded(model, audio, options, segments, report):
+    duration = len(audio) / SAMPLING_RATE
+    regions = None  # Silero speech regions, computed on the first trigger when the decode uses them
+    retries = 0
+    while True:
+        held = []  # current run of identical segments, not yet emitted
+        trigger = None
+        for segment in segments:
+            reason = suspicious(segment)
+            if reason is None and held and _normalized(segment.text) == _normalized(held[-1].text):
+                held.append(segment)
+                if len(held) < GUARD_REPEATS:
+                    continue
+                reason = "repetition"
+            elif reason is None:
+                yield from held
+                held = [segment]
+                continue
+            else:
+                # The run before a single bad segment is fine
+                yield from held
+                held = [segment]
+            if retries >= GUARD_MAX_RETRIES:
+                # Re-decode budget spent: better a loop in the output than dropped speech
+                report["unguarded_from"] = round(held[0].start, 3)
+                print(f"[guard] {GUARD_MAX_RETRIES} re-decodes spent; unguarded from {held[0].start:.1f}s")
+                yield from held
+                yield from segments
+                return
+            trigger = (held[0].start, reason, len(held))
+            break
+        if trigger is None:
+            yield from held
+            return
+
+        # Stop the runaway decode where it is; the rest of it is never computed
+        if hasattr(segments, "close"):
+            segments.close()
+        start, reason, dropped = trigger
+        end = min(start + GUARD_WINDOW_SECONDS, duration)
+        window = {"start": round(start, 3), "end": round(end, 3), "reason": reason, "dropped": dropped}
+        report["triggers"] = report.get("triggers", 0) + 1
+        report.setdefault("windows", []).append(window)
+        print(f"[guard] {reason} at {start:.1f}s: re-decoding {start:.1f}-{end:.1f}s")
+        if regions is None and options.get("vad_filter"):
+            regions = speech_regions(audio, options)
+
+        retries += 1
+        kept = 0
+        for segment in _decode(model, audio, {**options, **GUARD_FALLBACK}, regions, start, end):
+            # Whatever still looks wrong with the fallback settings is treated as non-speech
+            if suspicious(segment) is None:
+                kept += 1
+                yield segment
+        window["kept"] = kept
+
+        if end >= duration:
+            return
+        segments = _decode(model, audio, options, regions, end)
+
+
+# --- Benchmark ---
+@dataclass
+class LoopSegment:
+    start: float
+    end: float
+    text: str
+    words: list = None
+    avg_logprob: float = -0.2
+    compression_ratio: float = 1.1
+    no_speech_prob: float = 0.05
+
+
+class LoopingModel:
+    """Fake WhisperModel: a 2 s line of speech at a time, except over white noise, where (with
+    previous-text conditioning) it repeats one phrase and every line costs a runaway decode;
+    with GUARD_FALLBACK settings noise comes out as silence. Like faster-whisper, every call
+    first pays for the features of the whole array it is given (feature_cost per audio second).
+    Default costs are a CPU decode at ~10x real time with ~1 ms of features per audio second,
+    divided by 50."""
+    is_multilingual = True
+
+    def __init__(self, line_cost=0.004, runaway_cost=0.03, feature_cost=0.00002, segment_seconds=2.0):
+        self.line_cost = line_cost
+        self.runaway_cost = runaway_cost
+        self.feature_cost = feature_cost
+        self.segment_seconds = segment_seconds
+
+    @staticmethod
+    def noise(piece):
+        """White noise changes sample to sample far more than tones do"""
+        import numpy as np
+        level = float(np.std(piece))
+        return level > 0.02 and float(np.std(np.diff(piece))) > level
+
+    def transcribe(self, audio, clip_timestamps="0", condition_on_previous_text=True, language=None, **options):
+        from backends import FakeInfo
+
+        duration = len(audio) / SAMPLING_RATE
+        points = list(clip_timestamps) if not isinstance(clip_timestamps, str) else [float(clip_timestamps)]
+        if len(points) % 2:
+            points.append(duration)
+        clips = list(zip(points[::2], points[1::2]))
+
+        def generate():
+            time.sleep(self.feature_cost * duration)
+            for clip_start, clip_end in clips:
+                t = clip_start
+                while t < clip_end:
+                    end = min(t + self.segment_seconds, clip_end)
+                    looping = self.noise(audio[int(t * SAMPLING_RATE):int(end * SAMPLING_RATE)])
+                    if looping and condition_on_previous_text:
+                        time.sleep(self.runaway_cost)
+                        yield LoopSegment(t, end, " Thank you for watching.", avg_logprob=-0.4,
+                                          compression_ratio=1.2, no_speech_prob=0.3)
+                    elif not looping:
+                        time.sleep(self.line_cost)
+                        yield LoopSegment(t, end, f" Line {int(t * 7919) % 1000}.")
+                    t = end
+
+        return generate(), FakeInfo(language or "en", 1.0, duration, duration)
+
+
+def crafted_audio(minutes, loop_ranges):
+    """Synthetic speech with noise stretches at loop_ranges (seconds, clamped to the audio)"""
+    import numpy as np
+    from chunked import synthetic_audio
+
+    audio = synthetic_audio(minutes * 60)
+    rng = np.random.default_rng(2)
+    for a, b in loop_ranges:
+        a, b = min(int(a * SAMPLING_RATE), len(audio)), min(int(b * SAMPLING_RATE), len(audio))
+        audio[a:b] = (0.05 * rng.standard_normal(b - a)).astype(np.float32)
+    return audio
+
+
+def benchmark(minutes=20.0, model_name=None):
+    """Unguarded vs guarded decode time and garbage output on inputs with loop-inducing stretches"""
+    # Three stretches of noise, 5-15% of the file each (1-3 minutes on 20 minutes)
+    # (on the fake model's 2 s segment grid)
+    seconds = minutes * 60
+    loop_ranges = [(2 * round(a * seconds / 2), 2 * round(b * seconds / 2))
+                   for a, b in ((0.15, 0.20), (0.50, 0.65), (0.80, 0.90))]
+    audio = crafted_audio(minutes, loop_ranges)
+    if model_name:
+        from faster_whisper import WhisperModel
+        model = WhisperModel(model_name, device="cpu", compute_type="int8")
+    else:
+        model = LoopingModel()
+
+    def garbage(segments):
+        return sum(1 for s in segments if any(a <= s.start < b for a, b in loop_ranges))
+
+    start = time.perf_counter()
+    plain = list(model.transcribe(audio, beam_size=5)[0])
+    plain_seconds = time.perf_counter() - start
+
+    report = {}
+    start = time.perf_counter()
+    guarded = list(transcribe(model, audio, report=report, enabled=True, beam_size=5)[0])
+    guarded_seconds = time.perf_counter() - start
+
+    clean = [s for s in plain if not any(a <= s.start < b for a, b in loop_ranges)]
+    print(f"{minutes:g} min, {sum(b - a for a, b in loop_ranges) / 60:.1f} min of loop-inducing noise, "
+          f"model {model_name or 'fake (looping)'}")
+    print(f"  unguarded: {plain_seconds:6.2f}s, {len(plain)} segments, {garbage(plain)} inside the noise")
+    print(f"  guarded:   {guarded_seconds:6.2f}s, {len(guarded)} segments, {garbage(guarded)} inside the noise, "
+          f"{report.get('triggers', 0)} windows re-decoded"
+          + (f", unguarded from {report['unguarded_from']:g}s" if "unguarded_from" in report else ""))
+    print(f"  saved:     {plain_seconds - guarded_seconds:6.2f}s ({1 - guarded_seconds / plain_seconds:.0%})")
+    if not model_name:
+        same = [(s.start, s.end) for s in guarded] == [(s.start, s.end) for s in clean]
+        print(f"  speech outside the noise unchanged: {same}")
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else 20.0, sys.argv[2] if len(sys.argv) > 2 else None)
@@ -1,40 +1,356 @@
 # handler.py
-import runpod
-import boto3
 import os
-from faster_whisper import WhisperModel
+import shutil
+import tempfile
+import time
+import asyncio
+from model_pool import get_whisper_model
+import artifacts
+import audio_input
+import backfill
+import checkpoint
+import chunked
+import guard
+import langprobe
+import metrics
+import resegment
+import storage
+import translate
+import vad
+from inflight import InFlight
+from prefetch import PREFETCH_DEPTH, Prefetcher, ModelGate
+from result_cache import RESULT_CACHE, ResultCache, audio_hash, cache_key
+from startup import profile_if_requested
+from warmup import warm_start
+from sinks import consume, feed, results, TextSink, SrtSink, CueSink, SegmentsJsonSink
 
 # --- CONFIGURAÇÃO INICIAL ---
-# Isso é executado uma vez quando o pod inicia
-print("Iniciando o worker...")
-# Carregamos o modelo de IA na memória da GPU.
+# Módulos pesados (faster_whisper, boto3, runpod) só são importados quando
+# usados; o modelo é carregado e aquecido no boot por warm_start().
 # 'base' é um modelo pequeno e rápido para testes. Mude para 'medium' ou 'large' para mais precisão.
-# 'device="cuda"' garante que estamos usando a GPU.
-model = WhisperModel("base", device="cuda", compute_type="float16")
-print("Modelo Whisper carregado com sucesso.")
+# Sem GPU disponível o pool cai para CPU/int8 automaticamente.
+MODEL_NAME = "base"
 
-# Configura o cliente para conectar ao Cloudflare R2
-print("Configurando cliente R2...")
+# O cliente do Cloudflare R2 é compartilhado e criado só no primeiro uso
 print(f"R2_ACCOUNT_ID presente: {bool(os.environ.get('R2_ACCOUNT_ID'))}")
 print(f"R2_ACCESS_KEY_ID presente: {bool(os.environ.get('R2_ACCESS_KEY_ID'))}")
 print(f"R2_SECRET_ACCESS_KEY presente: {bool(os.environ.get('R2_SECRET_ACCESS_KEY'))}")
 
-s3_client = boto3.client(
-    's3',
-    endpoint_url=f"https://{os.environ.get('R2_ACCOUNT_ID')}.r2.cloudflarestorage.com",
-    aws_access_key_id=os.environ.get('R2_ACCESS_KEY_ID'),
-    aws_secret_access_key=os.environ.get('R2_SECRET_ACCESS_KEY')
-)
-print("Cliente R2 configurado com sucesso.")
+# Cache de resultados: o mesmo áudio com as mesmas opções não é transcrito de novo
+result_cache = ResultCache() if RESULT_CACHE else None
+# Saídas incluídas na resposta (fazem parte da chave do cache)
+OUTPUTS = ["transcription", "srt", "segments"]
+# Formatos extras de legenda que o job pode pedir em "formats"
+EXTRA_FORMATS = ["vtt", "ass"]
+
+# Entrada em streaming: decodifica direto do R2, sem arquivo temporário
+STREAM_INPUT = os.environ.get('STREAM_INPUT', '0') == '1'
+
+# Modo streaming: o handler vira um generator e envia resultados parciais
+STREAM_RESULTS = os.environ.get('STREAM_RESULTS', '0') == '1'
+# Quantos segmentos finalizados vão em cada resultado parcial
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', '10'))
+
+# Modo batch: vários jobs curtos simultâneos são decodificados juntos
+BATCH_JOBS = os.environ.get('BATCH_JOBS', '0') == '1'
+# Quantos jobs o RunPod pode entregar ao mesmo tempo para este worker
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '16'))
+scheduler = None
+
+# Modo prefetch: baixa a mídia dos jobs na fila enquanto o modelo trabalha
+PREFETCH_JOBS = os.environ.get('PREFETCH_JOBS', '0') == '1'
+
+# Jobs idênticos simultâneos (retry, clique duplo) esperam o primeiro em vez de rodar de novo
+DEDUP_JOBS = os.environ.get('DEDUP_JOBS', '1') == '1'
+in_flight = InFlight()
+
+# Prefixo das pastas temporárias de download, uma por job
+DOWNLOAD_DIR_PREFIX = "job-"
 
 # --- FUNÇÕES AUXILIARES ---
-def format_timestamp(seconds):
-    """Converte segundos para formato SRT (hh:mm:ss,ms)"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millisecs = int((seconds % 1) * 1000)
-    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millisecs:03d}"
+def download_input(job_input):
+    """Baixa o arquivo do job do R2. Retorna (caminho_local, erro)."""
+    bucket_name = job_input.get('bucketName')
+    file_name = job_input.get('fileName')
+
+    if not bucket_name or not file_name:
+        return None, {"error": "bucketName e fileName são obrigatórios."}
+
+    # Cada job baixa na própria pasta temporária: jobs simultâneos com o mesmo
+    # fileName (batch, prefetch) não sobrescrevem nem apagam o arquivo um do outro
+    local_file_path = audio_input.input_path(tempfile.mkdtemp(prefix=DOWNLOAD_DIR_PREFIX), file_name)
+    print(f"Baixando arquivo '{file_name}' do bucket '{bucket_name}'...")
+
+    try:
+        print(f"Tentando baixar do bucket: {bucket_name}, arquivo: {file_name}")
+        storage.download(bucket_name, file_name, local_file_path)
+    except Exception as e:
+        print(f"Erro detalhado: {str(e)}")
+        release_input(local_file_path)
+        return None, {"error": f"Erro ao baixar arquivo do R2: {str(e)}. Verifique se o arquivo '{file_name}' existe no bucket '{bucket_name}'."}
+
+    return local_file_path, None
+
+def open_input(job_input):
+    """
+    Abre a entrada do job. Retorna (origem, erro), onde origem é o caminho
+    local baixado ou, com streamInput, um leitor do R2 que o decodificador
+    consome enquanto o download ainda está em andamento.
+    """
+    if not job_input.get('streamInput', STREAM_INPUT):
+        return download_input(job_input)
+
+    bucket_name = job_input.get('bucketName')
+    file_name = job_input.get('fileName')
+    if not bucket_name or not file_name:
+        return None, {"error": "bucketName e fileName são obrigatórios."}
+    try:
+        return storage.open_stream(bucket_name, file_name), None
+    except Exception as e:
+        print(f"Erro detalhado: {str(e)}")
+        return None, {"error": f"Erro ao abrir arquivo do R2: {str(e)}. Verifique se o arquivo '{file_name}' existe no bucket '{bucket_name}'."}
+
+def release_input(source):
+    """Apaga o arquivo baixado (e a pasta do job) ou fecha o leitor do R2"""
+    if isinstance(source, str):
+        if os.path.exists(source):
+            os.remove(source)
+        directory = os.path.dirname(source)
+        if os.path.basename(directory).startswith(DOWNLOAD_DIR_PREFIX):
+            shutil.rmtree(directory, ignore_errors=True)
+    elif source is not None:
+        print(f"Streaming concluído: {source.stats()}")
+        source.close()
+
+def input_digest(source):
+    """Identidade do conteúdo: sha256 do arquivo ou ETag do objeto no R2"""
+    if isinstance(source, str):
+        return audio_hash(source)
+    return f"etag:{source.etag}"
+
+def job_options(job_input):
+    """Opções que mudam o resultado; fazem parte das chaves de cache e de deduplicação"""
+    options = {
+        "beam_size": 5,
+        "language": job_input.get('language'),
+        "outputs": OUTPUTS + requested_formats(job_input),
+        "resegment": resegment.options_from_job(job_input),
+        "vad": vad.options_from_job(job_input),
+    }
+    # Só entra na chave quando pedido, para não invalidar o cache existente
+    if job_input.get('targetLanguage'):
+        options["target_language"] = job_input['targetLanguage']
+        # Traduções de tradutores diferentes não dividem a mesma entrada
+        options["translator"] = translate.translator_name()
+    # Idem para o guard de repetição, que muda os segmentos quando ligado
+    if guard.GUARD:
+        options["guard"] = guard.settings()
+    return options
+
+def lookup_cache(source, job_input):
+    """Procura o resultado no cache. Retorna (chave, resultado ou None)."""
+    if result_cache is None or job_input.get('noCache'):
+        return None, None
+    key = cache_key(input_digest(source), MODEL_NAME, **job_options(job_input))
+    cached = result_cache.get(key, job_input.get('bucketName'), job_input.get('fileName'))
+    if cached is not None:
+        print(f"Resultado encontrado no cache ({key[:12]}), pulando a transcrição.")
+        cached["cache"] = "hit"
+    return key, cached
+
+def store_cache(key, response, job_input):
+    """Guarda a resposta no cache e marca como miss"""
+    if key is not None:
+        result_cache.put(key, response, job_input.get('bucketName'), job_input.get('fileName'))
+        response["cache"] = "miss"
+    return response
+
+def transcribe_input(audio, job_input):
+    """
+    Transcreve o áudio já normalizado (16 kHz mono float32). Áudios longos
+    em CPU (ou com longAudio=true) são divididos em silêncios e processados
+    em paralelo por vários processos.
+    Com "resegment", as legendas são redivididas usando o tempo de cada palavra.
+    Com targetLanguage "en", o Whisper já decodifica traduzindo (task="translate").
+    O idioma é fixado antes pela sonda (ou pelo "language" do job).
+    Trechos em que o modelo entra em loop são redecodificados pelo guard.
+    A sonda de idioma e o guard são relatados em "timings", fora do cache.
+    """
+    resegment_options = resegment.options_from_job(job_input)
+    options = {"beam_size": 5}
+    if resegment_options:
+        options["word_timestamps"] = True
+    # Tradução para inglês sai do próprio Whisper, na mesma decodificação
+    if translate.same_pass(job_input.get('targetLanguage')):
+        options["task"] = "translate"
+
+    probe = probe_language(audio, job_input)
+    options["language"] = langprobe.language_for(probe)
+    # Áudio claramente em inglês pode ir para um modelo só-inglês mais rápido
+    model_name = MODEL_NAME
+    if "task" not in options:
+        model_name = langprobe.english_variant(
+            MODEL_NAME, probe, len(audio) / chunked.SAMPLING_RATE, langprobe.loaded_models()
+        )
+
+    # Preenchido enquanto os segmentos são consumidos; vazio se o guard não agiu
+    guard_report = {}
+    segments, info = decode_segments(audio, job_input, options, model_name, guard_report)
+    if resegment_options:
+        segments = resegment.resegment(segments, resegment_options)
+    metrics.note("language_probe", langprobe.report(probe, model_name))
+    metrics.note("guard", guard_report)
+    return segments, info
+
+def probe_language(audio, job_input):
+    """Detecta o idioma em poucas janelas curtas do áudio; o "language" do job pula a detecção"""
+    with metrics.stage("language_probe"):
+        return langprobe.probe(get_model()[0], audio, job_input.get('language'))
+
+def get_model(model_name=MODEL_NAME):
+    """Modelo do pool: (modelo, info). O principal já vem carregado do boot."""
+    return get_whisper_model(model_name)
+
+def decode_segments(audio, job_input, options, model_name=MODEL_NAME, guard_report=None):
+    """
+    Escolhe entre a transcrição normal e a paralela para áudios longos.
+    As duas passam pelo guard de repetição (guard.py); na normal, o que ele
+    fez fica em guard_report.
+    """
+    model, model_info = get_model(model_name)
+    # Pré-filtro de fala: pula silêncio (e música, com Silero) antes do modelo
+    vad_options = vad.options_from_job(job_input)
+    long_audio = job_input.get('longAudio')
+    duration = len(audio) / chunked.SAMPLING_RATE
+    if long_audio or (long_audio is None and chunked.should_use_chunked(duration, model_info["device"])):
+        # Os trechos são cortados nos silêncios achados pelo backend do job, que também filtra cada trecho
+        # Trechos prontos ficam salvos: um retry do mesmo job continua de onde parou
+        return chunked.transcribe_parallel(
+            audio, model_name, compute_type=model_info["compute_type"],
+            checkpoint=checkpoint.for_job(audio, model_name, job_input, vad=vad_options, **options),
+            vad_options=vad_options, **options
+        )
+    return vad.transcribe(guard.GuardedModel(model, guard_report), audio, vad_options, **options)
+
+def decode_input(source):
+    """Decodifica a entrada uma única vez; todas as etapas usam o mesmo array"""
+    with metrics.stage("audio_decode"):
+        audio, audio_report = audio_input.normalize(source)
+    # Duração, tempo de decodificação e memória do áudio vão em "timings"
+    metrics.note("audio", audio_report)
+    return audio
+
+def requested_formats(job_input):
+    """Formatos extras pedidos pelo job (ex.: "formats": ["vtt", "ass"])"""
+    return [fmt for fmt in EXTRA_FORMATS if fmt in (job_input.get('formats') or [])]
+
+def output_sinks(job_input):
+    """Saídas geradas em uma única passada pelos segmentos"""
+    sinks = {
+        "transcription": TextSink(),
+        "srt": SrtSink(),
+        "segments": SegmentsJsonSink(),
+    }
+    for fmt in requested_formats(job_input):
+        sinks[fmt] = CueSink(fmt)
+    return sinks
+
+def translate_outputs(outputs, info, job_input):
+    """
+    Legendas traduzidas para targetLanguage, com os mesmos tempos.
+    Inglês já veio traduzido do Whisper (task="translate"); os outros idiomas passam
+    pelo tradutor de texto em lotes, com cache por segmento.
+    """
+    target_language = job_input.get('targetLanguage')
+    if not target_language:
+        return None
+    if translate.same_pass(target_language):
+        # As saídas principais já estão em inglês
+        return {"language": "en", "method": "whisper", "source_language": info.language}
+    try:
+        with metrics.stage("translate"):
+            segments, stats = translate.translate_segments(outputs["segments"], info.language, target_language)
+            translated = consume(segments, output_sinks(job_input))
+    except Exception as e:
+        # A transcrição continua válida mesmo sem a tradução
+        print(f"Erro na tradução: {str(e)}")
+        return {"language": target_language, "error": f"Erro na tradução: {str(e)}"}
+    return {"language": target_language, "method": "text", "source_language": info.language, **translated, **stats}
+
+def build_response(outputs, info, translation=None):
+    """Monta a resposta final no formato que o site espera"""
+    response = {
+        "transcription": outputs["transcription"],
+        "srt": outputs["srt"],
+        "segments": outputs["segments"],
+        "detected_language": info.language,
+        "duration": info.duration
+    }
+    for fmt in EXTRA_FORMATS:
+        if fmt in outputs:
+            response[fmt] = outputs[fmt]
+    # Segundos de fala decodificados e de silêncio pulados pelo pré-filtro
+    vad_summary = vad.summary(info)
+    if vad_summary:
+        response["vad"] = vad_summary
+    if translation is not None:
+        response["translation"] = translation
+    # Trechos reaproveitados de uma tentativa anterior interrompida
+    if getattr(info, "resumed", 0):
+        response["resumed_chunks"] = info.resumed
+    return response
+
+def process_input(source, job_input):
+    """Cache, transcrição e resposta para uma entrada já aberta"""
+    print("Iniciando a transcrição...")
+    with metrics.stage("cache_lookup"):
+        key, cached = lookup_cache(source, job_input)
+    if cached is not None:
+        return cached
+
+    audio = decode_input(source)
+    # A sonda fixa o idioma; sem ela, transcribe() detecta antes do primeiro segmento
+    with metrics.stage("prepare"):
+        segments, info = transcribe_input(audio, job_input)
+    print(f"Transcrição detectou idioma: {info.language} com probabilidade {info.language_probability}")
+
+    # Percorre o generator uma única vez alimentando todas as saídas;
+    # o tempo gasto dentro do modelo entra em "decode", o resto em "serialize"
+    with metrics.stage("serialize"):
+        outputs = consume(metrics.iterate("decode", segments), output_sinks(job_input))
+    print("Transcrição finalizada.")
+    translation = translate_outputs(outputs, info, job_input)
+
+    # Retorna o resultado completo
+    with metrics.stage("cache_store"):
+        response = store_cache(key, build_response(outputs, info, translation), job_input)
+    return response
+
+def deliver_outputs(response, job, trace):
+    """
+    Com outputMode "r2", envia transcrição, legendas e segmentos para o R2
+    em paralelo e devolve só chaves, tamanhos e checksums na resposta.
+    """
+    if not artifacts.wanted(job['input']) or "segments" not in response:
+        return response
+    with trace.stage("upload"):
+        try:
+            return artifacts.offload(response, job)
+        except Exception as e:
+            print(f"Erro ao enviar os artefatos para o R2: {str(e)}")
+            return {"error": f"Erro ao enviar os artefatos para o R2: {str(e)}"}
+
+def finish_trace(trace, response):
+    """Anexa "timings" à resposta; o RTF só conta áudio realmente transcrito"""
+    transcribed = response.get("duration") if response.get("cache") != "hit" else None
+    return metrics.finish(trace, response, transcribed)
+
+# Downloads em segundo plano (modo prefetch) e acesso exclusivo ao modelo
+prefetcher = Prefetcher(
+    download_input,
+    size_of=lambda job_input: storage.object_size(job_input['bucketName'], job_input['fileName'])
+)
+model_gate = ModelGate()
 
 # --- FUNÇÃO PRINCIPAL ---
 # Esta função é chamada para cada job de transcrição
@@ -44,79 +360,325 @@ def handler(job):
     """
     print("Recebido novo job:", job)
     job_input = job['input']
+    if job_input.get('backfill'):
+        return backfill_job(job)
 
-    # Pegamos os dados que nosso site enviou
-    bucket_name = job_input.get('bucketName')
-    file_name = job_input.get('fileName')
-    target_language = job_input.get('targetLanguage')  # Para futura implementação de tradução
-
-    if not bucket_name or not file_name:
-        return {"error": "bucketName e fileName são obrigatórios."}
+    trace = metrics.start_trace()
+    with metrics.stage("download"):
+        source, error = open_input(job_input)
+    if error:
+        return finish_trace(trace, error)
 
-    # Baixa o arquivo do R2 para um local temporário dentro do pod
-    local_file_path = f"/tmp/{file_name}"
-    print(f"Baixando arquivo '{file_name}' do bucket '{bucket_name}'...")
-    
+    # Executa a transcrição
     try:
-        print(f"Tentando baixar do bucket: {bucket_name}, arquivo: {file_name}")
-        s3_client.download_file(bucket_name, file_name, local_file_path)
-        print(f"Download concluído. Tamanho do arquivo: {os.path.getsize(local_file_path)} bytes")
+        response = process_input(source, job_input)
     except Exception as e:
-        print(f"Erro detalhado: {str(e)}")
-        return {"error": f"Erro ao baixar arquivo do R2: {str(e)}. Verifique se o arquivo '{file_name}' existe no bucket '{bucket_name}'."}
+        response = {"error": f"Erro na transcrição: {str(e)}"}
+    finally:
+        # Sempre limpa o arquivo
+        release_input(source)
+    return finish_trace(trace, deliver_outputs(response, job, trace))
 
-    # Executa a transcrição
-    print("Iniciando a transcrição...")
+def stream_handler(job):
+    """
+    Versão generator do handler: envia lotes de segmentos conforme são decodificados.
+
+    Cada parcial tem {"partial": True, "segments": [...], "progress": 0..1}.
+    O último item é exatamente a resposta de handler(), então o agregado
+    de return_aggregate_stream termina com o resultado completo de sempre.
+    """
+    print("Recebido novo job (streaming):", job)
+    job_input = job['input']
+    if job_input.get('backfill'):
+        yield backfill_job(job)
+        return
+    batch_size = int(job_input.get('streamBatchSize', STREAM_BATCH_SIZE))
+
+    # O trace é usado diretamente: o generator pode ser retomado em outro contexto
+    trace = metrics.start_trace()
+    with trace.stage("download"):
+        source, error = open_input(job_input)
+    if error:
+        yield finish_trace(trace, error)
+        return
+
+    print("Iniciando a transcrição em modo streaming...")
     try:
-        segments, info = model.transcribe(local_file_path, beam_size=5)
+        with trace.stage("cache_lookup"):
+            key, cached = lookup_cache(source, job_input)
+        if cached is not None:
+            yield finish_trace(trace, deliver_outputs(cached, job, trace))
+            return
+
+        audio = decode_input(source)
+        with trace.stage("prepare"):
+            segments, info = transcribe_input(audio, job_input)
         print(f"Transcrição detectou idioma: {info.language} com probabilidade {info.language_probability}")
-        
-        # Converte generator em lista para processar
-        segments_list = list(segments)
-        
-        # Gera texto completo
-        full_text = " ".join(segment.text.strip() for segment in segments_list)
-        
-        # Gera formato SRT
-        srt_lines = []
-        for i, segment in enumerate(segments_list, 1):
-            srt_lines.append(str(i))
-            srt_lines.append(f"{format_timestamp(segment.start)} --> {format_timestamp(segment.end)}")
-            srt_lines.append(segment.text.strip())
-            srt_lines.append("")  # Linha em branco
-        
-        srt_content = "\n".join(srt_lines)
-        
-        # Prepara segmentos em formato JSON
-        segments_json = [
-            {
-                "id": i,
-                "start": segment.start,
-                "end": segment.end,
-                "text": segment.text.strip()
-            }
-            for i, segment in enumerate(segments_list, 1)
-        ]
-        
+
+        sinks = output_sinks(job_input)
+        batch = []
+        for index, start, end, text in feed(trace.iterate("decode", segments), sinks):
+            batch.append({"id": index, "start": start, "end": end, "text": text})
+            if len(batch) >= batch_size:
+                yield partial_result(batch, end, info)
+                batch = []
+        if batch:
+            yield partial_result(batch, batch[-1]["end"], info)
+
+        with trace.stage("serialize"):
+            outputs = results(sinks)
     except Exception as e:
-        return {"error": f"Erro na transcrição: {str(e)}"}
+        yield finish_trace(trace, {"error": f"Erro na transcrição: {str(e)}"})
+        return
     finally:
-        # Sempre limpa o arquivo
-        if os.path.exists(local_file_path):
-            os.remove(local_file_path)
+        release_input(source)
 
     print("Transcrição finalizada.")
+    translation = translate_outputs(outputs, info, job_input)
+    with trace.stage("cache_store"):
+        response = store_cache(key, build_response(outputs, info, translation), job_input)
+    yield finish_trace(trace, deliver_outputs(response, job, trace))
 
-    # Retorna o resultado completo
+def backfill_job(job):
+    """
+    Modo backfill: transcreve todos os arquivos de um prefixo (ou manifesto)
+    do R2 em um único job. Os artefatos vão para o R2 como no outputMode "r2"
+    e o progresso fica em um manifesto, então reenviar o job continua de onde parou.
+    """
+    job_input = job['input']
+    spec = job_input['backfill']
+    bucket_name = spec.get('bucketName') or job_input.get('bucketName')
+    if not bucket_name:
+        return {"error": "bucketName é obrigatório no backfill."}
+    # As demais opções do job (idioma, formatos, artefatos...) valem para todos os arquivos
+    options = {k: v for k, v in job_input.items() if k not in ('backfill', 'bucketName', 'fileName')}
+    name = spec.get('name') or backfill.default_name({**spec, "bucketName": bucket_name}, options)
+
+    def file_input(key):
+        return {**options, "bucketName": bucket_name, "fileName": key, "outputMode": "r2"}
+
+    def download(key):
+        source, error = open_input(file_input(key))
+        if error:
+            raise RuntimeError(error["error"])
+        return source
+
+    def transcribe(source, key):
+        # Exclusivo no modelo, também quando o worker roda em modo prefetch
+        with model_gate:
+            return process_input(source, file_input(key))
+
+    def upload(response, key):
+        return artifacts.offload(response, {"id": name, "input": file_input(key)})
+
+    trace = metrics.start_trace()
+    try:
+        summary = backfill.run(bucket_name, spec, name, download, transcribe, upload, release_input)
+    except Exception as e:
+        return finish_trace(trace, {"error": f"Erro no backfill: {str(e)}"})
+    return finish_trace(trace, {"backfill": summary})
+
+def partial_result(batch, decoded_seconds, info):
+    """Resultado parcial com o progresso em segundos decodificados / duração"""
+    progress = min(decoded_seconds / info.duration, 1.0) if info.duration else 0.0
     return {
-        "transcription": full_text,
-        "srt": srt_content,
-        "segments": segments_json,
-        "detected_language": info.language,
-        "duration": info.duration
+        "partial": True,
+        "segments": batch,
+        "decoded_seconds": decoded_seconds,
+        "progress": round(progress, 4)
+    }
+
+def dedup_key(job_input):
+    """Chave de um job em andamento: objeto + ETag + opções (None = não deduplicar)"""
+    bucket_name = job_input.get('bucketName')
+    file_name = job_input.get('fileName')
+    if not DEDUP_JOBS or not bucket_name or not file_name:
+        return None
+    try:
+        etag = storage.object_etag(bucket_name, file_name)
+    except Exception as e:
+        print(f"Sem ETag para deduplicar: {str(e)}")
+        return None
+    # Quem pediu a resposta inline não pode receber a versão com artefatos no R2
+    return cache_key(
+        f"{bucket_name}/{file_name}@{etag}", MODEL_NAME,
+        output_mode=artifacts.wanted(job_input), **job_options(job_input)
+    )
+
+async def deduplicated(job, run_job):
+    """Roda run_job(job), ou espera um job idêntico que já está em andamento"""
+    key = await asyncio.to_thread(dedup_key, job['input'])
+    if key is None:
+        return await run_job(job)
+    response, coalesced = await in_flight.run(key, lambda: run_job(job))
+    if coalesced:
+        print(f"Job {job.get('id')} idêntico a um job em andamento; resultado reaproveitado.")
+        metrics.registry.count("jobs_coalesced", "Duplicate jobs served by an identical running job")
+        if isinstance(response, dict):
+            response["dedup"] = {"coalesced": True, "counters": in_flight.stats()}
+    return response
+
+async def batched_handler(job):
+    """
+    Versão assíncrona do handler: o RunPod entrega vários jobs ao mesmo
+    tempo (concurrency_modifier) e o BatchScheduler junta os clipes curtos
+    em uma única passada do modelo. Jobs idênticos simultâneos rodam uma vez só.
+    """
+    if job['input'].get('backfill'):
+        return await asyncio.to_thread(backfill_job, job)
+    return await deduplicated(job, batched_job)
+
+async def batched_job(job):
+    global scheduler
+    print("Recebido novo job (batch):", job)
+    job_input = job['input']
+
+    trace = metrics.start_trace()
+    with trace.stage("download"):
+        source, error = await asyncio.to_thread(open_input, job_input)
+    if error:
+        return finish_trace(trace, error)
+
+    try:
+        if not batchable(job_input):
+            # O lote decodifica o áudio cru; resegment e pré-filtro de fala vão pelo caminho normal
+            response = await asyncio.to_thread(run_exclusive, source, job_input)
+            return finish_trace(trace, await asyncio.to_thread(deliver_outputs, response, job, trace))
+
+        with trace.stage("cache_lookup"):
+            key, cached = await asyncio.to_thread(lookup_cache, source, job_input)
+        if cached is not None:
+            return finish_trace(trace, await asyncio.to_thread(deliver_outputs, cached, job, trace))
+
+        from batch_scheduler import BatchScheduler
+        if scheduler is None:
+            scheduler = BatchScheduler(get_model()[0])
+
+        with trace.stage("audio_decode"):
+            audio, audio_report = await asyncio.to_thread(audio_input.normalize, source)
+        trace.note("audio", audio_report)
+        # Espera da janela do lote + decodificação em lote
+        with trace.stage("decode"):
+            future = scheduler.submit(audio, language=job_input.get('language'))
+            segments, info = await asyncio.wrap_future(future)
+        with trace.stage("serialize"):
+            outputs = consume(segments, output_sinks(job_input))
+    except Exception as e:
+        return finish_trace(trace, {"error": f"Erro na transcrição: {str(e)}"})
+    finally:
+        release_input(source)
+
+    print(f"Transcrição finalizada (lote de {info.batch_size}).")
+    translation = await asyncio.to_thread(translate_outputs, outputs, info, job_input)
+    with trace.stage("cache_store"):
+        response = store_cache(key, build_response(outputs, info, translation), job_input)
+    return finish_trace(trace, await asyncio.to_thread(deliver_outputs, response, job, trace))
+
+def batchable(job_input):
+    """
+    O lote só devolve os segmentos crus: sem resegment nem pré-filtro de fala,
+    e sem a tradução para inglês na própria decodificação (task="translate"),
+    que a chave de cache assume para targetLanguage "en"
+    """
+    return (not resegment.options_from_job(job_input) and vad.options_from_job(job_input) is None
+            and not translate.same_pass(job_input.get('targetLanguage')))
+
+def run_exclusive(source, job_input):
+    """process_input com o modelo exclusivo, para os jobs que o lote não atende"""
+    with model_gate:
+        return process_input(source, job_input)
+
+async def prefetch_handler(job):
+    """
+    Versão assíncrona que baixa a mídia dos próximos jobs enquanto o
+    modelo ainda está ocupado com o atual. O modelo atende um job por vez.
+    Jobs idênticos simultâneos rodam uma vez só.
+    """
+    if job['input'].get('backfill'):
+        return await asyncio.to_thread(backfill_job, job)
+    return await deduplicated(job, prefetch_job)
+
+async def prefetch_job(job):
+    print("Recebido novo job (prefetch):", job)
+    job_input = job['input']
+
+    trace = metrics.start_trace()
+    arrived = time.perf_counter()
+    # Só a parte do download que não ficou escondida atrás do job anterior
+    with trace.stage("download"):
+        source, error = await asyncio.wrap_future(prefetcher.fetch(job_input))
+    if error:
+        return finish_trace(trace, error)
+    downloaded = time.perf_counter()
+
+    try:
+        # to_thread copia o contexto, então as etapas de process_input entram no trace
+        response = await asyncio.to_thread(run_on_model, source, job_input)
+    except Exception as e:
+        return finish_trace(trace, {"error": f"Erro na transcrição: {str(e)}"})
+    finally:
+        release_input(source)
+        prefetcher.release(source)
+
+    response["prefetch"] = {
+        "download_seconds": round(downloaded - arrived, 3),
+        **response.get("prefetch", {})
+    }
+    return finish_trace(trace, await asyncio.to_thread(deliver_outputs, response, job, trace))
+
+def run_on_model(source, job_input):
+    """Processa o job com o modelo exclusivo e mede quanto tempo ele ficou ocioso antes"""
+    queued = time.perf_counter()
+    with model_gate as gate:
+        started = time.perf_counter()
+        idle = gate.job_idle
+        trace = metrics.current()
+        if trace is not None:
+            trace.add("model_queue", started - queued)
+        response = process_input(source, job_input)
+    response["prefetch"] = {
+        "queue_seconds": round(started - queued, 3),
+        "model_idle_seconds": round(idle, 3),
+        "model_utilization": model_gate.utilization()
     }
+    return response
+
+def concurrency_modifier(current_concurrency):
+    """Quantos jobs este worker aceita em paralelo nos modos batch e prefetch"""
+    if PREFETCH_JOBS:
+        # O job em execução + os que estão sendo baixados
+        return PREFETCH_DEPTH + 1
+    return BATCH_CONCURRENCY
 
 
 # --- INICIALIZAÇÃO ---
 # Inicia o worker para que ele comece a ouvir por novos jobs
-runpod.serverless.start({"handler": handler})
+if __name__ == "__main__":
+    # python handler.py --profile-startup mostra onde vai o tempo de boot
+    profile_if_requested("handler", MODEL_NAME)
+
+    print("Iniciando o worker...")
+    # Com METRICS_PORT, expõe os histogramas em /metrics
+    metrics.start_if_enabled()
+    # Carrega e aquece os modelos antes do primeiro job
+    warm_start(MODEL_NAME)
+
+    import runpod
+
+    if STREAM_RESULTS:
+        runpod.serverless.start({
+            "handler": stream_handler,
+            "return_aggregate_stream": True
+        })
+    elif PREFETCH_JOBS:
+        runpod.serverless.start({
+            "handler": prefetch_handler,
+            "concurrency_modifier": concurrency_modifier
+        })
+    elif BATCH_JOBS:
+        runpod.serverless.start({
+            "handler": batched_handler,
+            "concurrency_modifier": concurrency_modifier
+        })
+    else:
+        runpod.serverless.start({"handler": handler})
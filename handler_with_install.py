@@ -13,6 +13,7 @@ except ImportError:
 import runpod
 import boto3
 import os
+from subtitles import format_timestamp
 
 # --- CONFIGURAÇÃO INICIAL ---
 print("Iniciando o worker...")
@@ -34,15 +35,6 @@ s3_client = boto3.client(
 )
 print("Cliente R2 configurado com sucesso.")
 
-# --- FUNÇÕES AUXILIARES ---
-def format_timestamp(seconds):
-    """Converte segundos para formato SRT (hh:mm:ss,ms)"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millisecs = int((seconds % 1) * 1000)
-    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millisecs:03d}"
-
 # --- FUNÇÃO PRINCIPAL ---
 def handler(job):
     """
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Coalesce identical jobs that arrive while the first one is still running.
+
+A client retry or a double click submits the same object with the same
+options twice; the second job should not take another model slot. The
+first job for a key (object + ETag + options) becomes the leader, later
+ones wait on its future and get a copy of its result.
+
+Sequential repeats are the result cache's business; this only covers
+jobs that overlap in time inside one worker (batch and prefetch modes).
+"""
+import asyncio
+import copy
+import threading
+from concurrent.futures import Future
+
+
+class InFlight:
+    """Registry of running jobs by key, with leader / coalesced counters"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def claim(self, key):
+        """(future, leader): leader runs the job, the others wait on the future"""
+        with self._lock:
+            if key in self._jobs:
+                self.coalesced += 1
+                return self._jobs[key], False
+            future = Future()
+            self._jobs[key] = future
+            self.leaders += 1
+            return future, True
+
+    def resolve(self, key, future, result=None, error=None):
+        with self._lock:
+            self._jobs.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            # Followers get their own copy; the leader keeps adding fields to its response
+            future.set_result(copy.deepcopy(result))
+
+    async def run(self, key, work):
+        """Await work() once per key; returns (result, coalesced)"""
+        future, leader = self.claim(key)
+        if not leader:
+            return copy.deepcopy(await asyncio.wrap_future(future)), True
+        try:
+            result = await work()
+        except BaseException as e:
+            self.resolve(key, future, error=e)
+            raise
+        self.resolve(key, future, result)
+        return result, False
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._jobs), "leaders": self.leaders, "coalesced": self.coalesced}
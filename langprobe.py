@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Language pre-detection on short windows sampled across the audio.
+
+Whisper detects the language from the first 30 s, which is often an
+intro jingle or silence. The probe takes LANGUAGE_PROBE_WINDOWS windows
+of LANGUAGE_PROBE_SECONDS, centred on speech (energy VAD, numpy only)
+around evenly spaced points of the file, and runs detection once on
+them back to back - they fit in a single 30 s encoder window, so the
+probe costs one encoder pass whatever the file length.
+
+    probe = langprobe.probe(model, audio, hint=job_input.get('language'))
+
+A client hint skips detection entirely. A confident probe fixes the
+language for the main decode; below LANGUAGE_PROBE_MIN_PROBABILITY the
+decode detects on its own as before. Confidently English audio can
+switch to an English-only distilled model (ENGLISH_MODELS), which
+decodes several times faster than the multilingual one it replaces.
+
+Window selection check: python langprobe.py [minutes] [model]
+"""
+import os
+import time
+from collections import namedtuple
+
+SAMPLING_RATE = 16000
+
+LANGUAGE_PROBE = os.environ.get('LANGUAGE_PROBE', '1') == '1'
+LANGUAGE_PROBE_WINDOWS = int(os.environ.get('LANGUAGE_PROBE_WINDOWS', '3'))
+LANGUAGE_PROBE_SECONDS = float(os.environ.get('LANGUAGE_PROBE_SECONDS', '8'))
+LANGUAGE_PROBE_MIN_PROBABILITY = float(os.environ.get('LANGUAGE_PROBE_MIN_PROBABILITY', '0.5'))
+
+ENGLISH_VARIANTS = os.environ.get('ENGLISH_VARIANTS', '1') == '1'
+ENGLISH_VARIANT_MIN_PROBABILITY = float(os.environ.get('ENGLISH_VARIANT_MIN_PROBABILITY', '0.8'))
+# Loading a second model only pays off on longer files (unless it is already loaded)
+ENGLISH_VARIANT_MIN_SECONDS = float(os.environ.get('ENGLISH_VARIANT_MIN_SECONDS', '300'))
+# Multilingual model -> faster English-only model of similar English accuracy.
+# tiny/base have no faster English variant (tiny.en/base.en decode at the same speed).
+ENGLISH_MODELS = {
+    'small': 'distil-small.en',
+    'medium': 'distil-medium.en',
+    'large-v2': 'distil-large-v2',
+    'large-v3': 'distil-large-v3',
+}
+
+Probe = namedtuple('Probe', ['language', 'probability', 'method', 'applied', 'seconds', 'windows', 'candidates'])
+
+
+def probe_windows(audio, count=None, seconds=None):
+    """[(start, end)] sample ranges to probe: speech near evenly spaced points"""
+    from vad import energy_regions
+
+    count = count or LANGUAGE_PROBE_WINDOWS
+    length = int((seconds or LANGUAGE_PROBE_SECONDS) * SAMPLING_RATE)
+    total = len(audio)
+    if total <= count * length:
+        # Short file: it all fits in the probe
+        return [(0, total)]
+
+    regions = energy_regions(audio) or [{"start": 0, "end": total}]
+    windows = []
+    for k in range(count):
+        target = total * (k + 1) // (count + 1)
+        # Nearest speech region to the target point
+        region = min(regions, key=lambda r: 0 if r["start"] <= target < r["end"]
+                     else min(abs(r["start"] - target), abs(r["end"] - target)))
+        centre = min(max(target, region["start"] + length // 2), region["end"] - length // 2)
+        start = min(max(centre - length // 2, 0), total - length)
+        if windows and start < windows[-1][1]:
+            start = windows[-1][1]
+        if start + length <= total:
+            windows.append((start, start + length))
+    return windows
+
+
+def detect(model, audio):
+    """(language, probability, [(language, probability), ...]) from faster-whisper or openai-whisper"""
+    if type(model).__module__.startswith("faster_whisper"):
+        language, probability, all_probabilities = model.detect_language(audio=audio)
+        return language, probability, all_probabilities
+
+    import whisper
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels).to(model.device)
+    _, probabilities = model.detect_language(mel)
+    ranked = sorted(probabilities.items(), key=lambda item: item[1], reverse=True)
+    return ranked[0][0], ranked[0][1], ranked
+
+
+def probe(model, audio, hint=None):
+    """Probe for the job, or None when there is nothing to probe with"""
+    if hint:
+        return Probe(hint, 1.0, "hint", True, 0.0, [], None)
+    if not LANGUAGE_PROBE or model is None or len(audio) == 0:
+        return None
+    import numpy as np
+
+    start = time.perf_counter()
+    windows = probe_windows(audio)
+    clip = np.concatenate([audio[a:b] for a, b in windows])
+    language, probability, ranked = detect(model, clip)
+    seconds = time.perf_counter() - start
+    applied = probability >= LANGUAGE_PROBE_MIN_PROBABILITY
+    print(f"[langprobe] {language} ({probability:.2f}) from {len(windows)} windows in {seconds:.2f}s"
+          + ("" if applied else ", low confidence: left to the decoder"))
+    return Probe(
+        language, probability, "probe", applied, seconds,
+        [(round(a / SAMPLING_RATE, 2), round(b / SAMPLING_RATE, 2)) for a, b in windows],
+        [(lang, round(p, 4)) for lang, p in ranked[:3]],
+    )
+
+
+def language_for(probe_result):
+    """language= for the main decode (None lets Whisper detect)"""
+    return probe_result.language if probe_result is not None and probe_result.applied else None
+
+
+def english_variant(model_name, probe_result, duration, loaded=()):
+    """Model to decode with: the English-only variant when the audio is clearly English and it pays off.
+
+    duration None (unknown) counts as short.
+    """
+    variant = ENGLISH_MODELS.get(model_name)
+    if (not ENGLISH_VARIANTS or variant is None or probe_result is None or probe_result.language != "en"
+            or probe_result.probability < ENGLISH_VARIANT_MIN_PROBABILITY):
+        return model_name
+    if variant in loaded or (duration is not None and duration >= ENGLISH_VARIANT_MIN_SECONDS):
+        return variant
+    return model_name
+
+
+def loaded_models():
+    """Names of the faster-whisper models currently in the pool"""
+    from model_pool import pool
+    return {key[0] for key in pool.keys()}
+
+
+def report(probe_result, model_name=None):
+    """"language_probe" block for the response"""
+    if probe_result is None:
+        return None
+    result = {
+        "language": probe_result.language,
+        "probability": round(probe_result.probability, 4),
+        "method": probe_result.method,
+        "applied": probe_result.applied,
+        "seconds": round(probe_result.seconds, 3),
+    }
+    if probe_result.windows:
+        result["windows"] = probe_result.windows
+        result["candidates"] = probe_result.candidates
+    if model_name is not None:
+        result["model"] = model_name
+    return result
+
+
+def benchmark(minutes=10.0, model_name=None):
+    """Where the windows land on synthetic audio with a silent intro; with a model, probe vs first-30 s cost"""
+    import numpy as np
+    from chunked import synthetic_audio
+
+    # One minute of silence + low noise up front, where Whisper would look
+    intro = (0.002 * np.random.default_rng(1).standard_normal(60 * SAMPLING_RATE)).astype(np.float32)
+    audio = np.concatenate([intro, synthetic_audio(minutes * 60 - 60)])
+    start = time.perf_counter()
+    windows = probe_windows(audio)
+    selection = time.perf_counter() - start
+    print(f"{minutes:g} min, {len(windows)} windows picked in {selection * 1000:.1f} ms:")
+    for a, b in windows:
+        rms = float(np.sqrt(np.mean(audio[a:b] ** 2)))
+        print(f"  {a / SAMPLING_RATE:7.1f}s - {b / SAMPLING_RATE:7.1f}s  rms {rms:.3f}")
+
+    if model_name:
+        from faster_whisper import WhisperModel
+        model = WhisperModel(model_name, device="cpu", compute_type="int8")
+        start = time.perf_counter()
+        first = model.detect_language(audio=audio[:30 * SAMPLING_RATE])
+        first_seconds = time.perf_counter() - start
+        result = probe(model, audio)
+        print(f"  first 30 s: {first[0]} ({first[1]:.2f}) in {first_seconds:.2f}s")
+        print(f"  probe:      {result.language} ({result.probability:.2f}) in {result.seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else 10.0, sys.argv[2] if len(sys.argv) > 2 else None)
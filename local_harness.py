@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Drive handler.stream_handler locally, without RunPod or R2.
+
+Usage: python local_harness.py path/to/audio.mp3 [batch_size]
+
+The R2 client is swapped for a local copy so the same job shape the site
+sends can be replayed against a file on disk. Prints every partial and
+checks that the aggregate ends with the same response handler() returns.
+"""
+import hashlib
+import io
+import os
+import shutil
+import sys
+import time
+
+
+class LocalStorage:
+    """Stand-in for the boto3 client: objects are files under a local directory"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def download_file(self, bucket_name, file_name, local_path, **kwargs):
+        shutil.copyfile(os.path.join(self.root, file_name), local_path)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        path = os.path.join(self.root, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(Body)
+        return {}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        # Single-part S3 ETag: the quoted MD5 of the content
+        digest = hashlib.md5()
+        with open(os.path.join(self.root, Key), "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return {"ContentLength": os.path.getsize(os.path.join(self.root, Key)), "ETag": f'"{digest.hexdigest()}"'}
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        with open(os.path.join(self.root, Key), "rb") as f:
+            if Range is None:
+                return {"Body": io.BytesIO(f.read())}
+            # "bytes=start-end", end inclusive (what storage.RangedReader sends)
+            start, end = Range.removeprefix("bytes=").split("-")
+            f.seek(int(start))
+            data = f.read(int(end) - int(start) + 1 if end else -1)
+            return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+    def list_objects_v2(self, Bucket, Prefix="", MaxKeys=1000, ContinuationToken=None, **kwargs):
+        keys = sorted(
+            os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, "/")
+            for directory, _, names in os.walk(self.root) for name in names
+        )
+        keys = [key for key in keys if key.startswith(Prefix) and (ContinuationToken is None or key > ContinuationToken)]
+        page = {"Contents": [{"Key": key} for key in keys[:MaxKeys]], "IsTruncated": len(keys) > MaxKeys}
+        if page["IsTruncated"]:
+            page["NextContinuationToken"] = keys[MaxKeys - 1]
+        return page
+
+
+def run_stream(job):
+    """Run the streaming handler like RunPod would, returning the aggregate"""
+    import handler
+    aggregate = []
+    start = time.perf_counter()
+    for item in handler.stream_handler(job):
+        elapsed = time.perf_counter() - start
+        if item.get("partial"):
+            print(f"[{elapsed:6.2f}s] {len(item['segments'])} segments, progress {item['progress']:.1%}")
+        else:
+            print(f"[{elapsed:6.2f}s] final result")
+        aggregate.append(item)
+    return aggregate
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    audio_path = os.path.abspath(sys.argv[1])
+    import storage
+    storage.set_client(LocalStorage(os.path.dirname(audio_path)))
+    import handler
+
+    job = {"id": "local", "input": {"bucketName": "local", "fileName": os.path.basename(audio_path)}}
+    if len(sys.argv) > 2:
+        job["input"]["streamBatchSize"] = int(sys.argv[2])
+
+    aggregate = run_stream(job)
+    final = aggregate[-1]
+    if "error" in final:
+        print("Error:", final["error"])
+        sys.exit(1)
+
+    # The partials must add up to the final segments, in order
+    streamed = [s for item in aggregate[:-1] for s in item["segments"]]
+    assert streamed == final["segments"], "partials do not match final segments"
+
+    expected = handler.handler(job)
+    assert set(final) == set(expected), f"shape mismatch: {sorted(final)} != {sorted(expected)}"
+    assert final["srt"] == expected["srt"], "streamed SRT differs from handler()"
+    print(f"OK - {len(aggregate) - 1} partials, {len(streamed)} segments, same shape as handler()")
+
+
+if __name__ == "__main__":
+    main()
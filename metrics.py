@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""Per-stage job timings and Prometheus-style aggregate metrics.
+
+A Trace records how a job's wall time splits across stages (download,
+audio decode, VAD, model decode, serialization, ...). Stages nest and each
+one keeps only its self time, so time spent pulling segments out of the
+model inside "serialize" is booked to "decode", not twice. The trace
+becomes the "timings" block of the response, with the real-time factor
+(audio seconds per wall-clock second) and any blocks noted for the job
+(input audio, language probe, ...). They live there rather than at the
+top level so cached and fresh responses keep the same shape.
+
+The current trace lives in a context variable so helpers can open stages
+without threading it through every call; asyncio.to_thread copies it.
+
+With METRICS_PORT set, finished traces also feed histograms served in the
+Prometheus text format on http://0.0.0.0:METRICS_PORT/metrics.
+
+Overhead: python metrics.py [segments]
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+METRICS_PORT = os.environ.get('METRICS_PORT')
+
+# Seconds per stage / per job, and the real-time factor
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+RTF_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200)
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """Stage timings of one job"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.audio_seconds = None
+        self.notes = {}  # per-job diagnostics reported next to the stage times
+        self._children = []  # time spent in nested stages, one entry per open stage
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        if self._children:
+            self._children[-1] += seconds
+
+    @contextmanager
+    def stage(self, name):
+        self._children.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._children.pop()
+            self.add(name, elapsed - nested)
+            if self._children:
+                self._children[-1] += nested
+
+    def iterate(self, name, iterable):
+        """Wrap an iterator, booking the time spent producing each item to name"""
+        perf_counter = time.perf_counter
+        spent = 0.0
+        try:
+            start = perf_counter()
+            for item in iterable:
+                spent += perf_counter() - start
+                yield item
+                start = perf_counter()
+            spent += perf_counter() - start
+        finally:
+            # Booked once, when the iterator is exhausted or abandoned
+            self.add(name, spent)
+
+    def note(self, name, value):
+        """Attach a diagnostic block to the timings; it is read when the trace finishes"""
+        self.notes[name] = value
+
+    def timings(self):
+        total = time.perf_counter() - self.started
+        result = {
+            "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            "total": round(total, 4),
+        }
+        if self.audio_seconds:
+            result["audio_seconds"] = round(self.audio_seconds, 3)
+            result["rtf"] = round(self.audio_seconds / total, 2) if total > 0 else None
+        # Empty blocks (e.g. a guard that never fired) are left out
+        result.update({name: value for name, value in self.notes.items() if value})
+        return result
+
+
+def start_trace():
+    """New trace for the current job, made current for stage()"""
+    trace = Trace()
+    _current.set(trace)
+    return trace
+
+
+def current():
+    return _current.get()
+
+
+def stage(name):
+    """Time a stage of the current job; a no-op outside a trace"""
+    trace = _current.get()
+    return trace.stage(name) if trace is not None else nullcontext()
+
+
+def note(name, value):
+    """Diagnostic block for the current job's timings; a no-op outside a trace"""
+    trace = _current.get()
+    if trace is not None:
+        trace.note(name, value)
+
+
+def iterate(name, iterable):
+    trace = _current.get()
+    return trace.iterate(name, iterable) if trace is not None else iterable
+
+
+def finish(trace, response, audio_seconds=None, into=None):
+    """Attach trace.timings() to the response and record it in the histograms.
+
+    into is the Registry to record in; by default the module's, while the
+    endpoint is up.
+    """
+    if audio_seconds:
+        trace.audio_seconds = audio_seconds
+    timings = trace.timings()
+    if isinstance(response, dict):
+        response["timings"] = timings
+    if into is None and server is not None:
+        into = registry
+    if into is not None:
+        into.record(timings, response)
+    return response
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by one label"""
+
+    def __init__(self, name, help_text, buckets, label=None):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.label = label
+        self._series = {}
+
+    def observe(self, value, label_value=None):
+        counts, totals = self._series.setdefault(label_value, ([0] * len(self.buckets), [0, 0.0]))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        totals[0] += 1
+        totals[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, (count, total)) in sorted(self._series.items(), key=lambda item: str(item[0])):
+            labels = f'{self.label}="{label_value}",' if self.label else ""
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{labels}le="+Inf"}} {count}')
+            suffix = "{" + labels.rstrip(",") + "}" if labels else ""
+            lines.append(f"{self.name}_count{suffix} {count}")
+            lines.append(f"{self.name}_sum{suffix} {total}")
+        return "\n".join(lines)
+
+
+class Registry:
+    """Aggregate histograms over every finished job"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.jobs = {}
+        self.counters = {}  # name -> [help, value]
+        self.stage_seconds = Histogram(
+            "whisper_stage_seconds", "Self time per job stage", STAGE_BUCKETS, label="stage")
+        self.job_seconds = Histogram(
+            "whisper_job_seconds", "Wall time per job", STAGE_BUCKETS)
+        self.rtf = Histogram(
+            "whisper_realtime_factor", "Audio seconds transcribed per wall-clock second", RTF_BUCKETS)
+
+    def record(self, timings, response=None):
+        outcome = "error" if isinstance(response, dict) and "error" in response else "ok"
+        with self._lock:
+            self.jobs[outcome] = self.jobs.get(outcome, 0) + 1
+            for name, seconds in timings["stages"].items():
+                self.stage_seconds.observe(seconds, name)
+            self.job_seconds.observe(timings["total"])
+            if timings.get("rtf"):
+                self.rtf.observe(timings["rtf"])
+
+    def count(self, name, help_text):
+        """Increment the counter whisper_<name>_total"""
+        with self._lock:
+            self.counters.setdefault(name, [help_text, 0])[1] += 1
+
+    def render(self):
+        with self._lock:
+            lines = ["# HELP whisper_jobs_total Finished jobs by outcome", "# TYPE whisper_jobs_total counter"]
+            lines += [f'whisper_jobs_total{{outcome="{outcome}"}} {count}' for outcome, count in sorted(self.jobs.items())]
+            for name, (help_text, value) in sorted(self.counters.items()):
+                lines += [f"# HELP whisper_{name}_total {help_text}", f"# TYPE whisper_{name}_total counter",
+                          f"whisper_{name}_total {value}"]
+            parts = ["\n".join(lines), self.stage_seconds.render(), self.job_seconds.render(), self.rtf.render()]
+        return "\n".join(parts) + "\n"
+
+
+registry = Registry()
+server = None
+
+
+def start_server(port=None):
+    """Serve registry.render() on /metrics from a daemon thread"""
+    global server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", int(METRICS_PORT if port is None else port)), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"[metrics] serving on :{server.server_address[1]}/metrics")
+    return server
+
+
+def start_if_enabled():
+    if METRICS_PORT and server is None:
+        start_server()
+
+
+def benchmark(segments=2000, jobs=200, repeats=3):
+    """Tracing overhead per job: stages plus a traced segment iterator.
+
+    Each variant runs repeats rounds of jobs and keeps its fastest round.
+    Returns {"untraced", "traced", "overhead"} in seconds per job.
+    """
+    from sinks import consume, TextSink, SrtSink, SegmentsJsonSink
+
+    fake = [{"start": i * 2.0, "end": i * 2.0 + 1.5, "text": f" segment {i}"} for i in range(segments)]
+    # Recorded as when the endpoint is up, but into a registry of its own
+    local = Registry()
+
+    def job(traced):
+        sinks = {"transcription": TextSink(), "srt": SrtSink(), "segments": SegmentsJsonSink()}
+        if not traced:
+            return consume(iter(fake), sinks)
+        trace = start_trace()
+        with stage("download"):
+            pass
+        with stage("serialize"):
+            outputs = consume(iterate("decode", fake), sinks)
+        return finish(trace, outputs, audio_seconds=segments * 2.0, into=local)
+
+    def measure():
+        for traced in (False, True):
+            job(traced)  # warm up
+        elapsed = {False: float("inf"), True: float("inf")}
+        for _ in range(repeats):
+            for traced in (False, True):
+                start = time.perf_counter()
+                for _ in range(jobs):
+                    job(traced)
+                elapsed[traced] = min(elapsed[traced], (time.perf_counter() - start) / jobs)
+        return elapsed
+
+    # The benchmark's traces stay out of the caller's context
+    elapsed = contextvars.copy_context().run(measure)
+
+    overhead = elapsed[True] - elapsed[False]
+    print(f"{jobs} jobs x {segments} segments")
+    print(f"  untraced: {elapsed[False] * 1000:.2f} ms/job")
+    print(f"  traced:   {elapsed[True] * 1000:.2f} ms/job")
+    print(f"  overhead: {overhead * 1e6:.0f} us/job ({overhead / segments * 1e9:.0f} ns/segment, "
+          f"{overhead / elapsed[False]:.1%} of serialization alone)")
+    return {"untraced": elapsed[False], "traced": elapsed[True], "overhead": overhead}
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
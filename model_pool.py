@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""Process-wide Whisper model pool - keeps models warm across jobs"""
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Approximate resident size of each model in MB at float16.
+# Used only for budgeting, so rough numbers are fine.
+MODEL_SIZES_MB = {
+    'tiny': 75,
+    'base': 145,
+    'small': 485,
+    'medium': 1530,
+    'large': 3090,
+    'large-v1': 3090,
+    'large-v2': 3090,
+    'large-v3': 3090,
+    # English-only distilled variants (see langprobe.ENGLISH_MODELS)
+    'distil-small': 335,
+    'distil-medium': 790,
+    'distil-large-v2': 1510,
+    'distil-large-v3': 1510,
+}
+
+# Multiplier applied to the float16 size for each compute_type
+COMPUTE_TYPE_FACTOR = {
+    'float32': 2.0,
+    'float16': 1.0,
+    'bfloat16': 1.0,
+    'int8_float16': 0.5,
+    'int8_float32': 0.5,
+    'int8': 0.5,
+}
+
+
+def resolve_device(device=None, compute_type=None):
+    """Pick device/compute_type, falling back to CPU when no GPU is present"""
+    device = device or os.environ.get('WHISPER_DEVICE', 'auto')
+    if device == 'auto':
+        try:
+            import ctranslate2
+            device = 'cuda' if ctranslate2.get_cuda_device_count() > 0 else 'cpu'
+        except Exception:
+            device = 'cpu'
+
+    if not compute_type:
+        # The policy's default, so preloaded models are the ones its decisions ask for
+        import policy
+        compute_type = policy.default_compute_type(policy.hardware_for(device))
+    return device, compute_type
+
+
+def estimate_size_mb(model_name, compute_type):
+    """Rough memory footprint of a model, used for the pool budget"""
+    base_name = model_name.split('/')[-1].replace('.en', '')
+    size = MODEL_SIZES_MB.get(base_name, MODEL_SIZES_MB['large-v2'])
+    return size * COMPUTE_TYPE_FACTOR.get(compute_type, 1.0)
+
+
+class ModelPool:
+    """LRU pool of loaded models bounded by a memory budget (MB)"""
+
+    def __init__(self, budget_mb=None):
+        if budget_mb is None:
+            budget_mb = float(os.environ.get('MODEL_POOL_BUDGET_MB', '10000'))
+        self.budget_mb = budget_mb
+        self._models = OrderedDict()  # key -> (model, size_mb)
+        self._loading = {}  # key -> (Future of the model, size_mb)
+        self._lock = threading.Lock()
+
+    @property
+    def used_mb(self):
+        return sum(size for _, size in self._models.values())
+
+    @property
+    def reserved_mb(self):
+        """Loaded models plus the ones being loaded right now"""
+        return self.used_mb + sum(size for _, size in self._loading.values())
+
+    def keys(self):
+        return list(self._models.keys())
+
+    def fits(self, key, size_mb):
+        """Whether acquiring key now would not evict another model"""
+        with self._lock:
+            return (key in self._models or key in self._loading
+                    or self.reserved_mb + size_mb <= self.budget_mb)
+
+    def acquire(self, key, loader, size_mb):
+        """Return (model, info) for key, loading it with loader() on a miss.
+
+        The load runs outside the lock: jobs for models already in the pool
+        are not held up by a cold load, and concurrent requests for the
+        model being loaded wait for that single load.
+        """
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key][0], {"model_cache": "hit", "model_load_time": 0.0}
+            if key in self._loading:
+                loading = self._loading[key][0]
+                owner = False
+            else:
+                self._evict_for(size_mb)
+                loading = Future()
+                self._loading[key] = (loading, size_mb)
+                owner = True
+
+        start = time.perf_counter()
+        if not owner:
+            model = loading.result()
+            return model, {"model_cache": "wait", "model_load_time": round(time.perf_counter() - start, 3)}
+
+        print(f"Loading model {key} (~{size_mb:.0f} MB)...")
+        try:
+            model = loader()
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            loading.set_exception(e)
+            raise
+        load_time = time.perf_counter() - start
+        print(f"Model {key} loaded in {load_time:.2f}s")
+
+        with self._lock:
+            del self._loading[key]
+            self._models[key] = (model, size_mb)
+        loading.set_result(model)
+        return model, {"model_cache": "miss", "model_load_time": round(load_time, 3)}
+
+    def evict(self, key):
+        with self._lock:
+            if self._models.pop(key, None) is not None:
+                gc.collect()
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            gc.collect()
+
+    def _evict_for(self, size_mb):
+        # Drop least recently used models until the new one fits.
+        # A single model larger than the budget is still allowed on its own.
+        evicted = False
+        while self._models and self.reserved_mb + size_mb > self.budget_mb:
+            key, _ = self._models.popitem(last=False)
+            print(f"Evicting model {key} from pool")
+            evicted = True
+        if evicted:
+            gc.collect()
+
+
+# Module level pool shared by every job in this process
+pool = ModelPool()
+
+
+def get_whisper_model(model_name, device=None, compute_type=None):
+    """Get a faster-whisper model from the shared pool"""
+    device, compute_type = resolve_device(device, compute_type)
+
+    def load():
+        from faster_whisper import WhisperModel
+        return WhisperModel(model_name, device=device, compute_type=compute_type)
+
+    model, info = pool.acquire(
+        (model_name, device, compute_type), load, estimate_size_mb(model_name, compute_type)
+    )
+    info.update({"device": device, "compute_type": compute_type})
+    return model, info
+
+
+def get_openai_whisper_model(model_name, device=None):
+    """Get an openai-whisper model from the shared pool"""
+    device, _ = resolve_device(device, 'float32')
+
+    def load():
+        import whisper
+        return whisper.load_model(model_name, device=device)
+
+    model, info = pool.acquire(
+        ("openai-whisper/" + model_name, device, 'float32'), load,
+        estimate_size_mb(model_name, 'float32')
+    )
+    info.update({"device": device, "compute_type": 'float32'})
+    return model, info
+
+
+if __name__ == "__main__":
+    # Quick check on CPU: second request must be a cache hit
+    import sys
+    name = sys.argv[1] if len(sys.argv) > 1 else 'tiny'
+    for _ in range(2):
+        _, info = get_whisper_model(name, device='cpu')
+        print(info)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""Model selection policy: model size, compute_type, beam_size and batch size per job.
+
+A policy gets the user plan, the audio duration (from a cheap container
+header probe), the current queue depth and the detected hardware, and
+returns a Decision. The plan sets a quality floor the policy never goes
+below; above it the adaptive policy trades model size and beam width for
+throughput when the queue backs up or the hardware is slow.
+
+Policies are plain classes with a choose() method, registered by name in
+POLICIES; MODEL_POLICY picks one (or "package.module:ClassName").
+
+Simulation: python policy.py [jobs]
+"""
+import functools
+import importlib
+import os
+import time
+from collections import namedtuple
+
+MODEL_POLICY = os.environ.get('MODEL_POLICY', 'adaptive')
+# Time a job may wait behind the queue plus its own decode before the policy downgrades
+POLICY_MAX_WAIT_SECONDS = float(os.environ.get('POLICY_MAX_WAIT_SECONDS', '300'))
+# Queue depth at which beam search drops to greedy decoding
+POLICY_GREEDY_QUEUE_DEPTH = int(os.environ.get('POLICY_GREEDY_QUEUE_DEPTH', '8'))
+
+# Smallest to largest; the policy steps along this list
+MODEL_ORDER = ['tiny', 'base', 'small', 'medium', 'large-v2']
+
+# What each plan asks for, and the least it may get under load
+PLAN_TARGET = {'free': 'medium', 'starter': 'large-v2', 'pro': 'large-v2', 'enterprise': 'large-v2'}
+PLAN_FLOOR = {'free': 'small', 'starter': 'medium', 'pro': 'large-v2', 'enterprise': 'large-v2'}
+
+# Approximate audio seconds decoded per wall-clock second with beam_size=5,
+# batch 1 (faster-whisper's published numbers on a mid-range GPU / 8 cores).
+# Used only for planning, so rough numbers are fine.
+SPEED = {
+    ('tiny', 'cuda'): 60.0, ('base', 'cuda'): 45.0, ('small', 'cuda'): 30.0,
+    ('medium', 'cuda'): 20.0, ('large-v2', 'cuda'): 14.0,
+    ('tiny', 'cpu'): 25.0, ('base', 'cpu'): 15.0, ('small', 'cpu'): 7.5,
+    ('medium', 'cpu'): 2.5, ('large-v2', 'cpu'): 1.0,
+}
+COMPUTE_SPEEDUP = {'float16': 1.0, 'int8_float16': 1.15, 'int8': 1.0, 'float32': 0.6}
+GREEDY_SPEEDUP = 1.4
+
+# Rough word error rate (%) per model, for the simulation's quality axis
+WER = {'tiny': 12.0, 'base': 10.0, 'small': 8.0, 'medium': 7.0, 'large-v2': 6.5}
+INT8_WER_PENALTY = 0.1
+GREEDY_WER_PENALTY = 0.3
+
+Hardware = namedtuple('Hardware', ['device', 'gpu_memory_mb', 'cpu_count'])
+Decision = namedtuple('Decision', ['model', 'compute_type', 'beam_size', 'batch_size', 'reason'])
+
+
+@functools.lru_cache(maxsize=1)
+def gpu_memory_mb():
+    """Total memory of the first GPU from nvidia-smi, 0 when unknown"""
+    try:
+        import subprocess
+        output = subprocess.run(
+            ['nvidia-smi', '--query-gpu=memory.total', '--format=csv,noheader,nounits'],
+            capture_output=True, text=True, timeout=5,
+        ).stdout
+        return int(output.split()[0])
+    except Exception:
+        return 0
+
+
+def hardware_for(device):
+    return Hardware(device, gpu_memory_mb() if device == 'cuda' else 0, os.cpu_count() or 1)
+
+
+@functools.lru_cache(maxsize=1)
+def detect_hardware():
+    """Device from model_pool.resolve_device, plus GPU memory and core count"""
+    from model_pool import resolve_device
+    device, _ = resolve_device()
+    return hardware_for(device)
+
+
+def probe_duration(path):
+    """Audio duration in seconds from the container header, or None"""
+    try:
+        import av
+        with av.open(path) as container:
+            if container.duration:
+                return container.duration / av.time_base
+            stream = container.streams.audio[0]
+            if stream.duration and stream.time_base:
+                return float(stream.duration * stream.time_base)
+    except Exception as e:
+        print(f"[policy] could not probe duration: {e}")
+    return None
+
+
+# Endpoint queue from the RunPod health API, refreshed at most every few seconds
+QUEUE_PROBE_TTL = 5.0
+_health = {"checked": 0.0, "queued": 0}
+
+
+def queue_depth():
+    """Jobs waiting in the endpoint queue; 0 without RUNPOD_ENDPOINT_ID / RUNPOD_API_KEY"""
+    endpoint_id = os.environ.get('RUNPOD_ENDPOINT_ID')
+    api_key = os.environ.get('RUNPOD_API_KEY')
+    if not endpoint_id or not api_key:
+        return 0
+    now = time.monotonic()
+    if now - _health["checked"] > QUEUE_PROBE_TTL:
+        _health["checked"] = now
+        try:
+            import json
+            import urllib.request
+            request = urllib.request.Request(
+                f"https://api.runpod.ai/v2/{endpoint_id}/health",
+                headers={"Authorization": f"Bearer {api_key}"},
+            )
+            with urllib.request.urlopen(request, timeout=2) as response:
+                _health["queued"] = json.load(response).get("jobs", {}).get("inQueue", 0)
+        except Exception as e:
+            print(f"[policy] health probe failed: {e}")
+    return _health["queued"]
+
+
+# --- Policies ---
+def default_compute_type(hardware):
+    if os.environ.get('WHISPER_COMPUTE_TYPE'):
+        return os.environ['WHISPER_COMPUTE_TYPE']
+    if hardware.device != 'cuda':
+        # float16 is not supported on CPU, int8 is the fast option there
+        return 'int8'
+    # int8 weights leave room for a larger model / batch on small cards
+    return 'float16' if hardware.gpu_memory_mb == 0 or hardware.gpu_memory_mb >= 10000 else 'int8_float16'
+
+
+def estimate_seconds(duration, model, hardware, compute_type, beam_size, batch_size=1):
+    """Planned wall time to decode duration seconds of audio"""
+    speed = SPEED[(model, 'cuda' if hardware.device == 'cuda' else 'cpu')]
+    speed *= COMPUTE_SPEEDUP.get(compute_type, 1.0)
+    if beam_size == 1:
+        speed *= GREEDY_SPEEDUP
+    if batch_size > 1:
+        # Batched decoding of VAD segments; gains flatten out past ~8
+        speed *= min(batch_size, 8) ** 0.6
+    return duration / speed
+
+
+def quality_of(decision):
+    """Rough WER (%) of a decision, lower is better"""
+    wer = WER[decision.model]
+    if decision.compute_type.startswith('int8'):
+        wer += INT8_WER_PENALTY
+    if decision.beam_size == 1:
+        wer += GREEDY_WER_PENALTY
+    return wer
+
+
+class StaticPolicy:
+    """The original plan -> model table, with a compute_type the hardware supports"""
+
+    def choose(self, plan, duration, queue, hardware):
+        model = PLAN_TARGET.get(plan, PLAN_TARGET['free'])
+        return Decision(model, default_compute_type(hardware), 5, 1, "plan")
+
+
+class AdaptivePolicy:
+    """Largest model at or above the plan's floor that keeps the job within the wait budget"""
+
+    def __init__(self, max_wait=None, greedy_queue_depth=None):
+        self.max_wait = POLICY_MAX_WAIT_SECONDS if max_wait is None else max_wait
+        self.greedy_queue_depth = greedy_queue_depth or POLICY_GREEDY_QUEUE_DEPTH
+
+    def batch_size(self, duration, hardware):
+        if hardware.device != 'cuda' or duration is None or duration < 60:
+            return 1
+        # CPU nodes parallelise long audio with chunked.py instead
+        return 16 if hardware.gpu_memory_mb >= 16000 else 8
+
+    def choose(self, plan, duration, queue, hardware):
+        target = PLAN_TARGET.get(plan, PLAN_TARGET['free'])
+        floor = PLAN_FLOOR.get(plan, PLAN_FLOOR['free'])
+        compute_type = default_compute_type(hardware)
+        batch_size = self.batch_size(duration, hardware)
+        beam_size = 1 if queue >= self.greedy_queue_depth else 5
+        if duration is None:
+            return Decision(target, compute_type, beam_size, batch_size, "unknown duration")
+
+        def wait(model, beam):
+            # The jobs ahead are assumed to be about as long as this one
+            return estimate_seconds(duration, model, hardware, compute_type, beam, batch_size) * (1 + queue)
+
+        model = target
+        reasons = []
+        while model != floor and wait(model, beam_size) > self.max_wait:
+            model = MODEL_ORDER[MODEL_ORDER.index(model) - 1]
+            reasons.append(f"wait>{self.max_wait:g}s")
+        if beam_size == 5 and wait(model, 5) > self.max_wait:
+            beam_size = 1
+            reasons.append("greedy")
+        elif beam_size == 1:
+            reasons.append(f"queue>={self.greedy_queue_depth}")
+        reason = "target" if not reasons else ", ".join(dict.fromkeys(reasons))
+        return Decision(model, compute_type, beam_size, batch_size, reason)
+
+
+POLICIES = {
+    'static': StaticPolicy,
+    'adaptive': AdaptivePolicy,
+}
+
+
+def register_policy(name, policy_class):
+    POLICIES[name] = policy_class
+
+
+@functools.lru_cache(maxsize=None)
+def get_policy(name=None):
+    """Policy instance by registered name or "module:ClassName" """
+    name = name or MODEL_POLICY
+    if name in POLICIES:
+        return POLICIES[name]()
+    module_name, _, class_name = name.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def simulate(policy, hardware, jobs=2000, load=0.9, seed=0):
+    """Single worker, FIFO queue, Poisson arrivals at `load` x the static policy's capacity.
+
+    Returns throughput (audio hours per hour), latency p50/p95 and mean WER.
+    """
+    import bisect
+    import random
+
+    rng = random.Random(seed)
+    plans = ['free'] * 6 + ['starter'] * 2 + ['pro', 'enterprise']
+    durations = [min(rng.lognormvariate(5.2, 1.0), 3 * 3600) for _ in range(jobs)]
+    job_plans = [rng.choice(plans) for _ in range(jobs)]
+
+    # Arrival rate such that the static table would be busy `load` of the time
+    static = StaticPolicy()
+
+    def static_seconds(duration, plan):
+        decision = static.choose(plan, duration, 0, hardware)
+        return estimate_seconds(duration, decision.model, hardware, decision.compute_type, decision.beam_size)
+
+    mean_service = sum(static_seconds(d, p) for d, p in zip(durations, job_plans)) / jobs
+    arrivals = []
+    clock = 0.0
+    for _ in range(jobs):
+        clock += rng.expovariate(load / mean_service)
+        arrivals.append(clock)
+
+    free_at = 0.0
+    latencies, wer, audio = [], 0.0, 0.0
+    chosen = []
+    for index, (arrival, duration, plan) in enumerate(zip(arrivals, durations, job_plans)):
+        start = max(arrival, free_at)
+        # Jobs that arrived while this one waited are the queue it sees
+        queue = bisect.bisect_right(arrivals, start) - index - 1
+        decision = policy.choose(plan, duration, queue, hardware)
+        free_at = start + estimate_seconds(duration, decision.model, hardware, decision.compute_type,
+                                           decision.beam_size, decision.batch_size)
+        latencies.append(free_at - arrival)
+        wer += quality_of(decision) * duration
+        audio += duration
+        chosen.append(decision.model)
+
+    latencies.sort()
+    return {
+        "audio_hours_per_hour": audio / (free_at - arrivals[0]),
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int(len(latencies) * 0.95)],
+        "wer": wer / audio,
+        "models": {model: chosen.count(model) for model in MODEL_ORDER if model in chosen},
+    }
+
+
+def benchmark(jobs=2000):
+    for hardware in (Hardware('cuda', 24000, 8), Hardware('cpu', 0, 8)):
+        for load in (0.7, 0.95, 1.3):
+            print(f"{hardware.device}, load {load:.2f} of static capacity, {jobs} jobs")
+            for name in ('static', 'adaptive'):
+                result = simulate(POLICIES[name](), hardware, jobs, load)
+                models = ", ".join(f"{m}:{n}" for m, n in result["models"].items())
+                print(f"  {name:<9} {result['audio_hours_per_hour']:6.1f} audio h/h  "
+                      f"p50 {result['p50']:8.0f}s  p95 {result['p95']:8.0f}s  WER {result['wer']:.2f}%  [{models}]")
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
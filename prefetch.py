@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Download queued jobs' media while the model is busy with the current one.
+
+Prefetcher starts R2 downloads on background threads as soon as a job
+arrives (bounded depth and disk quota), and ModelGate serialises model use
+while recording how long the model sat idle before each job.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PREFETCH_DEPTH = int(os.environ.get('PREFETCH_DEPTH', '2'))
+PREFETCH_DISK_QUOTA_MB = float(os.environ.get('PREFETCH_DISK_QUOTA_MB', '4096'))
+
+MB = 1024 * 1024
+
+
+class Prefetcher:
+    """Background downloads with at most `depth` in flight and a disk quota"""
+
+    def __init__(self, download, size_of=None, depth=None, disk_quota_mb=None):
+        self.download = download  # job_input -> (local_path, error)
+        self.size_of = size_of    # job_input -> bytes, used to reserve quota up front
+        self.depth = depth or PREFETCH_DEPTH
+        self.quota = (PREFETCH_DISK_QUOTA_MB if disk_quota_mb is None else disk_quota_mb) * MB
+        self.used = 0
+        self._sizes = {}
+        self._space = threading.Condition()
+        self._executor = ThreadPoolExecutor(self.depth, thread_name_prefix="prefetch")
+
+    def fetch(self, job_input):
+        """Start downloading in the background; returns a Future of (path, error)"""
+        return self._executor.submit(self._fetch, job_input)
+
+    def _fetch(self, job_input):
+        size = 0
+        if self.size_of is not None:
+            try:
+                size = self.size_of(job_input)
+            except Exception as e:
+                print(f"Could not get size of {job_input.get('fileName')}: {e}")
+        with self._space:
+            # A single file bigger than the quota may still go when nothing else is on disk
+            while self.used and self.used + size > self.quota:
+                self._space.wait()
+            self.used += size
+
+        started = time.perf_counter()
+        path, error = self.download(job_input)
+        if error:
+            self._release_bytes(size)
+            return None, error
+
+        # Swap the estimate for the real size on disk
+        actual = os.path.getsize(path)
+        with self._space:
+            self.used += actual - size
+            self._sizes[path] = actual
+        print(f"Prefetched {job_input.get('fileName')} in {time.perf_counter() - started:.2f}s")
+        return path, None
+
+    def release(self, path):
+        """Free the quota held by a downloaded file (after it is removed)"""
+        with self._space:
+            size = self._sizes.pop(path, 0)
+        self._release_bytes(size)
+
+    def _release_bytes(self, size):
+        with self._space:
+            self.used = max(0, self.used - size)
+            self._space.notify_all()
+
+
+class ModelGate:
+    """One job on the model at a time; measures idle gaps between jobs"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._released_at = time.perf_counter()
+        self.busy_seconds = 0.0
+        self.idle_seconds = 0.0
+
+    def __enter__(self):
+        self._lock.acquire()
+        self._acquired_at = time.perf_counter()
+        # Time the model had nothing to do before this job got it
+        self.job_idle = max(0.0, self._acquired_at - self._released_at)
+        self.idle_seconds += self.job_idle
+        return self
+
+    def __exit__(self, *exc):
+        self._released_at = time.perf_counter()
+        self.busy_seconds += self._released_at - self._acquired_at
+        self._lock.release()
+        return False
+
+    def utilization(self):
+        total = self.busy_seconds + self.idle_seconds
+        return round(self.busy_seconds / total, 4) if total else 0.0
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Re-split Whisper segments into readable subtitle cues using word timings.
+
+One linear pass over the words: a cue is closed as soon as the next word
+would break the line length / line count or the max duration, or at
+sentence punctuation once the cue is reasonably full. Cues that read too
+fast are stretched into the following gap, up to the reading speed.
+
+Benchmark: python resegment.py [hours]
+"""
+
+DEFAULTS = {
+    "maxCharsPerLine": 42,
+    "maxLines": 2,
+    "maxDuration": 7.0,
+    "maxCps": 17.0,
+    "minGap": 0.08,  # seconds kept between a stretched cue and the next one
+}
+
+SENTENCE_END = (".", "?", "!", "。", "？", "！")
+
+
+def options_from_job(job_input):
+    """Resegmentation options from a job; None when not requested"""
+    requested = job_input.get('resegment')
+    if not requested:
+        return None
+    options = dict(DEFAULTS)
+    if isinstance(requested, dict):
+        options.update({key: requested[key] for key in DEFAULTS if key in requested})
+    return options
+
+
+def _words(segment):
+    """(start, end, text) for each word of a segment, or None without word timings"""
+    words = segment.get("words") if isinstance(segment, dict) else getattr(segment, "words", None)
+    if not words:
+        return None
+    if isinstance(words[0], dict):
+        return [(w["start"], w["end"], w["word"].strip()) for w in words]
+    return [(w.start, w.end, w.word.strip()) for w in words]
+
+
+def _fields(segment):
+    if isinstance(segment, dict):
+        return segment["start"], segment["end"], segment["text"].strip()
+    return segment.start, segment.end, segment.text.strip()
+
+
+class _Cue:
+    __slots__ = ("start", "end", "lines", "chars")
+
+    def __init__(self, start):
+        self.start = start
+        self.end = start
+        self.lines = [""]
+        self.chars = 0
+
+    def fits(self, word, end, options):
+        """Could word go into this cue without breaking a limit?"""
+        if end - self.start > options["maxDuration"]:
+            return False
+        line = self.lines[-1]
+        if not line or len(line) + 1 + len(word) <= options["maxCharsPerLine"]:
+            return True
+        return len(self.lines) < options["maxLines"]
+
+    def add(self, word, end, options):
+        line = self.lines[-1]
+        if not line:
+            self.lines[-1] = word
+        elif len(line) + 1 + len(word) <= options["maxCharsPerLine"]:
+            self.lines[-1] = line + " " + word
+        else:
+            self.lines.append(word)
+        self.chars += len(word) + (1 if self.chars else 0)
+        self.end = end
+
+    def full_enough(self, options):
+        return self.chars >= options["maxCharsPerLine"] * options["maxLines"] * 0.5
+
+
+def resegment(segments, options):
+    """Generator of {start, end, text} cues re-split from segment words"""
+    pending = None  # finished cue waiting to see the next start before re-timing
+
+    def finish(cue, next_start):
+        start, end = cue.start, cue.end
+        # Reading speed: stretch the cue into the gap before the next one
+        needed = cue.chars / options["maxCps"]
+        if end - start < needed:
+            limit = next_start - options["minGap"] if next_start is not None else start + needed
+            end = max(end, min(start + needed, limit))
+        return {"start": round(start, 3), "end": round(end, 3), "text": "\n".join(cue.lines)}
+
+    for segment in segments:
+        words = _words(segment)
+        if words is None:
+            # No word timings: keep the segment as one cue
+            start, end, text = _fields(segment)
+            words = [(start, end, text)] if text else []
+
+        cue = None
+        for start, end, word in words:
+            if not word:
+                continue
+            if cue is not None and not cue.fits(word, end, options):
+                if pending is not None:
+                    yield finish(pending, cue.start)
+                pending, cue = cue, None
+            if cue is None:
+                cue = _Cue(start)
+            cue.add(word, end, options)
+            if word.endswith(SENTENCE_END) and cue.full_enough(options):
+                if pending is not None:
+                    yield finish(pending, cue.start)
+                pending, cue = cue, None
+
+        if cue is not None:
+            if pending is not None:
+                yield finish(pending, cue.start)
+            pending = cue
+
+    if pending is not None:
+        yield finish(pending, None)
+
+
+def benchmark(hours=1.0):
+    """Stage overhead on a synthetic transcript with ~2.5 words per second"""
+    import random
+    import time
+
+    random.seed(0)
+    vocabulary = ["the", "subtitle", "worker", "transcribes", "long", "podcasts", "quickly.",
+                  "and", "then", "splits", "every", "segment", "into", "readable", "lines,", "right?"]
+    segments = []
+    position = 0.0
+    total = hours * 3600
+    while position < total:
+        words = []
+        for _ in range(random.randint(20, 70)):  # 8-28 s Whisper-sized segments
+            length = random.uniform(0.15, 0.6)
+            words.append({"start": position, "end": position + length, "word": " " + random.choice(vocabulary)})
+            position += length + random.uniform(0.0, 0.15)
+        segments.append({"start": words[0]["start"], "end": words[-1]["end"],
+                         "text": "".join(w["word"] for w in words), "words": words})
+        position += random.uniform(0.2, 1.5)
+
+    word_count = sum(len(s["words"]) for s in segments)
+    start = time.perf_counter()
+    cues = list(resegment(segments, DEFAULTS))
+    elapsed = time.perf_counter() - start
+
+    longest = max(len(line) for cue in cues for line in cue["text"].split("\n"))
+    print(f"{hours:g} h of audio: {len(segments)} segments, {word_count} words -> {len(cues)} cues")
+    print(f"  resegment: {elapsed * 1000:.1f} ms ({elapsed / hours * 1000:.1f} ms per audio hour)")
+    print(f"  longest line: {longest} chars, longest cue: {max(c['end'] - c['start'] for c in cues):.2f}s")
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
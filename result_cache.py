@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Content-addressed cache of transcription results.
+
+Key = sha256 of the downloaded audio + model name + decoding/output options,
+so a re-upload of the same file or a retried job skips decoding entirely.
+"""
+import hashlib
+import json
+import os
+import threading
+
+RESULT_CACHE = os.environ.get('RESULT_CACHE', '1') == '1'
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', '/tmp/result-cache')
+RESULT_CACHE_MAX_MB = float(os.environ.get('RESULT_CACHE_MAX_MB', '512'))
+# Also keep results in R2, next to the source object
+RESULT_CACHE_R2 = os.environ.get('RESULT_CACHE_R2', '0') == '1'
+
+
+def audio_hash(path, block_size=1 << 20):
+    """sha256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(audio_digest, model_name, **options):
+    """Stable key for an audio hash + model + options"""
+    payload = json.dumps({"audio": audio_digest, "model": model_name, **options}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LocalDiskCache:
+    """JSON files on local disk, evicted least recently used past max_bytes"""
+
+    def __init__(self, directory=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # mtime doubles as the LRU timestamp
+        os.utime(path)
+        return result
+
+    def put(self, key, result):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+
+class R2Cache:
+    """Results stored as JSON objects next to the source object in R2"""
+
+    def __init__(self, s3_client=None):
+        self._s3_client = s3_client
+
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            import storage
+            return storage.get_client()
+        return self._s3_client
+
+    @staticmethod
+    def object_key(file_name, key):
+        return f"{file_name}.transcripts/{key}.json"
+
+    def get(self, bucket_name, file_name, key):
+        try:
+            response = self.s3_client.get_object(Bucket=bucket_name, Key=self.object_key(file_name, key))
+            return json.loads(response['Body'].read())
+        except Exception as e:
+            if 'NoSuchKey' not in str(e) and '404' not in str(e):
+                print(f"R2 cache read failed: {e}")
+            return None
+
+    def put(self, bucket_name, file_name, key, result):
+        try:
+            self.s3_client.put_object(
+                Bucket=bucket_name,
+                Key=self.object_key(file_name, key),
+                Body=json.dumps(result).encode(),
+                ContentType='application/json',
+            )
+        except Exception as e:
+            print(f"R2 cache write failed: {e}")
+
+
+class ResultCache:
+    """Local disk first, then R2 (when enabled)"""
+
+    def __init__(self, s3_client=None, local=None, use_r2=RESULT_CACHE_R2):
+        self.local = local or LocalDiskCache()
+        self.r2 = R2Cache(s3_client) if use_r2 else None
+
+    def get(self, key, bucket_name=None, file_name=None):
+        result = self.local.get(key)
+        if result is None and self.r2 and bucket_name and file_name:
+            result = self.r2.get(bucket_name, file_name, key)
+            if result is not None:
+                self.local.put(key, result)
+        return result
+
+    def put(self, key, result, bucket_name=None, file_name=None):
+        # Nem erros, nem uma tradução que falhou: o próximo job tenta de novo
+        if "error" in result or "error" in (result.get("translation") or {}):
+            return
+        self.local.put(key, result)
+        if self.r2 and bucket_name and file_name:
+            self.r2.put(bucket_name, file_name, key, result)
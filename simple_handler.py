@@ -2,6 +2,7 @@ import runpod
 import subprocess
 import json
 import os
+from subtitles import render_segments
 
 def handler(job):
     """Ultra simple handler that uses whisper CLI"""
@@ -27,30 +28,13 @@ def handler(job):
         whisper_output = json.load(f)
     
     # Format as SRT
-    srt_lines = []
-    for i, segment in enumerate(whisper_output.get("segments", []), 1):
-        start = segment["start"]
-        end = segment["end"]
-        text = segment["text"]
-        
-        # Convert to SRT format
-        srt_lines.append(str(i))
-        srt_lines.append(f"{format_time(start)} --> {format_time(end)}")
-        srt_lines.append(text.strip())
-        srt_lines.append("")
+    srt_content = render_segments("srt", whisper_output.get("segments", []))
     
     return {
         "transcription": whisper_output.get("text", ""),
-        "srt": "\n".join(srt_lines),
+        "srt": srt_content,
         "language": whisper_output.get("language", "unknown"),
         "duration": whisper_output.get("duration", 0)
     }
 
-def format_time(seconds):
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int((seconds % 1) * 1000)
-    return f"{hours:02}:{minutes:02}:{secs:02},{millis:03}"
-
 runpod.serverless.start({"handler": handler})
\ No newline at end of file
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Output sinks fed from a single pass over the Whisper segment generator"""
+import io
+from array import array
+import subtitles
+
+
+def segment_fields(segment):
+    """Return (start, end, text) for faster-whisper objects or whisper dicts"""
+    if isinstance(segment, dict):
+        return segment["start"], segment["end"], segment["text"].strip()
+    return segment.start, segment.end, segment.text.strip()
+
+
+class Sink:
+    """Base sink - receives each finished segment once, in order"""
+
+    def add(self, index, start, end, text):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+class TextSink(Sink):
+    """Full transcription text, segments joined by spaces"""
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._empty = True
+
+    def add(self, index, start, end, text):
+        if not self._empty:
+            self._buffer.write(" ")
+        self._buffer.write(text)
+        self._empty = False
+
+    def result(self):
+        return self._buffer.getvalue()
+
+
+class CueSink(Sink):
+    """Subtitle document (srt, vtt or ass) rendered in one go from cue arrays"""
+
+    def __init__(self, fmt="srt"):
+        self.fmt = fmt
+        self._starts = array("d")
+        self._ends = array("d")
+        self._texts = []
+
+    def add(self, index, start, end, text):
+        self._starts.append(start)
+        self._ends.append(end)
+        self._texts.append(text)
+
+    def result(self):
+        return subtitles.render(self.fmt, self._starts, self._ends, self._texts)
+
+
+class SrtSink(CueSink):
+    """SRT document"""
+
+    def __init__(self):
+        super().__init__("srt")
+
+
+class SegmentsJsonSink(Sink):
+    """List of {id, start, end, text} dicts"""
+
+    def __init__(self):
+        self._segments = []
+
+    def add(self, index, start, end, text):
+        self._segments.append({"id": index, "start": start, "end": end, "text": text})
+
+    def result(self):
+        return self._segments
+
+
+class DurationSink(Sink):
+    """End time of the last segment"""
+
+    def __init__(self):
+        self._end = 0
+
+    def add(self, index, start, end, text):
+        self._end = end
+
+    def result(self):
+        return self._end
+
+
+def feed(segments, sinks):
+    """Feed every sink from the segment generator, yielding each segment.
+
+    Yields (index, start, end, text) after all sinks have seen it, so
+    callers can stream partial results while the sinks build the outputs.
+    """
+    sink_list = list(sinks.values())
+    for index, segment in enumerate(segments, 1):
+        start, end, text = segment_fields(segment)
+        for sink in sink_list:
+            sink.add(index, start, end, text)
+        yield index, start, end, text
+
+
+def results(sinks):
+    return {name: sink.result() for name, sink in sinks.items()}
+
+
+def consume(segments, sinks):
+    """Walk the segment generator once, feeding every sink.
+
+    sinks maps an output name to a Sink; returns {name: sink.result()}.
+    Segments are dropped as soon as every sink has seen them.
+    """
+    for _ in feed(segments, sinks):
+        pass
+    return results(sinks)
@@ -1,10 +1,24 @@
 #!/usr/bin/env python3
 """Smart handler that selects Whisper model based on user plan"""
-import runpod
 import os
+import importlib.util
 import json
 import tempfile
 import subprocess
+import audio_input
+import guard
+import langprobe
+import metrics
+import storage
+import vad
+from model_pool import get_whisper_model, get_openai_whisper_model
+from policy import MODEL_POLICY, detect_hardware, get_policy, probe_duration, queue_depth
+from sinks import consume, TextSink, SrtSink, DurationSink
+from startup import profile_if_requested
+from warmup import warm_start
+
+# Checked once at startup instead of importing inside every job
+HAS_FASTER_WHISPER = importlib.util.find_spec("faster_whisper") is not None
 
 def handler(job):
     """Handler that selects model quality based on user plan"""
@@ -15,121 +29,139 @@ def handler(job):
     file_name = job_input.get('fileName')
     user_plan = job_input.get('userPlan', 'free')  # Get user plan from request
     
-    # Select Whisper model based on plan
-    # Free plan gets medium quality (good accuracy)
-    # Paid plans get large-v2 on GPU (fastest + best quality)
-    model_selection = {
-        'free': 'medium',        # Good quality for free users
-        'starter': 'large-v2',   # Best model, GPU accelerated
-        'pro': 'large-v2',       # Best model, GPU accelerated
-        'enterprise': 'large-v2' # Best model, GPU accelerated
-    }
-    
-    selected_model = model_selection.get(user_plan, 'medium')
-    print(f"User plan: {user_plan}, Using model: {selected_model}")
-    
     # Create temp directory
     temp_dir = tempfile.mkdtemp()
-    input_file = os.path.join(temp_dir, "input.mp3")
+    input_file = audio_input.input_path(temp_dir, file_name)
+    trace = metrics.start_trace()
     
     try:
-        # Download from R2
-        import boto3
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=f"https://{os.environ.get('R2_ACCOUNT_ID')}.r2.cloudflarestorage.com",
-            aws_access_key_id=os.environ.get('R2_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.environ.get('R2_SECRET_ACCESS_KEY')
-        )
-        
+        # Download from R2 (shared, pooled client)
         print(f"Downloading {file_name} from {bucket_name}")
-        s3_client.download_file(bucket_name, file_name, input_file)
+        with trace.stage("download"):
+            storage.download(bucket_name, file_name, input_file)
+        
+        # Select model, compute type, beam and batch size (see policy.py)
+        # The plan sets the quality floor: free gets medium (small under load),
+        # paid plans get large-v2; duration and queue depth decide the rest
+        with trace.stage("policy"):
+            duration = probe_duration(input_file)
+            decision = get_policy().choose(user_plan, duration, queue_depth(), detect_hardware())
+        selected_model = decision.model
+        print(f"User plan: {user_plan}, Using model: {selected_model} "
+              f"({decision.compute_type}, beam {decision.beam_size}, batch {decision.batch_size}: {decision.reason})")
+        
+        # Decode once to 16 kHz mono; VAD and the model share the array
+        with trace.stage("audio_decode"):
+            audio, audio_report = audio_input.normalize(input_file)
         
         # Check if we have faster-whisper (better) or regular whisper
         try:
-            from faster_whisper import WhisperModel
+            if not HAS_FASTER_WHISPER:
+                raise ImportError("faster-whisper is not installed")
             print(f"Using faster-whisper with {selected_model} model")
             
             # Faster-whisper is MUCH faster and uses less memory
-            model = WhisperModel(selected_model, device="cuda", compute_type="float16")
-            segments, info = model.transcribe(input_file, beam_size=5)
-            
-            # Convert to list
-            segments_list = list(segments)
+            # Models stay warm in the process-wide pool between jobs
+            with trace.stage("model_load"):
+                model, model_info = get_whisper_model(selected_model, compute_type=decision.compute_type)
+            # Language from the job's hint or a probe on a few sampled windows (see langprobe.py)
+            with trace.stage("language_probe"):
+                probe = langprobe.probe(model, audio, job_input.get('language'))
+            # Length of the audio already decoded; the header probe above may have found none
+            variant = langprobe.english_variant(
+                selected_model, probe, len(audio) / langprobe.SAMPLING_RATE, langprobe.loaded_models()
+            )
+            if variant != selected_model:
+                print(f"English audio: switching {selected_model} -> {variant}")
+                selected_model = variant
+                with trace.stage("model_load"):
+                    model, model_info = get_whisper_model(selected_model, compute_type=decision.compute_type)
+            language = langprobe.language_for(probe)
+            # Without a language, transcribe() detects it up front
+            with trace.stage("prepare"):
+                # Speech pre-filter (see vad.py), when VAD_FILTER or the job's "vad" turns it on
+                vad_options = vad.options_from_job(job_input)
+                guard_report = {}
+                if decision.batch_size > 1:
+                    from faster_whisper import BatchedInferencePipeline
+                    segments, info = vad.transcribe(
+                        BatchedInferencePipeline(model=model), audio, vad_options,
+                        beam_size=decision.beam_size, batch_size=decision.batch_size, language=language
+                    )
+                else:
+                    # Repetition loops are cut short and re-decoded (see guard.py)
+                    segments, info = vad.transcribe(
+                        guard.GuardedModel(model, guard_report), audio, vad_options,
+                        beam_size=decision.beam_size, language=language
+                    )
             
-            # Generate SRT
-            srt_lines = []
-            full_text = []
-            for i, segment in enumerate(segments_list, 1):
-                start = format_timestamp(segment.start)
-                end = format_timestamp(segment.end)
-                text = segment.text.strip()
-                
-                srt_lines.extend([str(i), f"{start} --> {end}", text, ""])
-                full_text.append(text)
+            # Single pass over the generator feeds every output
+            with trace.stage("serialize"):
+                outputs = consume(trace.iterate("decode", segments), {"transcription": TextSink(), "srt": SrtSink()})
             
             processing_info = {
                 "model_used": f"faster-whisper/{selected_model}",
                 "user_plan": user_plan,
                 "processing_speed": "fast",
-                "quality": get_quality_description(selected_model)
+                "quality": get_quality_description(selected_model),
+                "policy": decision._asdict(),
+                **model_info
             }
             
-            return {
-                "transcription": " ".join(full_text),
-                "srt": "\n".join(srt_lines),
+            return metrics.finish(trace, {
+                "transcription": outputs["transcription"],
+                "srt": outputs["srt"],
                 "detected_language": info.language,
                 "duration": info.duration,
+                "vad": vad.summary(info),
+                "audio": audio_report,
+                "language_probe": langprobe.report(probe, selected_model),
+                "guard": guard_report or None,
                 "processing_info": processing_info
-            }
+            }, info.duration)
             
         except ImportError:
             print(f"Faster-whisper not available, using OpenAI Whisper")
             
             # Fallback to regular whisper
-            import whisper
-            model = whisper.load_model(selected_model)
-            result = model.transcribe(input_file)
+            with trace.stage("model_load"):
+                model, model_info = get_openai_whisper_model(selected_model)
+            with trace.stage("language_probe"):
+                probe = langprobe.probe(model, audio, job_input.get('language'))
+            # openai-whisper decodes everything before returning
+            with trace.stage("decode"):
+                result = model.transcribe(audio, language=langprobe.language_for(probe))
             
-            # Generate SRT
-            srt_lines = []
-            for i, segment in enumerate(result["segments"], 1):
-                start = format_timestamp(segment["start"])
-                end = format_timestamp(segment["end"])
-                text = segment["text"].strip()
-                srt_lines.extend([str(i), f"{start} --> {end}", text, ""])
+            with trace.stage("serialize"):
+                outputs = consume(result["segments"], {"srt": SrtSink(), "duration": DurationSink()})
             
             processing_info = {
                 "model_used": f"openai-whisper/{selected_model}",
                 "user_plan": user_plan,
                 "processing_speed": "standard",
-                "quality": get_quality_description(selected_model)
+                "quality": get_quality_description(selected_model),
+                "policy": decision._asdict(),
+                **model_info
             }
             
-            return {
+            return metrics.finish(trace, {
                 "transcription": result["text"],
-                "srt": "\n".join(srt_lines),
-                "detected_language": result.get("language", "unknown"),
-                "duration": result["segments"][-1]["end"] if result["segments"] else 0,
+                "srt": outputs["srt"],
+                "detected_language": result.get("language") or langprobe.language_for(probe) or "unknown",
+                "duration": outputs["duration"],
+                "audio": audio_report,
+                "language_probe": langprobe.report(probe),
                 "processing_info": processing_info
-            }
+            }, outputs["duration"])
         
     except Exception as e:
         print(f"Error: {str(e)}")
-        return {"error": str(e)}
+        return metrics.finish(trace, {"error": str(e)})
     finally:
         # Cleanup
         if os.path.exists(temp_dir):
             subprocess.run(["rm", "-rf", temp_dir])
 
-def format_timestamp(seconds):
-    """Convert seconds to SRT timestamp format"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int((seconds % 1) * 1000)
-    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
-
 def get_quality_description(model):
     """Get quality description for each model"""
     descriptions = {
@@ -138,11 +170,20 @@ def get_quality_description(model):
         'small': 'High quality - Slower processing',
         'medium': 'Premium quality - Professional results',
         'large': 'Maximum quality - Studio grade',
-        'large-v2': 'Ultra HD quality - GPU accelerated, fastest & most accurate'
+        'large-v2': 'Ultra HD quality - GPU accelerated, fastest & most accurate',
+        # English-only variants picked for clearly English audio (see langprobe.py)
+        'distil-small.en': 'High quality - English only, faster processing',
+        'distil-medium.en': 'Premium quality - English only, faster processing',
+        'distil-large-v2': 'Ultra HD quality - English only, distilled for speed'
     }
     return descriptions.get(model, 'Standard quality')
 
 if __name__ == "__main__":
+    profile_if_requested("smart_handler")
     print("Smart handler ready - Model selection based on user plan")
-    print("Free: medium | Paid plans: large-v2 (GPU accelerated)")
+    print(f"Free: medium | Paid plans: large-v2 (GPU accelerated) | policy: {MODEL_POLICY}")
+    # Load and warm up PRELOAD_MODELS before accepting the first job
+    metrics.start_if_enabled()
+    warm_start()
+    import runpod
     runpod.serverless.start({"handler": handler})
\ No newline at end of file
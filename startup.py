@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Startup profiling for the handler modules.
+
+`python handler.py --profile-startup` (or any handler that calls
+profile_if_requested) prints where cold-start time goes:
+
+- imports: the module is imported in a child interpreter with
+  -X importtime and self time is summed per top-level package, so one
+  line per dependency instead of thousands of nested entries;
+- initialisation: warm start (model load + warm-up) and R2 client setup,
+  timed in this process.
+"""
+import os
+import subprocess
+import sys
+import time
+
+PROFILE_FLAG = "--profile-startup"
+
+
+def import_breakdown(module_name, cwd=None):
+    """Import module_name under -X importtime; returns ({package: self_us}, total_us)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        capture_output=True, text=True, cwd=cwd,
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise RuntimeError(f"importing {module_name} failed")
+
+    packages = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # import time:  self [us] | cumulative | imported package
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        self_us = int(fields[0])
+        name = fields[2].strip()
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+        total += self_us
+    return packages, total
+
+
+def print_import_breakdown(module_name, cwd=None, top=15):
+    packages, total = import_breakdown(module_name, cwd)
+    print(f"Import time for '{module_name}': {total / 1e6:.2f}s total")
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+    for package, self_us in ranked[:top]:
+        print(f"  {package:<28} {self_us / 1e6:7.3f}s  {self_us / total:6.1%}")
+    rest = sum(self_us for _, self_us in ranked[top:])
+    if rest:
+        print(f"  {'(' + str(len(ranked) - top) + ' others)':<28} {rest / 1e6:7.3f}s  {rest / total:6.1%}")
+    return packages, total
+
+
+def profile_startup(module_name, default_models=""):
+    """Print the import breakdown, then time the initialisation steps"""
+    cwd = os.path.dirname(os.path.abspath(sys.modules["__main__"].__file__))
+    print_import_breakdown(module_name, cwd)
+
+    print("Initialisation:")
+    from warmup import warm_start
+    report = warm_start(default_models)
+    for module, seconds in report["import"].items():
+        print(f"  import {module:<22} {seconds:7.3f}s")
+    for name, entry in report["models"].items():
+        if "error" in entry:
+            print(f"  model {name:<23} failed: {entry['error']}")
+        elif "skipped" in entry:
+            print(f"  model {name:<23} skipped: {entry['skipped']}")
+        else:
+            print(f"  model {name:<23} load {entry['load']:.3f}s, warm-up {entry['warmup']:.3f}s")
+
+    start = time.perf_counter()
+    import storage
+    try:
+        storage.get_client()
+        print(f"  R2 client                    {time.perf_counter() - start:7.3f}s")
+    except Exception as e:
+        print(f"  R2 client failed: {e}")
+
+
+def profile_if_requested(module_name, default_models=""):
+    """Handle --profile-startup from a handler's __main__; exits when it ran"""
+    if PROFILE_FLAG in sys.argv:
+        profile_startup(module_name, default_models)
+        sys.exit(0)
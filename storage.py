@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""Shared R2 storage layer - one pooled boto3 client for every handler.
+
+The client is built lazily on first use and reused across jobs, so
+credential resolution and TLS handshakes are not repeated per job.
+Set R2_ENDPOINT_URL to point it at MinIO or a moto server for local runs.
+"""
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+R2_ENDPOINT_URL = os.environ.get('R2_ENDPOINT_URL')
+R2_MAX_POOL_CONNECTIONS = int(os.environ.get('R2_MAX_POOL_CONNECTIONS', '32'))
+R2_MULTIPART_THRESHOLD_MB = int(os.environ.get('R2_MULTIPART_THRESHOLD_MB', '16'))
+R2_MULTIPART_CHUNK_MB = int(os.environ.get('R2_MULTIPART_CHUNK_MB', '16'))
+R2_MAX_CONCURRENCY = int(os.environ.get('R2_MAX_CONCURRENCY', '16'))
+# Streaming input: ranged GET block size and how many blocks to fetch ahead
+R2_STREAM_BLOCK_MB = int(os.environ.get('R2_STREAM_BLOCK_MB', '4'))
+R2_STREAM_READAHEAD = int(os.environ.get('R2_STREAM_READAHEAD', '4'))
+
+MB = 1024 * 1024
+
+_client = None
+_transfer_config = None
+_lock = threading.Lock()
+
+
+def endpoint_url():
+    return R2_ENDPOINT_URL or f"https://{os.environ.get('R2_ACCOUNT_ID')}.r2.cloudflarestorage.com"
+
+
+def get_client():
+    """The process-wide S3 client for R2, created on first use"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import boto3
+                from botocore.config import Config
+                _client = boto3.client(
+                    's3',
+                    endpoint_url=endpoint_url(),
+                    aws_access_key_id=os.environ.get('R2_ACCESS_KEY_ID'),
+                    aws_secret_access_key=os.environ.get('R2_SECRET_ACCESS_KEY'),
+                    region_name=os.environ.get('R2_REGION', 'auto'),
+                    config=Config(
+                        max_pool_connections=R2_MAX_POOL_CONNECTIONS,
+                        retries={'max_attempts': 5, 'mode': 'adaptive'},
+                        tcp_keepalive=True,
+                    ),
+                )
+                print(f"R2 client ready ({endpoint_url()}, pool={R2_MAX_POOL_CONNECTIONS})")
+    return _client
+
+
+def set_client(client):
+    """Replace the shared client (local harnesses, moto, MinIO)"""
+    global _client
+    _client = client
+
+
+def get_transfer_config():
+    """Multipart settings tuned for large media files"""
+    global _transfer_config
+    if _transfer_config is None:
+        from boto3.s3.transfer import TransferConfig
+        _transfer_config = TransferConfig(
+            multipart_threshold=R2_MULTIPART_THRESHOLD_MB * MB,
+            multipart_chunksize=R2_MULTIPART_CHUNK_MB * MB,
+            max_concurrency=R2_MAX_CONCURRENCY,
+            use_threads=True,
+        )
+    return _transfer_config
+
+
+def object_size(bucket_name, file_name):
+    """Size in bytes of an object, from a HEAD request"""
+    return get_client().head_object(Bucket=bucket_name, Key=file_name)['ContentLength']
+
+
+def object_etag(bucket_name, file_name):
+    """ETag of an object (changes whenever its content does), from a HEAD request"""
+    return get_client().head_object(Bucket=bucket_name, Key=file_name).get('ETag', '').strip('"')
+
+
+def list_keys(bucket_name, prefix="", page_size=1000):
+    """Keys under a prefix, one ListObjectsV2 page at a time"""
+    kwargs = {"Bucket": bucket_name, "Prefix": prefix, "MaxKeys": page_size}
+    while True:
+        page = get_client().list_objects_v2(**kwargs)
+        for item in page.get("Contents", []):
+            yield item["Key"]
+        if not page.get("IsTruncated"):
+            return
+        kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+
+def read_bytes(bucket_name, key):
+    """Whole object in memory (manifests, small JSON)"""
+    return get_client().get_object(Bucket=bucket_name, Key=key)['Body'].read()
+
+
+def put_bytes(bucket_name, key, body, content_type='application/octet-stream'):
+    """Upload an in-memory object with a single PUT; returns its size in bytes"""
+    get_client().put_object(Bucket=bucket_name, Key=key, Body=body, ContentType=content_type)
+    return len(body)
+
+
+class _Progress:
+    """download_file callback: records time to first byte and bytes received"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_byte = None
+        self.received = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, chunk):
+        with self._lock:
+            if self.first_byte is None:
+                self.first_byte = time.perf_counter()
+            self.received += chunk
+
+
+def download(bucket_name, file_name, local_path):
+    """Download an object to local_path; logs and returns throughput stats"""
+    progress = _Progress()
+    get_client().download_file(
+        bucket_name, file_name, local_path,
+        Config=get_transfer_config(), Callback=progress,
+    )
+    elapsed = time.perf_counter() - progress.started
+    size = os.path.getsize(local_path)
+    stats = {
+        "bytes": size,
+        "seconds": round(elapsed, 3),
+        "mb_per_s": round(size / MB / elapsed, 2) if elapsed > 0 else 0.0,
+        "ttfb_ms": round((progress.first_byte - progress.started) * 1000, 1) if progress.first_byte else None,
+    }
+    print(f"Downloaded {file_name}: {size} bytes in {stats['seconds']}s "
+          f"({stats['mb_per_s']} MB/s, TTFB {stats['ttfb_ms']} ms)")
+    return stats
+
+
+class RangedReader(io.RawIOBase):
+    """Seekable file-like view of an R2 object backed by ranged GETs.
+
+    Blocks ahead of the read position are fetched on background threads,
+    so the decoder (PyAV/ffmpeg) starts working on the first block while
+    the rest is still downloading. Only a handful of blocks are kept in
+    memory and nothing is written to disk.
+    """
+
+    def __init__(self, bucket_name, file_name, block_size=None, readahead=None):
+        super().__init__()
+        self.bucket_name = bucket_name
+        self.file_name = file_name
+        self.block_size = (block_size or R2_STREAM_BLOCK_MB) * MB
+        self.readahead = R2_STREAM_READAHEAD if readahead is None else readahead
+
+        head = get_client().head_object(Bucket=bucket_name, Key=file_name)
+        self.size = head['ContentLength']
+        self.etag = head.get('ETag', '').strip('"')
+
+        self.started = time.perf_counter()
+        self.first_byte = None
+        self.fetched = 0
+        self._position = 0
+        self._blocks = OrderedDict()
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(max(1, self.readahead), thread_name_prefix="r2-stream")
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = self.size + offset
+        self._position = max(0, self._position)
+        return self._position
+
+    def _fetch(self, index):
+        start = index * self.block_size
+        end = min(start + self.block_size, self.size) - 1
+        response = get_client().get_object(Bucket=self.bucket_name, Key=self.file_name, Range=f"bytes={start}-{end}")
+        data = response['Body'].read()
+        if self.first_byte is None:
+            self.first_byte = time.perf_counter()
+        self.fetched += len(data)
+        return data
+
+    def _schedule(self, index):
+        if index * self.block_size < self.size and index not in self._blocks and index not in self._pending:
+            self._pending[index] = self._executor.submit(self._fetch, index)
+
+    def _block(self, index):
+        if index in self._blocks:
+            self._blocks.move_to_end(index)
+        else:
+            self._schedule(index)
+            self._blocks[index] = self._pending.pop(index).result()
+            # Keep the current block plus a couple behind it for short seeks
+            while len(self._blocks) > self.readahead + 2:
+                self._blocks.popitem(last=False)
+        for ahead in range(index + 1, index + 1 + self.readahead):
+            self._schedule(ahead)
+        return self._blocks[index]
+
+    def readinto(self, buffer):
+        if self._position >= self.size:
+            return 0
+        index = self._position // self.block_size
+        data = self._block(index)
+        offset = self._position - index * self.block_size
+        count = min(len(buffer), len(data) - offset)
+        buffer[:count] = data[offset:offset + count]
+        self._position += count
+        return count
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "bytes": self.fetched,
+            "seconds": round(elapsed, 3),
+            "ttfb_ms": round((self.first_byte - self.started) * 1000, 1) if self.first_byte else None,
+            "disk_bytes": 0,
+        }
+
+    def close(self):
+        if not self.closed:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._blocks.clear()
+            self._pending.clear()
+        super().close()
+
+
+def open_stream(bucket_name, file_name):
+    """Open an R2 object for streaming decode (no temp file)"""
+    reader = RangedReader(bucket_name, file_name)
+    print(f"Streaming {file_name}: {reader.size} bytes in {reader.block_size // MB} MB blocks")
+    return reader
+
+
+def benchmark(bucket_name, file_name):
+    """Download-then-decode vs streaming decode against R2_ENDPOINT_URL"""
+    import tempfile
+    from faster_whisper import decode_audio
+
+    local_path = os.path.join(tempfile.mkdtemp(), os.path.basename(file_name))
+    start = time.perf_counter()
+    download(bucket_name, file_name, local_path)
+    audio = decode_audio(local_path, sampling_rate=16000)
+    sequential = time.perf_counter() - start
+    disk = os.path.getsize(local_path)
+    os.remove(local_path)
+
+    start = time.perf_counter()
+    with open_stream(bucket_name, file_name) as reader:
+        streamed_audio = decode_audio(reader, sampling_rate=16000)
+    streamed = time.perf_counter() - start
+
+    print(f"{file_name}: {len(audio) / 16000:.0f}s of audio")
+    print(f"  download + decode: {sequential:6.2f}s, peak disk {disk / MB:.1f} MB")
+    print(f"  streaming decode:  {streamed:6.2f}s, peak disk 0.0 MB ({len(streamed_audio) == len(audio)})")
+    print(f"  saved:             {sequential - streamed:6.2f}s")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3:
+        print("Usage: R2_ENDPOINT_URL=http://localhost:9000 python storage.py <bucket> <key>")
+        sys.exit(1)
+    benchmark(sys.argv[1], sys.argv[2])
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Shared subtitle rendering: SRT, WebVTT and ASS from arrays of cues.
+
+Timestamps are rounded once to integer milliseconds (1.999 s is 00:00:01,999,
+not ,998 as the old float modulo gave) and every cue is written into a
+single buffer in one join.
+
+Microbenchmark: python subtitles.py [segments]
+"""
+
+# Zero-padded strings for every value a timestamp field can take
+_TWO = [f"{i:02d}" for i in range(100)]
+_THREE = [f"{i:03d}" for i in range(1000)]
+
+FORMATS = ("srt", "vtt", "ass")
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1920
+PlayResY: 1080
+WrapStyle: 0
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,64,&H00FFFFFF,&H000000FF,&H00000000,&H80000000,0,0,0,0,100,100,0,0,1,3,1,2,60,60,60,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def to_ms(seconds):
+    """Seconds -> integer milliseconds, rounded (not truncated)"""
+    return int(round(seconds * 1000))
+
+
+def format_timestamp(seconds, separator=","):
+    """Convert seconds to SRT timestamp format (hh:mm:ss,mmm)"""
+    total = to_ms(seconds)
+    hours, rest = divmod(total, 3600000)
+    minutes, rest = divmod(rest, 60000)
+    secs, millis = divmod(rest, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def _components(values, unit):
+    """Split an array of seconds into h/m/s/fraction integer lists.
+
+    unit is 1000 for milliseconds or 100 for ASS centiseconds.
+    """
+    import numpy as np
+    ticks = np.rint(np.asarray(values, dtype=np.float64) * unit).astype(np.int64)
+    ticks = np.maximum(ticks, 0)
+    hours, rest = np.divmod(ticks, 3600 * unit)
+    minutes, rest = np.divmod(rest, 60 * unit)
+    secs, fraction = np.divmod(rest, unit)
+    return hours.tolist(), minutes.tolist(), secs.tolist(), fraction.tolist()
+
+
+def _clock(values, separator):
+    """hh:mm:ss<sep>mmm strings for an array of seconds"""
+    two, three = _TWO, _THREE
+    return [
+        (two[h] if h < 100 else str(h)) + ":" + two[m] + ":" + two[s] + separator + three[f]
+        for h, m, s, f in zip(*_components(values, 1000))
+    ]
+
+
+def _ass_clock(values):
+    """h:mm:ss.cc strings for an array of seconds"""
+    two = _TWO
+    return [
+        str(h) + ":" + two[m] + ":" + two[s] + "." + two[c]
+        for h, m, s, c in zip(*_components(values, 100))
+    ]
+
+
+def render_srt(starts, ends, texts):
+    """SRT document from parallel arrays of starts, ends (seconds) and texts"""
+    if not len(texts):
+        return ""
+    return "\n".join([
+        f"{i}\n{a} --> {b}\n{t}\n"
+        for i, a, b, t in zip(range(1, len(texts) + 1), _clock(starts, ","), _clock(ends, ","), texts)
+    ])
+
+
+def render_vtt(starts, ends, texts):
+    """WebVTT document from parallel arrays of starts, ends and texts"""
+    cues = "\n".join([
+        f"{a} --> {b}\n{t}\n"
+        for a, b, t in zip(_clock(starts, "."), _clock(ends, "."), texts)
+    ]) if len(texts) else ""
+    return "WEBVTT\n\n" + cues
+
+
+def render_ass(starts, ends, texts):
+    """ASS (Advanced SubStation Alpha) script with one Dialogue per cue"""
+    events = "".join([
+        f"Dialogue: 0,{a},{b},Default,,0,0,0,,{t}\n"
+        for a, b, t in zip(_ass_clock(starts), _ass_clock(ends), (t.replace("\n", "\\N") for t in texts))
+    ]) if len(texts) else ""
+    return ASS_HEADER + events
+
+
+RENDERERS = {"srt": render_srt, "vtt": render_vtt, "ass": render_ass}
+
+
+def render(fmt, starts, ends, texts):
+    return RENDERERS[fmt](starts, ends, texts)
+
+
+def render_segments(fmt, segments):
+    """Render whisper-style segment dicts ({start, end, text})"""
+    return render(
+        fmt,
+        [segment["start"] for segment in segments],
+        [segment["end"] for segment in segments],
+        [segment["text"].strip() for segment in segments],
+    )
+
+
+def benchmark(count=100000):
+    """render_srt against the old per-segment format_timestamp loop"""
+    import random
+    import time
+
+    random.seed(0)
+    starts, ends, texts = [], [], []
+    position = 0.0
+    for i in range(count):
+        position += random.uniform(0.1, 2.0)
+        starts.append(position)
+        position += random.uniform(0.5, 6.0)
+        ends.append(position)
+        texts.append(f"segment number {i}")
+
+    def legacy_timestamp(seconds):
+        hours = int(seconds // 3600)
+        minutes = int((seconds % 3600) // 60)
+        secs = int(seconds % 60)
+        millis = int((seconds % 1) * 1000)
+        return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
+
+    start = time.perf_counter()
+    srt_lines = []
+    for i, (a, b, t) in enumerate(zip(starts, ends, texts), 1):
+        srt_lines.extend([str(i), f"{legacy_timestamp(a)} --> {legacy_timestamp(b)}", t, ""])
+    legacy = "\n".join(srt_lines)
+    legacy_time = time.perf_counter() - start
+
+    timings = {}
+    for fmt in FORMATS:
+        start = time.perf_counter()
+        output = render(fmt, starts, ends, texts)
+        timings[fmt] = time.perf_counter() - start
+        if fmt == "srt":
+            srt = output
+
+    differing = sum(1 for x, y in zip(legacy.split("\n"), srt.split("\n")) if x != y)
+    print(f"{count} segments")
+    print(f"  legacy format_timestamp loop: {legacy_time * 1000:8.1f} ms")
+    for fmt, elapsed in timings.items():
+        print(f"  render_{fmt}:                   {elapsed * 1000:8.1f} ms ({legacy_time / elapsed:.1f}x)")
+    print(f"  lines fixed by ms rounding:   {differing}")
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
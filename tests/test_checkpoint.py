@@ -0,0 +1,70 @@
+"""Kill a long transcription midway, run it again and check that it resumes"""
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from audio_input import normalize
+from checkpoint import Checkpoint, LocalCheckpointStore
+from chunked import synthetic_wav, transcribe_parallel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MINUTES = 20
+
+# First attempt, in its own process group so it can be killed with its workers
+CHILD = """
+import sys
+from audio_input import normalize
+from checkpoint import Checkpoint, LocalCheckpointStore
+from chunked import transcribe_parallel
+
+audio, _ = normalize(sys.argv[1])
+checkpoint = Checkpoint([LocalCheckpointStore("job", sys.argv[2])])
+segments, _ = transcribe_parallel(audio, "fake", workers=2, checkpoint=checkpoint)
+for _ in segments:
+    pass
+"""
+
+
+def saved_chunks(directory):
+    if not os.path.isdir(directory):
+        return 0
+    return len([n for n in os.listdir(directory) if n.startswith("chunk-") and n.endswith(".json")])
+
+
+def test_killed_job_resumes_from_checkpoints(tmp_path):
+    wav_path = str(tmp_path / "long.wav")
+    synthetic_wav(wav_path, MINUTES)
+    audio, _ = normalize(wav_path)
+    directory = str(tmp_path / "checkpoints")
+    saved_dir = os.path.join(directory, "job")
+
+    # Uninterrupted reference run
+    reference = list(transcribe_parallel(audio, "fake", workers=2)[0])
+
+    # ~4 s per 2-minute chunk with the slowed-down fake model; killed once a few chunks are saved
+    child = subprocess.Popen(
+        [sys.executable, "-c", CHILD, wav_path, directory], cwd=ROOT,
+        env={**os.environ, "FAKE_MODEL_DELAY": "2", "PYTHONPATH": ROOT}, start_new_session=True,
+    )
+    try:
+        deadline = time.time() + 120
+        while time.time() < deadline and saved_chunks(saved_dir) < 3 and child.poll() is None:
+            time.sleep(0.2)
+    finally:
+        os.killpg(child.pid, signal.SIGKILL)
+        child.wait()
+    killed_with = saved_chunks(saved_dir)
+
+    # Retry: same audio, same checkpoint key
+    checkpoint = Checkpoint([LocalCheckpointStore("job", directory)])
+    segments, info = transcribe_parallel(audio, "fake", workers=2, checkpoint=checkpoint)
+    resumed = list(segments)
+
+    assert 0 < killed_with < info.chunks, "the first attempt was not killed midway"
+    assert checkpoint.resumed == killed_with
+    assert resumed == reference
+    starts = [s["start"] for s in resumed]
+    assert all(b >= a for a, b in zip(starts, starts[1:]))
+    assert not os.path.exists(saved_dir), "checkpoints left behind after the job completed"
@@ -0,0 +1,21 @@
+"""English-variant choice after the language probe"""
+import langprobe
+
+ENGLISH = langprobe.Probe("en", 0.97, "probe", True, 0.1, [], None)
+LONG = langprobe.ENGLISH_VARIANT_MIN_SECONDS + 1
+
+
+def test_confident_english_long_file_switches():
+    assert langprobe.english_variant("medium", ENGLISH, LONG) == "distil-medium.en"
+
+
+def test_unknown_duration_counts_as_short():
+    # smart_handler's header probe returns None when it cannot read the file
+    assert langprobe.english_variant("medium", ENGLISH, None) == "medium"
+    assert langprobe.english_variant("medium", ENGLISH, None, {"distil-medium.en"}) == "distil-medium.en"
+
+
+def test_other_languages_keep_the_model():
+    spanish = ENGLISH._replace(language="es")
+    assert langprobe.english_variant("medium", spanish, LONG) == "medium"
+    assert langprobe.english_variant("medium", None, LONG) == "medium"
@@ -0,0 +1,28 @@
+"""Tracing overhead stays negligible next to decoding"""
+import metrics
+
+SEGMENTS = 2000
+# Per job of SEGMENTS segments: 2 us per segment, against ~100 ms of decode per segment
+MAX_OVERHEAD_SECONDS = 0.004
+
+
+def test_tracing_overhead_per_job():
+    before = metrics.registry.render(), metrics.current()
+    result = metrics.benchmark(segments=SEGMENTS, jobs=50, repeats=5)
+    # Nothing leaks into the process-wide metrics
+    assert metrics.server is None
+    assert (metrics.registry.render(), metrics.current()) == before
+    assert result["overhead"] < MAX_OVERHEAD_SECONDS, (
+        f"tracing adds {result['overhead'] * 1000:.2f} ms per {SEGMENTS}-segment job"
+    )
+
+
+def test_stage_and_iterate_book_self_time():
+    trace = metrics.start_trace()
+    with metrics.stage("serialize"):
+        with metrics.stage("upload"):
+            pass
+        list(metrics.iterate("decode", range(10)))
+    stages = trace.stages
+    assert set(stages) == {"serialize", "upload", "decode"}
+    assert all(seconds >= 0 for seconds in stages.values())
@@ -0,0 +1,19 @@
+"""Preloads and policy decisions agree on the compute type"""
+import pytest
+
+import policy
+import warmup
+
+
+@pytest.mark.parametrize("memory_mb, expected", [(8000, "int8_float16"), (24000, "float16")])
+def test_preload_matches_policy_default(monkeypatch, memory_mb, expected):
+    monkeypatch.delenv("WHISPER_COMPUTE_TYPE", raising=False)
+    monkeypatch.setattr(policy, "gpu_memory_mb", lambda: memory_mb)
+    (_, device, compute_type), _ = warmup.pool_entry("medium", "cuda")
+    assert (device, compute_type) == ("cuda", expected)
+    assert compute_type == policy.default_compute_type(policy.Hardware("cuda", memory_mb, 8))
+
+
+def test_cpu_defaults_to_int8(monkeypatch):
+    monkeypatch.delenv("WHISPER_COMPUTE_TYPE", raising=False)
+    assert warmup.pool_entry("medium", "cpu")[0][1:] == ("cpu", "int8")
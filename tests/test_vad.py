@@ -0,0 +1,47 @@
+"""Energy pre-filter with the fake backend: timestamps come back in original-audio time"""
+import numpy as np
+import pytest
+
+import chunked
+import vad
+from backends import FakeWhisperModel
+
+ENERGY = {"backend": "energy", "parameters": {}}
+
+
+def speech_and_silence(*pattern):
+    """Alternating seconds of tone and silence, starting with tone"""
+    rng = np.random.default_rng(0)
+    pieces = []
+    for index, seconds in enumerate(pattern):
+        samples = int(seconds * vad.SAMPLING_RATE)
+        pieces.append(rng.normal(0, 0.1, samples) if index % 2 == 0 else np.zeros(samples))
+    return np.concatenate(pieces).astype(np.float32)
+
+
+def test_energy_filter_skips_silence():
+    audio = speech_and_silence(10, 20, 10)
+    segments, info = vad.transcribe(FakeWhisperModel(0), audio, ENERGY)
+    segments = list(segments)
+
+    assert info.duration == 40
+    summary = vad.summary(info)
+    assert summary["backend"] == "energy"
+    # 200 ms of padding on each side of the silence, give or take a 30 ms frame
+    assert summary["skipped_seconds"] == pytest.approx(19.6, abs=0.05)
+    assert segments[0].start == 0
+    assert segments[-1].end == 40
+    # Nothing is placed inside the silence
+    assert not any(10.3 < segment.start < 29.7 for segment in segments)
+
+
+def test_chunked_workers_use_the_job_filter():
+    audio = speech_and_silence(100, 60, 100, 60, 100)
+    plain, _ = chunked.transcribe_parallel(audio, "fake", workers=1)
+    filtered, info = chunked.transcribe_parallel(audio, "fake", workers=1, vad_options=ENERGY)
+    filtered = list(filtered)
+
+    assert info.chunks > 1
+    assert len(filtered) < len(list(plain))
+    silences = [(100.2, 159.8), (260.2, 319.8)]
+    assert not any(lo < (s["start"] + s["end"]) / 2 < hi for s in filtered for lo, hi in silences)
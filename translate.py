@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""Subtitle translation for jobs that send targetLanguage.
+
+English targets are handled by Whisper itself (task="translate") in the
+same decode, so they cost nothing extra. Other targets go through a text
+translator over the finished segments: texts are sent in batches,
+repeated lines are translated once, and every translated line is kept in
+a per-process LRU cache keyed by translator + language pair + text.
+Segment timings are never touched.
+
+    translated, stats = translate_segments(segments, "pt", "es")
+
+Translators live in TRANSLATORS like the Whisper backends in backends.py:
+"marian" (Helsinki-NLP opus-mt models through transformers, kept in the
+model pool) and "fake" (tags each line, with a configurable delay, for
+tests and latency measurements). TRANSLATOR picks one; unset means the
+first installed real translator.
+
+Latency per audio minute: python translate.py [minutes]
+"""
+import functools
+import hashlib
+import importlib.util
+import os
+import threading
+import time
+from collections import OrderedDict
+
+TRANSLATOR = os.environ.get('TRANSLATOR')  # unset = first available
+TRANSLATION_BATCH_SIZE = int(os.environ.get('TRANSLATION_BATCH_SIZE', '32'))
+TRANSLATION_CACHE_SIZE = int(os.environ.get('TRANSLATION_CACHE_SIZE', '50000'))
+# Simulated cost of the fake translator: per batch and per character
+FAKE_TRANSLATOR_BATCH_MS = float(os.environ.get('FAKE_TRANSLATOR_BATCH_MS', '40'))
+FAKE_TRANSLATOR_CHAR_MS = float(os.environ.get('FAKE_TRANSLATOR_CHAR_MS', '0.05'))
+
+
+def same_pass(target_language):
+    """Whisper translates to English during the decode; everything else is text translation"""
+    return (target_language or "").lower() in ("en", "english")
+
+
+class Translator:
+    name = None
+
+    @classmethod
+    def available(cls):
+        raise NotImplementedError
+
+    def translate(self, texts, source_language, target_language):
+        """One batch of lines; returns the translations in the same order"""
+        raise NotImplementedError
+
+
+class MarianTranslator(Translator):
+    """Helsinki-NLP/opus-mt-<source>-<target>, one model per language pair"""
+    name = "marian"
+    size_mb = 300
+
+    @classmethod
+    def available(cls):
+        return importlib.util.find_spec("transformers") is not None
+
+    def load(self, source_language, target_language):
+        from model_pool import pool, resolve_device
+        device, _ = resolve_device()
+        model_name = f"Helsinki-NLP/opus-mt-{source_language}-{target_language}"
+
+        def load():
+            from transformers import MarianMTModel, MarianTokenizer
+            return MarianTokenizer.from_pretrained(model_name), MarianMTModel.from_pretrained(model_name).to(device)
+
+        (tokenizer, model), _ = pool.acquire((model_name, device, 'float32'), load, self.size_mb)
+        return tokenizer, model, device
+
+    def translate(self, texts, source_language, target_language):
+        tokenizer, model, device = self.load(source_language, target_language)
+        batch = tokenizer(texts, return_tensors="pt", padding=True, truncation=True).to(device)
+        generated = model.generate(**batch)
+        return tokenizer.batch_decode(generated, skip_special_tokens=True)
+
+
+class FakeTranslator(Translator):
+    """Deterministic "[<target>] text" with a simulated per-batch and per-character cost"""
+    name = "fake"
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def translate(self, texts, source_language, target_language):
+        time.sleep((FAKE_TRANSLATOR_BATCH_MS + FAKE_TRANSLATOR_CHAR_MS * sum(map(len, texts))) / 1000)
+        return [f"[{target_language}] {text}" for text in texts]
+
+
+# Probe order when TRANSLATOR is not set; "fake" is only used when asked for
+TRANSLATORS = {translator.name: translator for translator in (MarianTranslator, FakeTranslator)}
+
+
+def register_translator(translator_class):
+    TRANSLATORS[translator_class.name] = translator_class
+
+
+@functools.lru_cache(maxsize=None)
+def get_translator(name=None):
+    name = name or TRANSLATOR
+    if name:
+        translator_class = TRANSLATORS[name]
+        if not translator_class.available():
+            raise RuntimeError(f"Translator '{name}' is not available")
+    else:
+        translator_class = next((t for n, t in TRANSLATORS.items() if n != "fake" and t.available()), None)
+        if translator_class is None:
+            raise RuntimeError("No translator installed (install transformers or set TRANSLATOR)")
+    return translator_class()
+
+
+def translator_name(name=None):
+    """Name of the translator get_translator() resolves to now, or None when none is installed"""
+    try:
+        return get_translator(name).name
+    except (KeyError, RuntimeError):
+        return None
+
+
+class TranslationCache:
+    """LRU of translated lines, shared by every job in the process"""
+
+    def __init__(self, max_entries=TRANSLATION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(translator, source_language, target_language, text):
+        return hashlib.sha1(f"{translator}\0{source_language}\0{target_language}\0{text}".encode()).digest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        return None
+
+    def put(self, key, translation):
+        with self._lock:
+            self._entries[key] = translation
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+cache = TranslationCache()
+
+
+def translate_segments(segments, source_language, target_language, translator=None, batch_size=None,
+                       segment_cache=None):
+    """Translated copies of {start, end, text} segments; returns (segments, stats)"""
+    translator = translator or get_translator()
+    segment_cache = cache if segment_cache is None else segment_cache
+    batch_size = batch_size or TRANSLATION_BATCH_SIZE
+    start = time.perf_counter()
+
+    # Each distinct line once, and only the ones the cache does not have
+    translations = {}
+    missing = {}  # insertion-ordered set
+    for segment in segments:
+        text = segment["text"]
+        if text in translations or text in missing:
+            continue
+        cached = segment_cache.get(TranslationCache.key(translator.name, source_language, target_language, text))
+        if cached is not None:
+            translations[text] = cached
+        else:
+            missing[text] = None
+    missing = list(missing)
+
+    batches = 0
+    for i in range(0, len(missing), batch_size):
+        texts = missing[i:i + batch_size]
+        for text, translation in zip(texts, translator.translate(texts, source_language, target_language)):
+            translations[text] = translation
+            segment_cache.put(TranslationCache.key(translator.name, source_language, target_language, text), translation)
+        batches += 1
+
+    translated = [{**segment, "text": translations[segment["text"]]} for segment in segments]
+    stats = {
+        "translator": translator.name,
+        "translated": len(missing),
+        "cached": len(translations) - len(missing),
+        "batches": batches,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    return translated, stats
+
+
+# --- Benchmark ---
+def synthetic_segments(minutes, seed=0):
+    """~20 segments per minute with some repeated lines, like real speech"""
+    import random
+
+    rng = random.Random(seed)
+    words = ("we need to look at the numbers again before the meeting because the team is "
+             "not sure that the plan will work this quarter").split()
+    common = ["Thank you.", "Okay.", "Yes.", "Right, so let's move on."]
+    segments = []
+    t = 0.0
+    while t < minutes * 60:
+        length = rng.uniform(1.5, 5.0)
+        text = rng.choice(common) if rng.random() < 0.15 else " ".join(rng.choice(words) for _ in range(rng.randint(5, 14)))
+        segments.append({"id": len(segments) + 1, "start": round(t, 3), "end": round(t + length, 3), "text": text})
+        t += length + rng.uniform(0.1, 0.6)
+    return segments
+
+
+def benchmark(minutes=10.0):
+    """Added latency per audio minute with the fake translator: batch sizes, cold and warm cache"""
+    translator = FakeTranslator()
+    segments = synthetic_segments(minutes)
+    print(f"{minutes:g} min, {len(segments)} segments; fake translator "
+          f"{FAKE_TRANSLATOR_BATCH_MS:g} ms/batch + {FAKE_TRANSLATOR_CHAR_MS:g} ms/char")
+    for batch_size in (1, 8, TRANSLATION_BATCH_SIZE):
+        run_cache = TranslationCache()
+        translated, cold = translate_segments(segments, "pt", "es", translator, batch_size, run_cache)
+        _, warm = translate_segments(segments, "pt", "es", translator, batch_size, run_cache)
+        assert [(s["start"], s["end"]) for s in translated] == [(s["start"], s["end"]) for s in segments]
+        print(f"  batch {batch_size:3d}: cold {cold['seconds'] / minutes * 1000:7.1f} ms/audio min "
+              f"({cold['batches']} batches, {cold['translated']} distinct lines), "
+              f"warm {warm['seconds'] / minutes * 1000:5.1f} ms/audio min")
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else 10.0)
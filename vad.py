@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""Speech pre-filter: skip silence (and, with Silero, music) before decoding.
+
+Two backends:
+- "silero": faster-whisper's own vad_filter with the job's Silero
+  parameters (threshold, min_silence_duration_ms, speech_pad_ms, ...);
+- "energy": frame RMS against the file's noise floor, numpy only. Used
+  when onnxruntime is missing or when asked for; it skips silence but
+  not music.
+
+With the energy backend the speech regions are laid end to end, decoded
+as one array and every segment and word timestamp is mapped back to
+original-audio time through TimestampMap (no rounding). The response gets
+a "vad" block with the speech and skipped seconds.
+
+Benchmark: python vad.py [minutes] [model]
+"""
+import bisect
+import importlib.util
+import os
+
+SAMPLING_RATE = 16000
+
+# Off by default: turning it on changes the output (and the cache keys) of existing jobs
+VAD_FILTER = os.environ.get('VAD_FILTER', '0') == '1'
+VAD_BACKEND = os.environ.get('VAD_BACKEND', 'silero')
+HAS_SILERO = importlib.util.find_spec("onnxruntime") is not None
+
+SILERO_PARAMETERS = ("threshold", "neg_threshold", "min_speech_duration_ms", "max_speech_duration_s",
+                     "min_silence_duration_ms", "speech_pad_ms")
+ENERGY_DEFAULTS = {
+    "frame_ms": 30,
+    "margin_db": 12.0,  # above the noise floor (10th percentile frame level)
+    "min_db": -50.0,  # frames quieter than this are never speech
+    "min_speech_duration_ms": 250,
+    "min_silence_duration_ms": 500,
+    "speech_pad_ms": 200,
+}
+
+
+def options_from_job(job_input):
+    """{"backend", "parameters"} for the job, or None when the filter is off.
+
+    "vad": false disables it, true uses VAD_BACKEND, and an object may set
+    "backend" plus that backend's parameters.
+    """
+    requested = job_input.get('vad', VAD_FILTER)
+    if not requested:
+        return None
+    parameters = dict(requested) if isinstance(requested, dict) else {}
+    backend = parameters.pop("backend", VAD_BACKEND)
+    if backend == "silero" and not HAS_SILERO:
+        backend = "energy"
+    allowed = SILERO_PARAMETERS if backend == "silero" else ENERGY_DEFAULTS
+    return {"backend": backend, "parameters": {k: v for k, v in parameters.items() if k in allowed}}
+
+
+def model_options(options):
+    """transcribe() keyword arguments for the Silero backend ({} otherwise)"""
+    if options is None or options["backend"] != "silero":
+        return {}
+    return {"vad_filter": True, "vad_parameters": options["parameters"] or None}
+
+
+def energy_regions(audio, **parameters):
+    """Speech regions as [{"start", "end"}] in samples, like get_speech_timestamps"""
+    import numpy as np
+
+    p = {**ENERGY_DEFAULTS, **parameters}
+    frame = int(SAMPLING_RATE * p["frame_ms"] / 1000)
+    count = len(audio) // frame
+    if count == 0:
+        return []
+    frames = np.asarray(audio[:count * frame], dtype=np.float32).reshape(count, frame)
+    level = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-12)
+    threshold = max(np.percentile(level, 10) + p["margin_db"], p["min_db"])
+    voiced = level > threshold
+
+    # Runs of voiced frames: [start, end) frame indices
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    runs = list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+    frames_per_ms = 1 / p["frame_ms"]
+    min_silence = p["min_silence_duration_ms"] * frames_per_ms
+    merged = []
+    for start, end in runs:
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    pad = int(p["speech_pad_ms"] * SAMPLING_RATE / 1000)
+    min_speech = p["min_speech_duration_ms"] * frames_per_ms
+    regions = []
+    for start, end in merged:
+        if end - start < min_speech:
+            continue
+        start = max(start * frame - pad, 0)
+        end = min(end * frame + pad, len(audio))
+        if regions and start <= regions[-1]["end"]:
+            regions[-1]["end"] = end
+        else:
+            regions.append({"start": start, "end": end})
+    return regions
+
+
+class TimestampMap:
+    """Time in the concatenated speech audio -> time in the original audio"""
+
+    def __init__(self, regions, sampling_rate=SAMPLING_RATE):
+        self.starts = []  # where each region begins in the concatenated audio, seconds
+        self.offsets = []  # original start - concatenated start, seconds
+        position = 0
+        for region in regions:
+            self.starts.append(position / sampling_rate)
+            self.offsets.append((region["start"] - position) / sampling_rate)
+            position += region["end"] - region["start"]
+
+    def to_original(self, seconds, is_end=False):
+        index = max(bisect.bisect_right(self.starts, seconds) - 1, 0)
+        # An end exactly on a boundary belongs to the region it closes
+        if is_end and index > 0 and seconds == self.starts[index]:
+            index -= 1
+        return seconds + self.offsets[index]
+
+
+def _replaced(item, **changes):
+    """dataclasses.replace that also takes the namedtuples of backends.FakeWhisperModel"""
+    from dataclasses import replace
+    return item._replace(**changes) if hasattr(item, "_replace") else replace(item, **changes)
+
+
+def _restore(segments, timestamps):
+    for segment in segments:
+        words = segment.words
+        if words:
+            words = [
+                _replaced(word, start=timestamps.to_original(word.start), end=timestamps.to_original(word.end, True))
+                for word in words
+            ]
+        yield _replaced(
+            segment,
+            start=timestamps.to_original(segment.start),
+            end=timestamps.to_original(segment.end, True),
+            words=words,
+        )
+
+
+def transcribe(model, source, options, **kwargs):
+    """model.transcribe() behind the speech pre-filter; returns (segments, info).
+
+    model may be a WhisperModel or a BatchedInferencePipeline.
+    """
+    if options is None or options["backend"] == "silero":
+        return model.transcribe(source, **model_options(options), **kwargs)
+
+    import numpy as np
+    from faster_whisper import BatchedInferencePipeline, decode_audio
+    from faster_whisper.transcribe import TranscriptionInfo
+    import metrics
+
+    audio = source if isinstance(source, np.ndarray) else decode_audio(source, sampling_rate=SAMPLING_RATE)
+    duration = len(audio) / SAMPLING_RATE
+    with metrics.stage("vad"):
+        regions = energy_regions(audio, **options["parameters"])
+    speech = sum(region["end"] - region["start"] for region in regions) / SAMPLING_RATE
+    vad_options = {"backend": "energy", **options["parameters"]}
+
+    if not regions:
+        info = TranscriptionInfo(kwargs.get("language") or "unknown", 0.0, duration, 0.0, None, None, vad_options)
+        return iter(()), info
+
+    if isinstance(model, BatchedInferencePipeline):
+        # Clips are decoded in place, so timestamps are already in original time;
+        # the pipeline takes clips of at most 30 s
+        clips = []
+        for region in regions:
+            start = region["start"] / SAMPLING_RATE
+            end = region["end"] / SAMPLING_RATE
+            while start < end:
+                clips.append({"start": start, "end": min(start + 30.0, end)})
+                start += 30.0
+        segments, info = model.transcribe(audio, vad_filter=False, clip_timestamps=clips, **kwargs)
+    else:
+        speech_audio = np.concatenate([audio[r["start"]:r["end"]] for r in regions])
+        segments, info = model.transcribe(speech_audio, vad_filter=False, **kwargs)
+        segments = _restore(segments, TimestampMap(regions))
+    return segments, _replaced(info, duration=duration, duration_after_vad=speech, vad_options=vad_options)
+
+
+def summary(info):
+    """The response's "vad" block, or None when no filter ran"""
+    after = getattr(info, "duration_after_vad", None)
+    vad_options = getattr(info, "vad_options", None)
+    if after is None or vad_options is None:
+        return None
+    backend = vad_options.get("backend", "energy") if isinstance(vad_options, dict) else "silero"
+    return {
+        "backend": backend,
+        "speech_seconds": round(after, 3),
+        "skipped_seconds": round(info.duration - after, 3),
+    }
+
+
+# --- Benchmark ---
+def synthetic_with_silence(seconds, silence_ratio, seed=0):
+    """Voiced-like bursts and silences in a known proportion; returns (audio, speech_seconds)"""
+    import numpy as np
+    from chunked import synthetic_audio
+
+    rng = np.random.default_rng(seed)
+    voiced = synthetic_audio(seconds * (1 - silence_ratio) * 1.5 + 1, seed)
+    # keep the bursts only: drop the short gaps synthetic_audio leaves between them
+    voiced = voiced[np.abs(voiced) > 0][:int(seconds * (1 - silence_ratio) * SAMPLING_RATE)]
+    total = int(seconds * SAMPLING_RATE)
+    pieces, used = [], 0
+    while used < len(voiced):
+        burst = int(rng.uniform(3, 15) * SAMPLING_RATE)
+        pieces.append(voiced[used:used + burst])
+        used += burst
+    silence = total - len(voiced)
+    gaps = rng.dirichlet(np.ones(len(pieces) + 1)) * silence if silence > 0 else np.zeros(len(pieces) + 1)
+    out = []
+    for gap, piece in zip(gaps, pieces + [None]):
+        out.append(np.zeros(int(gap), dtype=np.float32))
+        if piece is not None:
+            out.append(piece)
+    return np.concatenate(out).astype(np.float32), len(voiced) / SAMPLING_RATE
+
+
+def benchmark(minutes=10.0, model_name=None):
+    """Detected vs known silence per ratio, detection cost and, with a model, decode time saved.
+
+    Silero is shown for its cost; it rightly rejects the synthetic tones as non-speech.
+    """
+    import time
+    import numpy as np
+
+    seconds = minutes * 60
+    model = None
+    if model_name:
+        from model_pool import get_whisper_model
+        model, _ = get_whisper_model(model_name)
+
+    print(f"{minutes:g} min synthetic audio per ratio")
+    for ratio in (0.0, 0.25, 0.5, 0.75, 0.9):
+        audio, speech = synthetic_with_silence(seconds, ratio)
+        start = time.perf_counter()
+        regions = energy_regions(audio)
+        elapsed = time.perf_counter() - start
+        detected = sum(r["end"] - r["start"] for r in regions) / SAMPLING_RATE
+
+        # Exact mapping: every concatenated sample maps back onto the same original sample
+        timestamps = TimestampMap(regions)
+        concatenated = np.concatenate([audio[r["start"]:r["end"]] for r in regions]) if regions else audio[:0]
+        probes = np.random.default_rng(1).integers(0, max(len(concatenated), 1), 1000) if regions else []
+        exact = all(
+            concatenated[k] == audio[int(round(timestamps.to_original(k / SAMPLING_RATE) * SAMPLING_RATE))]
+            for k in probes
+        )
+        line = (f"  silence {ratio:4.0%}: skipped {seconds - detected:7.1f}s of {seconds - speech:7.1f}s "
+                f"({len(regions)} regions), energy VAD {elapsed * 1000:6.1f} ms, mapping exact: {exact}")
+
+        if HAS_SILERO:
+            from faster_whisper.vad import VadOptions, get_speech_timestamps
+            start = time.perf_counter()
+            silero = get_speech_timestamps(audio, VadOptions())
+            silero_elapsed = time.perf_counter() - start
+            silero_speech = sum(r["end"] - r["start"] for r in silero) / SAMPLING_RATE
+            line += f"; silero skipped {seconds - silero_speech:7.1f}s in {silero_elapsed:5.2f}s"
+        print(line)
+
+        if model is not None:
+            timings = {}
+            for name, options in (("no filter", None), ("energy", {"backend": "energy", "parameters": {}})):
+                start = time.perf_counter()
+                segments, _ = transcribe(model, audio, options, beam_size=5)
+                count = sum(1 for _ in segments)
+                timings[name] = time.perf_counter() - start
+            print(f"    decode: {timings['no filter']:.2f}s without filter, {timings['energy']:.2f}s with "
+                  f"energy VAD ({count} segments)")
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(
+        float(sys.argv[1]) if len(sys.argv) > 1 else 10.0,
+        sys.argv[2] if len(sys.argv) > 2 else None,
+    )
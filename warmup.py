@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Warm start: load and warm up models at container boot, before the first job.
+
+PRELOAD_MODELS lists the models to load, comma separated, each as
+name[:device[:compute_type]] (e.g. "medium,large-v2:cuda:float16").
+Prefix a name with "openai-whisper/" to preload an openai-whisper model.
+Every model then runs one short inference on generated silence so the
+first real job does not pay for CTranslate2/CUDA initialisation. A preload
+that would not fit in MODEL_POOL_BUDGET_MB next to the earlier ones is
+skipped rather than evicting them.
+"""
+import os
+import time
+from model_pool import estimate_size_mb, get_whisper_model, get_openai_whisper_model, pool, resolve_device
+
+PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS')
+WARMUP_INFERENCE = os.environ.get('WARMUP_INFERENCE', '1') == '1'
+WARMUP_SECONDS = float(os.environ.get('WARMUP_SECONDS', '2'))
+
+SAMPLING_RATE = 16000
+
+
+def parse_models(spec):
+    """"medium,large-v2:cuda:float16" -> [(name, device, compute_type)]"""
+    models = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        parts = item.split(":")
+        models.append((parts[0], parts[1] if len(parts) > 1 else None, parts[2] if len(parts) > 2 else None))
+    return models
+
+
+def silence(seconds=WARMUP_SECONDS):
+    import numpy as np
+    return np.zeros(int(seconds * SAMPLING_RATE), dtype=np.float32)
+
+
+def pool_entry(name, device=None, compute_type=None):
+    """(pool key, estimated MB) a preload will occupy"""
+    if name.startswith("openai-whisper/"):
+        device, _ = resolve_device(device, 'float32')
+        return (name, device, 'float32'), estimate_size_mb(name.split("/", 1)[1], 'float32')
+    device, compute_type = resolve_device(device, compute_type)
+    return (name, device, compute_type), estimate_size_mb(name, compute_type)
+
+
+def warm_up_model(model, openai=False):
+    """One short inference so kernels, caches and allocators are initialised"""
+    audio = silence()
+    if openai:
+        model.transcribe(audio, language="en")
+        return
+    # language is fixed so only the warm-up decode is measured, not detection
+    segments, _ = model.transcribe(audio, language="en", beam_size=1, vad_filter=False)
+    for _ in segments:
+        pass
+
+
+def timed_import(name):
+    """Import a module and return the seconds it took (0 when already loaded)"""
+    start = time.perf_counter()
+    __import__(name)
+    return time.perf_counter() - start
+
+
+def warm_start(default_models=""):
+    """Preload and warm up models; returns the timing report it logged"""
+    spec = PRELOAD_MODELS if PRELOAD_MODELS is not None else default_models
+    models = parse_models(spec)
+    report = {"import": {}, "models": {}}
+    if not models:
+        print("[startup] no models to preload")
+        return report
+
+    openai_needed = any(name.startswith("openai-whisper/") for name, _, _ in models)
+    for module in (["whisper"] if openai_needed else []) + ["faster_whisper"]:
+        try:
+            report["import"][module] = round(timed_import(module), 3)
+            print(f"[startup] import {module}: {report['import'][module]:.2f}s")
+        except ImportError:
+            print(f"[startup] {module} not installed")
+
+    started = time.perf_counter()
+    for name, device, compute_type in models:
+        openai = name.startswith("openai-whisper/")
+        key, size_mb = pool_entry(name, device, compute_type)
+        if not pool.fits(key, size_mb):
+            # Loading it would evict a model warmed up a moment ago; it loads on demand instead
+            print(f"[startup] skipping {name}: ~{size_mb:.0f} MB does not fit next to the earlier preloads "
+                  f"({pool.used_mb:.0f} of MODEL_POOL_BUDGET_MB={pool.budget_mb:.0f} in use)")
+            report["models"][name] = {"skipped": "model pool budget"}
+            continue
+        try:
+            if openai:
+                model, info = get_openai_whisper_model(name.split("/", 1)[1], device)
+            else:
+                model, info = get_whisper_model(name, device, compute_type)
+            entry = {"load": info["model_load_time"], "device": info["device"],
+                     "compute_type": info["compute_type"], "warmup": 0.0}
+            if WARMUP_INFERENCE:
+                start = time.perf_counter()
+                warm_up_model(model, openai)
+                entry["warmup"] = round(time.perf_counter() - start, 3)
+            report["models"][name] = entry
+            print(f"[startup] {name} ({entry['device']}/{entry['compute_type']}): "
+                  f"load {entry['load']:.2f}s, warm-up {entry['warmup']:.2f}s")
+        except Exception as e:
+            # A model that fails to preload is loaded on demand by the first job instead
+            print(f"[startup] could not preload {name}: {e}")
+            report["models"][name] = {"error": str(e)}
+
+    report["total"] = round(time.perf_counter() - started + sum(report["import"].values()), 3)
+    print(f"[startup] warm start finished in {report['total']:.2f}s")
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+    warm_start(sys.argv[1] if len(sys.argv) > 1 else "tiny")